@@ -0,0 +1,425 @@
+"""
+Agency Budget Rankings for Government Financial Budget Assistant
+
+This module materializes per-fiscal-year agency rankings for each budget
+metric (budgetary resources, obligations and outlays) so top-N questions are
+answered by slicing a pre-sorted list instead of fanning out to every agency.
+
+Rankings are built by a background job, or in the background on first use by
+callers that ask for it. Closed fiscal years never change, so their complete
+rankings are persisted to disk and never rebuilt; the current fiscal year is
+rebuilt once its rankings are older than AGENCY_RANKINGS_TTL, and once more
+after the year closes so its final figures are persisted.
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from single_flight import SingleFlight
+from response_cache import current_fiscal_year
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Rankings configuration
+AGENCY_RANKINGS_DIR = os.getenv("AGENCY_RANKINGS_DIR", os.path.join("cache", "rankings"))
+AGENCY_RANKINGS_TTL = int(os.getenv("AGENCY_RANKINGS_TTL", "3600"))
+AGENCY_RANKINGS_YEARS = int(os.getenv("AGENCY_RANKINGS_YEARS", "5"))
+
+# Per-agency fetches of a build run on their own pool so they never hold the request-path fan-out workers
+AGENCY_RANKINGS_CONCURRENCY = int(os.getenv("AGENCY_RANKINGS_CONCURRENCY", "4"))
+AGENCY_RANKINGS_BUILD_DEADLINE = float(os.getenv("AGENCY_RANKINGS_BUILD_DEADLINE", "1800"))
+
+# Budgetary resources response fields holding each metric, in order of preference
+METRIC_FIELDS = {
+    "budgetary_resources": ("agency_budgetary_resources", "total_budgetary_resources"),
+    "obligations": ("agency_total_obligated", "total_obligations"),
+    "outlays": ("agency_total_outlayed", "total_outlays"),
+}
+DEFAULT_METRIC = "budgetary_resources"
+
+# Seconds before a fiscal year with no persisted rankings is looked up on disk again
+DISK_MISS_RECHECK_SECONDS = 60
+
+_build_executor = ThreadPoolExecutor(max_workers=AGENCY_RANKINGS_CONCURRENCY, thread_name_prefix="agency-rankings-fetch")
+
+# Query metric names mapped to ranking metrics
+METRIC_ALIASES = {
+    "budget": "budgetary_resources",
+    "budget_allocation": "budgetary_resources",
+    "budgetary_resources": "budgetary_resources",
+    "obligations": "obligations",
+    "obligation": "obligations",
+    "outlays": "outlays",
+    "outlay": "outlays",
+    "spending": "outlays",
+}
+
+def metric_for(name):
+    """
+    Map a query metric name to a ranking metric.
+
+    Args:
+        name (str): Metric name from a query (e.g., "budget", "spending")
+
+    Returns:
+        str: Ranking metric (defaults to budgetary resources)
+    """
+    return METRIC_ALIASES.get(str(name or "").lower(), DEFAULT_METRIC)
+
+def extract_metric(budget_data, fiscal_year, metric):
+    """
+    Read a metric for one fiscal year from a budgetary resources response.
+
+    Args:
+        budget_data (dict): Response of usaspending_connector.get_agency_budgetary_resources
+        fiscal_year (str): Fiscal year to read
+        metric (str): Ranking metric
+
+    Returns:
+        float: Metric amount (0 if not reported)
+    """
+    year_data = next(
+        (row for row in budget_data.get("agency_data_by_year") or [] if str(row.get("fiscal_year")) == str(fiscal_year)),
+        budget_data
+    )
+    for field in METRIC_FIELDS[metric]:
+        if year_data.get(field) is not None:
+            return float(year_data[field])
+    return 0.0
+
+def is_closed_year(fiscal_year):
+    """Check whether a fiscal year has ended, so its figures no longer change."""
+    return int(fiscal_year) < current_fiscal_year()
+
+def fiscal_year_end(fiscal_year):
+    """Get the UNIX time a fiscal year closes (October 1 of its calendar year, local time)."""
+    return datetime(int(fiscal_year), 10, 1).timestamp()
+
+def fetch_budgetary_resources(fiscal_year):
+    """
+    Fetch the budgetary resources of every agency in the catalog for a fiscal year.
+
+    Args:
+        fiscal_year (str): Fiscal year
+
+    Returns:
+        tuple: (dict of agency code to name, dict of agency code to response for
+            successful fetches, dict of agency code to error message for failed fetches)
+
+    Raises:
+        RuntimeError: If the agency catalog is empty
+    """
+    # Imported here because both modules are only needed when rankings are built
+    from usaspending_connector import get_agency_budgetary_resources, _fetch_concurrently
+    from agency_catalog import get_agencies
+
+    agency_names = {agency["code"]: agency["name"] for agency in get_agencies()}
+    if not agency_names:
+        raise RuntimeError("Agency catalog is empty")
+
+    logger.info(f"Building FY {fiscal_year} agency rankings for {len(agency_names)} agencies")
+    calls = {code: (get_agency_budgetary_resources, (code, fiscal_year)) for code in agency_names}
+    results, failures = _fetch_concurrently(
+        calls,
+        max_concurrency=AGENCY_RANKINGS_CONCURRENCY,
+        deadline=AGENCY_RANKINGS_BUILD_DEADLINE,
+        executor=_build_executor
+    )
+    return agency_names, results, failures
+
+class RankingStore:
+    """
+    Materialized agency rankings keyed by (fiscal year, metric).
+    """
+
+    def __init__(self, directory=None, ttl=None, fetcher=None):
+        """
+        Initialize an empty store.
+
+        Args:
+            directory (str, optional): Directory closed-year rankings are persisted to
+            ttl (int, optional): Seconds before an open year's rankings are rebuilt
+            fetcher (callable, optional): Function fetching a fiscal year's per-agency
+                budgetary resources (defaults to fetch_budgetary_resources)
+        """
+        self.directory = directory or AGENCY_RANKINGS_DIR
+        self.ttl = ttl if ttl is not None else AGENCY_RANKINGS_TTL
+        self.fetcher = fetcher or fetch_budgetary_resources
+        self._rankings = {}
+        self._pending = set()
+        self._disk_misses = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight("agency-rankings")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agency-rankings")
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _path(self, fiscal_year):
+        """Get the file a fiscal year's rankings are persisted to."""
+        return os.path.join(self.directory, f"fy{fiscal_year}.json")
+
+    def _load_from_disk(self, fiscal_year):
+        """
+        Load a fiscal year's persisted rankings into memory.
+
+        Misses are remembered for DISK_MISS_RECHECK_SECONDS so repeated lookups of
+        a year that was never persisted do not touch the disk every time.
+
+        Returns:
+            bool: True if persisted rankings were loaded
+        """
+        fiscal_year = str(fiscal_year)
+        missed_at = self._disk_misses.get(fiscal_year)
+        if missed_at is not None and time.monotonic() - missed_at < DISK_MISS_RECHECK_SECONDS:
+            return False
+        try:
+            with open(self._path(fiscal_year), "r", encoding="utf-8") as f:
+                rankings = json.load(f)
+        except (OSError, ValueError):
+            self._disk_misses[fiscal_year] = time.monotonic()
+            return False
+        with self._lock:
+            for metric, ranking in rankings.items():
+                self._rankings[(str(fiscal_year), metric)] = ranking
+        return True
+
+    def _save_to_disk(self, fiscal_year, rankings):
+        """Persist a fiscal year's rankings atomically."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(rankings, f)
+            os.replace(tmp_path, self._path(fiscal_year))
+            self._disk_misses.pop(str(fiscal_year), None)
+        except OSError as e:
+            logger.warning(f"Could not persist FY {fiscal_year} rankings: {str(e)}")
+
+    def _build(self, fiscal_year):
+        """Fetch every agency's budgetary resources and materialize all metric rankings for a fiscal year."""
+        fiscal_year = str(fiscal_year)
+        agency_names, results, failures = self.fetcher(fiscal_year)
+
+        built_at = time.time()
+        rankings = {}
+        for metric in METRIC_FIELDS:
+            entries = [
+                {
+                    "agency_code": code,
+                    "agency_name": agency_names[code],
+                    "fiscal_year": fiscal_year,
+                    "amount": extract_metric(budget_data, fiscal_year, metric)
+                }
+                for code, budget_data in results.items()
+            ]
+            entries.sort(key=lambda entry: entry["amount"], reverse=True)
+            rankings[metric] = {
+                "fiscal_year": fiscal_year,
+                "metric": metric,
+                "entries": entries,
+                "built_at": built_at,
+                "agencies_failed": sorted(failures),
+                "partial": bool(failures)
+            }
+
+        with self._lock:
+            for metric, ranking in rankings.items():
+                self._rankings[(fiscal_year, metric)] = ranking
+
+        if is_closed_year(fiscal_year) and not failures:
+            self._save_to_disk(fiscal_year, rankings)
+        return rankings
+
+    def build(self, fiscal_year):
+        """
+        Build a fiscal year's rankings, sharing the work with concurrent builds of the same year.
+
+        Args:
+            fiscal_year (str): Fiscal year
+
+        Returns:
+            dict: Mapping of metric to ranking
+        """
+        return self._flight.do(str(fiscal_year), self._build, fiscal_year)
+
+    def _needs_rebuild(self, ranking):
+        """
+        Check whether a ranking is incomplete, was built before its closed year
+        ended, or, for an open year, is older than the TTL.
+        """
+        if ranking["partial"]:
+            return True
+        if is_closed_year(ranking["fiscal_year"]):
+            # Built while the year was open: rebuild once so the final figures are persisted
+            return ranking["built_at"] < fiscal_year_end(ranking["fiscal_year"])
+        return time.time() - ranking["built_at"] >= self.ttl
+
+    def _schedule_build(self, fiscal_year):
+        """Rebuild a fiscal year's rankings in the background unless a rebuild is already queued."""
+        fiscal_year = str(fiscal_year)
+        with self._lock:
+            if fiscal_year in self._pending:
+                return
+            self._pending.add(fiscal_year)
+
+        def run():
+            try:
+                self.build(fiscal_year)
+            except Exception as e:
+                logger.error(f"Error building FY {fiscal_year} rankings: {str(e)}")
+            finally:
+                with self._lock:
+                    self._pending.discard(fiscal_year)
+        self._executor.submit(run)
+
+    def get(self, fiscal_year, metric=DEFAULT_METRIC, build=True, build_in_background=False):
+        """
+        Get a materialized ranking.
+
+        A missing ranking is loaded from disk or, if ``build`` is set, built
+        synchronously. A stale ranking is returned as-is while a rebuild runs
+        in the background.
+
+        Args:
+            fiscal_year (str): Fiscal year
+            metric (str): Ranking metric
+            build (bool): Whether to build a missing ranking
+            build_in_background (bool): Without ``build``, whether to start a background
+                build of a missing ranking so later lookups find it
+
+        Returns:
+            dict: Ranking with entries sorted by amount (descending), or None if unavailable
+        """
+        key = (str(fiscal_year), metric)
+        ranking = self._rankings.get(key)
+        if ranking is None and self._load_from_disk(fiscal_year):
+            ranking = self._rankings.get(key)
+        if ranking is None:
+            if not build:
+                if build_in_background:
+                    self._schedule_build(fiscal_year)
+                return None
+            return self.build(fiscal_year).get(metric)
+        if self._needs_rebuild(ranking):
+            self._schedule_build(fiscal_year)
+        return ranking
+
+    def top_n(self, fiscal_year, limit=10, metric=DEFAULT_METRIC, build=True, build_in_background=False):
+        """
+        Get the top agencies for a fiscal year and metric.
+
+        Args:
+            fiscal_year (str): Fiscal year
+            limit (int): Number of agencies
+            metric (str): Ranking metric
+            build (bool): Whether to build the ranking if it is not materialized yet
+            build_in_background (bool): Without ``build``, whether to start a background
+                build of a ranking that is not materialized yet
+
+        Returns:
+            dict: Top agencies under "data" and ranking details under "metadata",
+                or {"error": ...} if the ranking is unavailable
+        """
+        try:
+            ranking = self.get(fiscal_year, metric, build, build_in_background)
+        except Exception as e:
+            logger.error(f"Error building FY {fiscal_year} rankings: {str(e)}")
+            return {"error": f"Failed to build agency rankings: {str(e)}"}
+        if ranking is None:
+            return {"error": f"No {metric} ranking available for FY {fiscal_year}"}
+
+        return {
+            "data": ranking["entries"][:limit],
+            "metadata": {
+                "fiscal_year": str(fiscal_year),
+                "metric": metric,
+                "ranked_agencies": len(ranking["entries"]),
+                "ranking_built_at": ranking["built_at"],
+                "agencies_failed": ranking["agencies_failed"],
+                "partial": ranking["partial"]
+            }
+        }
+
+    def _run(self, fiscal_years):
+        """Background loop keeping the given fiscal years' rankings materialized."""
+        while not self._stop.is_set():
+            for fiscal_year in fiscal_years:
+                if self._stop.is_set():
+                    return
+                try:
+                    ranking = self.get(fiscal_year, build=False)
+                    if ranking is None:
+                        self.build(fiscal_year)
+                except Exception as e:
+                    logger.error(f"Error building FY {fiscal_year} rankings: {str(e)}")
+            self._stop.wait(max(60, self.ttl))
+
+    def start(self, fiscal_years=None):
+        """
+        Start the background job materializing rankings.
+
+        Args:
+            fiscal_years (list, optional): Fiscal years to keep materialized
+                (defaults to the current year and the previous AGENCY_RANKINGS_YEARS - 1 years)
+        """
+        if fiscal_years is None:
+            current = current_fiscal_year()
+            fiscal_years = [str(year) for year in range(current, current - AGENCY_RANKINGS_YEARS, -1)]
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, args=(list(fiscal_years),), name="agency-rankings-job", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the background job."""
+        self._stop.set()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """
+    Get the shared ranking store.
+
+    Returns:
+        RankingStore: The shared store
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RankingStore()
+    return _store
+
+def top_agencies(fiscal_year, limit=10, metric=DEFAULT_METRIC, build=True, build_in_background=False):
+    """
+    Get the top agencies for a fiscal year and metric from the shared store.
+
+    Args:
+        fiscal_year (str): Fiscal year
+        limit (int): Number of agencies
+        metric (str): Ranking metric
+        build (bool): Whether to build the ranking if it is not materialized yet
+        build_in_background (bool): Without ``build``, whether to start a background
+            build of a ranking that is not materialized yet
+
+    Returns:
+        dict: Top agencies under "data" and ranking details under "metadata"
+    """
+    return get_store().top_n(fiscal_year, limit, metric, build, build_in_background)
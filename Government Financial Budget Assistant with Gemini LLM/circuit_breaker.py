@@ -0,0 +1,194 @@
+"""
+Circuit Breaker for Government Financial Budget Assistant
+
+This module provides a per-upstream circuit breaker. It trips open when the
+failure rate or the slow-call rate over a sliding window of recent calls
+exceeds a threshold, rejects calls immediately while open, and after a cool-down
+lets a limited number of half-open probe calls through to decide whether the
+upstream has recovered.
+"""
+
+import os
+import time
+import logging
+import threading
+import requests
+from collections import deque
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Breaker configuration
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_SLOW_CALL_RATE = float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.5"))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "10"))
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "1"))
+
+# Breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker driven by failure and slow-call rates.
+    """
+
+    def __init__(self, name, failure_rate=None, slow_call_rate=None, slow_call_seconds=None,
+                 window=None, min_calls=None, open_seconds=None, half_open_calls=None):
+        """
+        Initialize a closed breaker.
+
+        Args:
+            name (str): Name of the protected upstream
+            failure_rate (float, optional): Failure ratio in the window that opens the circuit
+            slow_call_rate (float, optional): Slow-call ratio in the window that opens the circuit
+            slow_call_seconds (float, optional): Duration above which a call counts as slow
+            window (int, optional): Number of recent calls considered
+            min_calls (int, optional): Calls required in the window before the rates are evaluated
+            open_seconds (float, optional): Cool-down before half-open probing starts
+            half_open_calls (int, optional): Probe calls allowed at once while half-open
+        """
+        self.name = name
+        self.failure_rate = failure_rate if failure_rate is not None else CIRCUIT_FAILURE_RATE
+        self.slow_call_rate = slow_call_rate if slow_call_rate is not None else CIRCUIT_SLOW_CALL_RATE
+        self.slow_call_seconds = slow_call_seconds if slow_call_seconds is not None else CIRCUIT_SLOW_CALL_SECONDS
+        self.min_calls = min_calls if min_calls is not None else CIRCUIT_MIN_CALLS
+        self.open_seconds = open_seconds if open_seconds is not None else CIRCUIT_OPEN_SECONDS
+        self.half_open_calls = half_open_calls if half_open_calls is not None else CIRCUIT_HALF_OPEN_CALLS
+        self._calls = deque(maxlen=window if window is not None else CIRCUIT_WINDOW)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Current state, moving from open to half-open once the cool-down has passed."""
+        with self._lock:
+            self._update_state(time.monotonic())
+            return self._state
+
+    def _update_state(self, now):
+        """Move an open breaker to half-open after the cool-down; the caller must hold the lock."""
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            logger.info(f"Circuit for {self.name} is half-open, probing upstream")
+
+    def _trip(self, now, reason):
+        """Open the circuit; the caller must hold the lock."""
+        self._state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        logger.warning(f"Circuit for {self.name} opened: {reason}")
+
+    def before_call(self):
+        """
+        Check whether a call may proceed.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with all probe slots taken
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._update_state(now)
+            if self._state == OPEN:
+                retry_in = self.open_seconds - (now - self._opened_at)
+                raise CircuitOpenError(f"Circuit for {self.name} is open; retry in {retry_in:.0f}s")
+            if self._state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_calls:
+                    raise CircuitOpenError(f"Circuit for {self.name} is half-open; probe already in flight")
+                self._probes_in_flight += 1
+
+    def record(self, success, duration):
+        """
+        Record the outcome of a call that was allowed by before_call().
+
+        Args:
+            success (bool): Whether the call succeeded
+            duration (float): Call duration in seconds
+        """
+        slow = duration > self.slow_call_seconds
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if success and not slow:
+                    self._state = CLOSED
+                    self._calls.clear()
+                    logger.info(f"Circuit for {self.name} closed after successful probe")
+                else:
+                    self._trip(now, "probe call failed" if not success else "probe call was slow")
+                return
+
+            self._calls.append((success, slow))
+            if len(self._calls) < self.min_calls:
+                return
+
+            failures = sum(1 for ok, _ in self._calls if not ok)
+            slow_calls = sum(1 for _, was_slow in self._calls if was_slow)
+            if failures / len(self._calls) >= self.failure_rate:
+                self._trip(now, f"{failures}/{len(self._calls)} recent calls failed")
+            elif slow_calls / len(self._calls) >= self.slow_call_rate:
+                self._trip(now, f"{slow_calls}/{len(self._calls)} recent calls exceeded {self.slow_call_seconds}s")
+
+    def stats(self):
+        """
+        Get breaker statistics.
+
+        Returns:
+            dict: State and window counts
+        """
+        state = self.state
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": state,
+                "window_calls": len(self._calls),
+                "window_failures": sum(1 for ok, _ in self._calls if not ok)
+            }
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name):
+    """
+    Get the circuit breaker for an upstream, creating it on first use.
+
+    Args:
+        name (str): Upstream name (e.g., "https://api.usaspending.gov")
+
+    Returns:
+        CircuitBreaker: The upstream's breaker
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+def is_open(name):
+    """
+    Check whether an upstream's circuit is currently rejecting calls.
+
+    Args:
+        name (str): Upstream name
+
+    Returns:
+        bool: True if the circuit is open
+    """
+    return get_breaker(name).state == OPEN
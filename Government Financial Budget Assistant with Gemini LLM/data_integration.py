@@ -17,6 +17,7 @@ sys.path.append(str(data_integration_dir))
 
 # Import data manager
 from data_manager import get_budget_data
+from agency_catalog import get_agencies
 
 # Configure logging
 logging.basicConfig(
@@ -100,8 +101,11 @@ def get_available_agencies():
     Returns:
         list: List of agency names
     """
-    # This would typically query the data sources
-    # For now, return a static list of major agencies
+    agencies = get_agencies()
+    if agencies:
+        return [agency["name"] for agency in agencies]
+    
+    # Catalog unavailable, fall back to the major agencies
     return [
         "Department of Agriculture",
         "Department of Commerce",
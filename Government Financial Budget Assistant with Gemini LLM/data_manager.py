@@ -11,6 +11,8 @@ import pandas as pd
 from datetime import datetime
 from dotenv import load_dotenv
 
+from result_cache import TTLCache
+
 # Import data connectors
 from usaspending_connector import (
     get_agency_budgetary_resources,
@@ -25,12 +27,16 @@ from treasury_connector import (
     get_monthly_treasury_statement,
     get_federal_budget_outlays,
     get_federal_budget_receipts,
+    get_federal_budget_outlays_by_years,
+    get_federal_budget_receipts_by_years,
     get_deficit_analysis,
     get_agency_expenditures,
     get_historical_debt,
     get_budget_comparison_by_years,
     format_treasury_data_for_client
 )
+from agency_resolver import resolve_agency_code
+from agency_rankings import top_agencies
 
 # Load environment variables
 load_dotenv()
@@ -45,6 +51,14 @@ logger = logging.getLogger(__name__)
 # Configuration
 ENABLE_MOCK_DATA = os.getenv("ENABLE_MOCK_DATA", "true").lower() == "true"
 
+# Result cache configuration
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "300"))
+
+# Columns requested from Treasury.gov for spending queries
+SPENDING_FIELDS = ["record_date", "fiscal_year", "classification_desc", "current_fytd_net_outly_amt"]
+
 class BudgetDataManager:
     """
     Manager class for retrieving and processing budget data from various sources.
@@ -53,6 +67,11 @@ class BudgetDataManager:
     def __init__(self):
         """Initialize the Budget Data Manager."""
         self.use_mock_data = ENABLE_MOCK_DATA
+        self.result_cache = TTLCache(
+            max_entries=RESULT_CACHE_MAX_ENTRIES,
+            max_bytes=RESULT_CACHE_MAX_BYTES,
+            ttl=RESULT_CACHE_TTL
+        )
         logger.info(f"Budget Data Manager initialized. Using mock data: {self.use_mock_data}")
     
     def get_budget_data(self, parameters):
@@ -70,21 +89,120 @@ class BudgetDataManager:
                 - visualization: Suggested visualization type
                 
         Returns:
-            dict: Formatted budget data for the MCP Client
+            dict: Formatted budget data for the MCP Client. Results may be served from
+                the in-memory result cache; the top-level dict and its metadata are
+                copies, but the data records are shared and must not be modified.
         """
         logger.info(f"Retrieving budget data with parameters: {parameters}")
         
-        # Extract parameters
-        entity = parameters.get("entity")
-        metric = parameters.get("metric")
+        # Extract parameters; free-text ones are normalized once so routing and the cache key agree
+        entity = self._normalize_text(parameters.get("entity"))
+        metric = self._normalize_text(parameters.get("metric"))
         time_period = parameters.get("time_period")
         comparison = parameters.get("comparison")
-        aggregation = parameters.get("aggregation")
+        aggregation = self._normalize_text(parameters.get("aggregation"))
         limit = parameters.get("limit")
         
         # Process time period
         start_year, end_year = self._process_time_period(time_period)
         
+        # Serve repeated queries from the result cache
+        cache_key = self._cache_key(entity, metric, start_year, end_year, comparison, aggregation, limit)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Result cache hit for {cache_key}")
+            return self._copy_result(cached)
+        
+        result = self._fetch_budget_data(entity, metric, start_year, end_year, comparison, aggregation, limit)
+        
+        # Only complete, successful results are cached; partial ones would hide the last good result
+        if "error" not in result:
+            if not result.get("metadata", {}).get("partial"):
+                self.result_cache.set(cache_key, result)
+            return self._copy_result(result)
+        
+        # The upstream failed (or its circuit is open); serve the last good result if there is one
+        stale = self.result_cache.get_stale(cache_key)
+        if stale is not None:
+            logger.warning(f"Serving stale result for {cache_key}: {result['error']}")
+            stale_result = self._copy_result(stale)
+            stale_result.setdefault("metadata", {})
+            stale_result["metadata"]["stale"] = True
+            stale_result["metadata"]["stale_reason"] = result["error"]
+            return stale_result
+        
+        return result
+    
+    def _normalize_text(self, value):
+        """
+        Normalize a free-text query parameter to lower case with collapsed whitespace.
+        
+        Args:
+            value (str): Parameter value
+            
+        Returns:
+            str: Normalized value, or None if the value is empty
+        """
+        return " ".join(str(value).lower().split()) if value else None
+    
+    def _cache_key(self, entity, metric, start_year, end_year, comparison, aggregation, limit):
+        """
+        Build a canonical result cache key from query parameters.
+        
+        Args:
+            entity (str): Normalized agency or department name
+            metric (str): Normalized financial metric
+            start_year (str): Resolved start fiscal year
+            end_year (str): Resolved end fiscal year
+            comparison (bool): Whether a comparison is requested
+            aggregation (str): Normalized type of aggregation
+            limit (int): Number of results requested
+            
+        Returns:
+            tuple: Hashable cache key
+        """
+        return (
+            entity,
+            metric,
+            str(start_year),
+            str(end_year),
+            bool(comparison),
+            aggregation,
+            int(limit) if limit else None
+        )
+    
+    def _copy_result(self, result):
+        """
+        Copy a result so callers can update its top-level keys and metadata without
+        affecting the cached entry.
+        
+        Args:
+            result (dict): Formatted result
+            
+        Returns:
+            dict: Shallow copy with its own metadata dict
+        """
+        copied = dict(result)
+        if isinstance(result.get("metadata"), dict):
+            copied["metadata"] = dict(result["metadata"])
+        return copied
+    
+    def _fetch_budget_data(self, entity, metric, start_year, end_year, comparison, aggregation, limit):
+        """
+        Retrieve budget data from the upstream source that serves the requested metric.
+        
+        Args:
+            entity (str): Agency or department name
+            metric (str): Financial metric
+            start_year (str): Start fiscal year
+            end_year (str): End fiscal year
+            comparison (bool): Whether to compare years
+            aggregation (str): Type of aggregation
+            limit (int): Number of results to return
+            
+        Returns:
+            dict: Formatted budget data for the MCP Client
+        """
         # Determine which data source to use based on the metric
         if metric in ["spending", "outlays", "expenditures"]:
             # Use Treasury.gov for spending data
@@ -155,20 +273,16 @@ class BudgetDataManager:
             # Get spending data for a single year or range
             if start_year == end_year:
                 # Single year
-                data = get_federal_budget_outlays(start_year)
                 if entity:
-                    # Filter by agency
-                    agency_data = get_agency_expenditures(start_year, entity)
-                    data = agency_data if "error" not in agency_data else data
+                    # Filter by agency, falling back to all outlays if the agency lookup fails
+                    data = get_agency_expenditures(start_year, entity, fields=SPENDING_FIELDS, limit=limit)
+                    if "error" in data:
+                        data = get_federal_budget_outlays(start_year, fields=SPENDING_FIELDS, limit=limit)
+                else:
+                    data = get_federal_budget_outlays(start_year, fields=SPENDING_FIELDS, limit=limit)
             else:
-                # Multiple years - get data for each year and combine
-                all_data = []
-                for year in range(int(start_year), int(end_year) + 1):
-                    year_data = get_federal_budget_outlays(str(year))
-                    if "error" not in year_data and "data" in year_data:
-                        all_data.extend(year_data["data"])
-                
-                data = {"data": all_data, "meta": {"record_count": len(all_data)}}
+                # Multiple years - fetch the whole span in one paginated request sequence
+                data = get_federal_budget_outlays_by_years(start_year, end_year, fields=SPENDING_FIELDS)
         
         # Apply limit if specified
         if limit and "data" in data and len(data["data"]) > limit:
@@ -207,12 +321,12 @@ class BudgetDataManager:
                         data = get_agency_budgetary_resources(agency_code, start_year)
                         formatted_data = format_budget_data_for_client(data)
                     else:
-                        # Agency not found, get top agencies
-                        data = get_top_agencies_by_budget(start_year, limit or 10)
+                        # Agency not found, get top agencies instead
+                        data = self._get_top_agencies(start_year, limit or 10)
                         formatted_data = format_budget_data_for_client(data)
                 else:
                     # No specific agency, get top agencies by budget
-                    data = get_top_agencies_by_budget(start_year, limit or 10)
+                    data = self._get_top_agencies(start_year, limit or 10)
                     formatted_data = format_budget_data_for_client(data)
             else:
                 # Multiple years
@@ -221,6 +335,46 @@ class BudgetDataManager:
         
         return formatted_data
     
+    def _get_top_agencies(self, fiscal_year, limit):
+        """
+        Get the top agencies by budget, from the materialized rankings when available.
+        
+        Rankings are never built on the request path. A missing ranking is built
+        in the background (the server's rankings job may already keep it
+        materialized), and until it exists the agencies are fetched directly.
+        
+        Args:
+            fiscal_year (str): Fiscal year
+            limit (int): Number of agencies
+            
+        Returns:
+            dict: Top agencies in the get_top_agencies_by_budget format
+        """
+        ranking = top_agencies(fiscal_year, limit, build=False, build_in_background=True)
+        if "error" in ranking:
+            return get_top_agencies_by_budget(fiscal_year, limit)
+        
+        metadata = ranking["metadata"]
+        return {
+            "data": [
+                {
+                    "agency_code": entry["agency_code"],
+                    "agency_name": entry["agency_name"],
+                    "fiscal_year": entry["fiscal_year"],
+                    "budget_amount": entry["amount"]
+                }
+                for entry in ranking["data"]
+            ],
+            "metadata": {
+                "fiscal_year": metadata["fiscal_year"],
+                "agencies_requested": metadata["ranked_agencies"] + len(metadata["agencies_failed"]),
+                "agencies_succeeded": metadata["ranked_agencies"],
+                "agencies_failed": [{"agency_code": code} for code in metadata["agencies_failed"]],
+                "partial": metadata["partial"],
+                "ranking_built_at": metadata["ranking_built_at"]
+            }
+        }
+    
     def _get_debt_deficit_data(self, start_year, end_year, comparison):
         """
         Retrieve debt and deficit data from Treasury.gov.
@@ -255,14 +409,8 @@ class BudgetDataManager:
             dict: Formatted receipts data
         """
         if comparison or start_year != end_year:
-            # Get receipts data for multiple years
-            all_data = []
-            for year in range(int(start_year), int(end_year) + 1):
-                year_data = get_federal_budget_receipts(str(year))
-                if "error" not in year_data and "data" in year_data:
-                    all_data.extend(year_data["data"])
-            
-            data = {"data": all_data, "meta": {"record_count": len(all_data)}}
+            # Get receipts data for the whole span in one paginated request sequence
+            data = get_federal_budget_receipts_by_years(start_year, end_year)
         else:
             # Get receipts data for a single year
             data = get_federal_budget_receipts(start_year)
@@ -271,7 +419,7 @@ class BudgetDataManager:
     
     def _get_agency_code(self, agency_name):
         """
-        Get the agency code for a given agency name.
+        Get the agency code for a given agency name, abbreviation or partial name.
         
         Args:
             agency_name (str): Name of the agency
@@ -279,49 +427,7 @@ class BudgetDataManager:
         Returns:
             str: Agency code if found, None otherwise
         """
-        # This is a simplified implementation
-        # In a real system, this would query a database or API to get the agency code
-        
-        # Common agency codes
-        agency_codes = {
-            "department of agriculture": "012",
-            "department of commerce": "013",
-            "department of defense": "097",
-            "department of education": "091",
-            "department of energy": "089",
-            "department of health and human services": "075",
-            "department of homeland security": "070",
-            "department of housing and urban development": "086",
-            "department of the interior": "014",
-            "department of justice": "015",
-            "department of labor": "016",
-            "department of state": "019",
-            "department of transportation": "069",
-            "department of the treasury": "020",
-            "department of veterans affairs": "036",
-            "environmental protection agency": "068",
-            "national aeronautics and space administration": "080",
-            "national science foundation": "049",
-            "small business administration": "073",
-            "social security administration": "028"
-        }
-        
-        if not agency_name:
-            return None
-        
-        # Normalize agency name
-        normalized_name = agency_name.lower().strip()
-        
-        # Check for exact match
-        if normalized_name in agency_codes:
-            return agency_codes[normalized_name]
-        
-        # Check for partial match
-        for name, code in agency_codes.items():
-            if normalized_name in name or name in normalized_name:
-                return code
-        
-        return None
+        return resolve_agency_code(agency_name)
 
 # Create a singleton instance
 budget_data_manager = BudgetDataManager()
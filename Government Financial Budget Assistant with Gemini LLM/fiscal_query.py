@@ -0,0 +1,260 @@
+"""
+Fiscal Data Query Builder for Government Financial Budget Assistant
+
+This module provides a small composable builder for Treasury.gov Fiscal Data
+query parameters (filter, fields, sort and page size). Queries are rendered in
+a canonical form, so two equal queries always produce byte-identical URLs that
+can be used as cache keys.
+"""
+
+import re
+from urllib.parse import urlencode
+
+# Fiscal Data filter operators supported by the builder
+FILTER_OPERATORS = ("eq", "in", "gt", "gte", "lt", "lte", "contains")
+
+# One "field:operator:value" condition; "in" values are wrapped in parentheses
+_CONDITION = re.compile(r"([\w.]+):(eq|in|gt|gte|lt|lte|contains):(\([^)]*\)|[^,]*)")
+
+class FiscalQuery:
+    """
+    Builder for Treasury.gov Fiscal Data query parameters.
+
+    Methods return the query itself so calls can be chained:
+
+        FiscalQuery().in_("fiscal_year", [2022, 2023]).fields("classification_desc").to_params()
+    """
+
+    def __init__(self):
+        """Initialize an empty query."""
+        self._filters = set()
+        self._fields = set()
+        self._sort = []
+        self._page_size = None
+
+    def _add_filter(self, field, operator, value):
+        """
+        Add a filter condition.
+
+        Args:
+            field (str): Column name
+            operator (str): One of FILTER_OPERATORS
+            value: Filter value (a collection for the "in" operator)
+
+        Returns:
+            FiscalQuery: This query
+        """
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+
+        if operator == "in":
+            values = sorted({str(v) for v in value})
+            if not values:
+                raise ValueError(f"Empty value list for filter on {field}")
+            value = "(" + ",".join(values) + ")"
+
+        self._filters.add((field, operator, str(value)))
+        return self
+
+    def eq(self, field, value):
+        """Filter rows where ``field`` equals ``value``."""
+        return self._add_filter(field, "eq", value)
+
+    def in_(self, field, values):
+        """Filter rows where ``field`` is one of ``values``."""
+        return self._add_filter(field, "in", values)
+
+    def gt(self, field, value):
+        """Filter rows where ``field`` is greater than ``value``."""
+        return self._add_filter(field, "gt", value)
+
+    def gte(self, field, value):
+        """Filter rows where ``field`` is greater than or equal to ``value``."""
+        return self._add_filter(field, "gte", value)
+
+    def lt(self, field, value):
+        """Filter rows where ``field`` is less than ``value``."""
+        return self._add_filter(field, "lt", value)
+
+    def lte(self, field, value):
+        """Filter rows where ``field`` is less than or equal to ``value``."""
+        return self._add_filter(field, "lte", value)
+
+    def contains(self, field, value):
+        """Filter rows where ``field`` contains the substring ``value``."""
+        return self._add_filter(field, "contains", value)
+
+    def fields(self, *names):
+        """
+        Restrict the columns returned.
+
+        Args:
+            *names (str): Column names (a single list or tuple is also accepted)
+
+        Returns:
+            FiscalQuery: This query
+        """
+        if len(names) == 1 and isinstance(names[0], (list, tuple, set)):
+            names = names[0]
+        self._fields.update(name for name in names if name)
+        return self
+
+    def sort(self, *keys):
+        """
+        Set the server-side sort order. Prefix a column with "-" for descending order.
+
+        Args:
+            *keys (str): Sort keys in priority order (a single list, tuple or comma-separated string is also accepted)
+
+        Returns:
+            FiscalQuery: This query
+        """
+        if len(keys) == 1 and isinstance(keys[0], (list, tuple)):
+            keys = keys[0]
+        elif len(keys) == 1 and isinstance(keys[0], str):
+            keys = keys[0].split(",")
+        self._sort = [key for key in keys if key]
+        return self
+
+    def page_size(self, size):
+        """
+        Set the number of records per page.
+
+        Args:
+            size (int): Page size
+
+        Returns:
+            FiscalQuery: This query
+        """
+        self._page_size = int(size) if size else None
+        return self
+
+    def filter_string(self):
+        """
+        Render the filter conditions in canonical order.
+
+        Returns:
+            str: Fiscal Data filter expression, or an empty string if there are no filters
+        """
+        return ",".join(f"{field}:{operator}:{value}" for field, operator, value in sorted(self._filters))
+
+    def to_params(self):
+        """
+        Render the query as a dict of Fiscal Data query parameters with sorted keys.
+
+        Returns:
+            dict: Query parameters
+        """
+        params = {"format": "json"}
+        if self._fields:
+            params["fields"] = ",".join(sorted(self._fields))
+        if self._filters:
+            params["filter"] = self.filter_string()
+        if self._page_size:
+            params["page[size]"] = self._page_size
+        if self._sort:
+            params["sort"] = ",".join(self._sort)
+        return dict(sorted(params.items()))
+
+    def to_query_string(self):
+        """
+        Render the query as a canonical URL query string.
+
+        Returns:
+            str: Encoded query string
+        """
+        return urlencode(self.to_params())
+
+    def url(self, endpoint):
+        """
+        Build the full request URL for an endpoint.
+
+        Args:
+            endpoint (str): Fiscal Data endpoint URL
+
+        Returns:
+            str: Endpoint URL with the canonical query string
+        """
+        return f"{endpoint}?{self.to_query_string()}"
+
+    def conditions(self):
+        """
+        Get the filter conditions in canonical order.
+
+        Returns:
+            list: (field, operator, value) tuples; "in" values are lists of strings
+        """
+        conditions = []
+        for field, operator, value in sorted(self._filters):
+            if operator == "in":
+                value = value.strip("()").split(",")
+            conditions.append((field, operator, value))
+        return conditions
+
+    def get_fields(self):
+        """
+        Get the projected columns.
+
+        Returns:
+            list: Column names in canonical order (empty for all columns)
+        """
+        return sorted(self._fields)
+
+    def get_sort(self):
+        """
+        Get the sort keys.
+
+        Returns:
+            list: Sort keys in priority order, "-" prefixed for descending
+        """
+        return list(self._sort)
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Parse Fiscal Data query parameters back into a query.
+
+        Args:
+            params (dict): Query parameters, e.g. as produced by to_params()
+
+        Returns:
+            FiscalQuery: Equivalent query
+        """
+        query = cls()
+        for field, operator, value in _CONDITION.findall(str(params.get("filter") or "")):
+            if operator == "in":
+                query.in_(field, value.strip("()").split(","))
+            else:
+                query._add_filter(field, operator, value)
+        if params.get("fields"):
+            query.fields(str(params["fields"]).split(","))
+        if params.get("sort"):
+            query.sort(str(params["sort"]))
+        if params.get("page[size]"):
+            query.page_size(params["page[size]"])
+        return query
+
+    def copy(self):
+        """
+        Create an independent copy of the query.
+
+        Returns:
+            FiscalQuery: Copy of this query
+        """
+        clone = FiscalQuery()
+        clone._filters = set(self._filters)
+        clone._fields = set(self._fields)
+        clone._sort = list(self._sort)
+        clone._page_size = self._page_size
+        return clone
+
+    def __eq__(self, other):
+        if not isinstance(other, FiscalQuery):
+            return NotImplemented
+        return self.to_query_string() == other.to_query_string()
+
+    def __hash__(self):
+        return hash(self.to_query_string())
+
+    def __repr__(self):
+        return f"FiscalQuery({self.to_query_string()})"
@@ -0,0 +1,317 @@
+"""
+Shared HTTP transport for Government Financial Budget Assistant connectors
+
+This module provides a single pooled, keep-alive HTTP session used by the
+USASpending.gov and Treasury.gov connectors, so repeated calls to the same
+upstream reuse TCP/TLS connections instead of opening a new one per request.
+"""
+
+import os
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+
+import response_cache
+import circuit_breaker
+from single_flight import SingleFlight
+from rate_limiter import TokenBucket, RetryBudget, backoff_delay, parse_retry_after
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Transport configuration
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+
+# Rate limiting and retry configuration
+HTTP_RATE_LIMIT_PER_SECOND = float(os.getenv("HTTP_RATE_LIMIT_PER_SECOND", "10"))
+HTTP_RATE_LIMIT_BURST = float(os.getenv("HTTP_RATE_LIMIT_BURST", "20"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_CAP = float(os.getenv("HTTP_BACKOFF_CAP", "30"))
+HTTP_RETRY_BUDGET_RATIO = float(os.getenv("HTTP_RETRY_BUDGET_RATIO", "0.2"))
+
+# Status codes worth retrying
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Upstream hosts that get a dedicated connection pool
+UPSTREAM_HOSTS = [
+    "https://api.fiscaldata.treasury.gov",
+    "https://api.usaspending.gov",
+]
+
+_session = None
+_session_lock = threading.Lock()
+
+# Coalesces concurrent identical upstream requests into one
+_request_flight = SingleFlight("http-client")
+
+# One token bucket per upstream host, and one retry budget shared by all of them
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+_retry_budget = RetryBudget(ratio=HTTP_RETRY_BUDGET_RATIO)
+
+def _build_session():
+    """
+    Build a requests Session with a dedicated connection pool per upstream host.
+
+    Returns:
+        requests.Session: Configured session
+    """
+    session = requests.Session()
+
+    # Mount one adapter per upstream so each host gets its own pool
+    for host in UPSTREAM_HOSTS:
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_CONNECTIONS,
+            pool_maxsize=HTTP_POOL_MAXSIZE,
+            max_retries=0
+        )
+        session.mount(host, adapter)
+
+    # Fallback adapter for any other host
+    default_adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=0
+    )
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+
+    logger.info(
+        f"HTTP session initialized (pool_connections={HTTP_POOL_CONNECTIONS}, "
+        f"pool_maxsize={HTTP_POOL_MAXSIZE}, connect_timeout={HTTP_CONNECT_TIMEOUT}s, "
+        f"read_timeout={HTTP_READ_TIMEOUT}s)"
+    )
+    return session
+
+def get_session():
+    """
+    Get the shared HTTP session, creating it on first use.
+
+    Returns:
+        requests.Session: Shared keep-alive session
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+def close_session():
+    """Close the shared HTTP session and release its pooled connections."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def get_timeout(connect_timeout=None, read_timeout=None):
+    """
+    Build a (connect, read) timeout tuple, falling back to the configured defaults.
+
+    Args:
+        connect_timeout (float, optional): Connect timeout in seconds
+        read_timeout (float, optional): Read timeout in seconds
+
+    Returns:
+        tuple: (connect_timeout, read_timeout)
+    """
+    return (
+        connect_timeout if connect_timeout is not None else HTTP_CONNECT_TIMEOUT,
+        read_timeout if read_timeout is not None else HTTP_READ_TIMEOUT
+    )
+
+def get_host(url):
+    """
+    Extract the scheme and host of a URL (e.g., "https://api.usaspending.gov").
+
+    Args:
+        url (str): Request URL
+
+    Returns:
+        str: Scheme and host of the URL
+    """
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def get_rate_limiter(host):
+    """
+    Get the token bucket for an upstream host, creating it on first use.
+
+    Args:
+        host (str): Scheme and host, as returned by get_host()
+
+    Returns:
+        TokenBucket: The host's token bucket
+    """
+    with _rate_limiters_lock:
+        if host not in _rate_limiters:
+            _rate_limiters[host] = TokenBucket(HTTP_RATE_LIMIT_PER_SECOND, HTTP_RATE_LIMIT_BURST)
+        return _rate_limiters[host]
+
+def _send_with_retries(method, url, params, json_body, headers, timeout):
+    """
+    Send a request under the host's rate limit, retrying transient failures.
+
+    Connection errors, timeouts and 429/5xx responses are retried with
+    exponential backoff and full jitter (or the upstream's Retry-After), as long
+    as attempts remain and the global retry budget allows it.
+
+    Returns:
+        requests.Response: The final response (which may still be an error status)
+
+    Raises:
+        requests.exceptions.RequestException: If the last attempt failed to connect or timed out
+    """
+    rate_limiter = get_rate_limiter(get_host(url))
+    _retry_budget.record_request()
+    attempt = 0
+
+    while True:
+        rate_limiter.acquire()
+        retry_after = None
+        try:
+            response = get_session().request(
+                method,
+                url,
+                params=params,
+                json=json_body,
+                headers=headers,
+                timeout=timeout or get_timeout()
+            )
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            failure = f"HTTP {response.status_code}"
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            response = None
+            failure = str(e)
+
+        if attempt >= HTTP_MAX_RETRIES or not _retry_budget.try_spend():
+            logger.warning(f"Giving up on {method} {url} after {attempt + 1} attempt(s): {failure}")
+            if response is None:
+                raise requests.exceptions.RetryError(f"{method} {url} failed after {attempt + 1} attempt(s): {failure}")
+            return response
+
+        delay = retry_after if retry_after is not None else backoff_delay(attempt, HTTP_BACKOFF_BASE, HTTP_BACKOFF_CAP)
+        delay = min(delay, HTTP_BACKOFF_CAP)
+        logger.info(f"Retrying {method} {url} in {delay:.2f}s after {failure} (attempt {attempt + 1})")
+        time.sleep(delay)
+        attempt += 1
+
+def request_json(method, url, params=None, json_body=None, headers=None, timeout=None, use_cache=True):
+    """
+    Send an HTTP request over the shared session and decode the JSON response.
+
+    Fresh responses are served from the on-disk response cache. Expired entries
+    are revalidated with If-None-Match / If-Modified-Since when the upstream
+    supplied validators, and a 304 reply reuses the cached body. Concurrent
+    identical requests share a single upstream call, so the returned body must
+    be treated as read-only.
+
+    Args:
+        method (str): HTTP method ("GET" or "POST")
+        url (str): Request URL
+        params (dict, optional): Query string parameters
+        json_body (dict, optional): JSON request body
+        headers (dict, optional): Request headers
+        timeout (tuple, optional): (connect, read) timeout in seconds
+        use_cache (bool): Whether to read and write the response cache
+
+    Returns:
+        dict: Decoded JSON response
+
+    Raises:
+        requests.exceptions.RequestException: On connection errors, timeouts and HTTP errors
+        circuit_breaker.CircuitOpenError: If the upstream's circuit is open
+    """
+    key = response_cache.cache_key(method, url, params, json_body)
+    # Cache-bypassing calls must not share the result of an in-flight cached call
+    return _request_flight.do((key, use_cache), _request_json, key, method, url, params, json_body, headers, timeout, use_cache)
+
+def _request_json(key, method, url, params, json_body, headers, timeout, use_cache):
+    """Perform a request for request_json(); runs once per set of concurrent identical calls."""
+    entry = response_cache.load(key) if use_cache else None
+    if response_cache.is_fresh(entry):
+        return entry["body"]
+
+    request_headers = dict(headers or {})
+    request_headers.update(response_cache.conditional_headers(entry))
+
+    # Fail fast while the upstream's circuit is open
+    breaker = circuit_breaker.get_breaker(get_host(url))
+    breaker.before_call()
+    started_at = time.monotonic()
+    success = False
+    try:
+        response = _send_with_retries(method, url, params, json_body, request_headers, timeout)
+        success = response.status_code < 500
+    finally:
+        breaker.record(success, time.monotonic() - started_at)
+
+    if not use_cache:
+        response.raise_for_status()
+        return response.json()
+
+    ttl = response_cache.ttl_for(url, params)
+    if response.status_code == 304 and entry is not None:
+        logger.info(f"Revalidated cached response for {url}")
+        return response_cache.refresh(key, entry, ttl)["body"]
+
+    response.raise_for_status()
+    body = response.json()
+    response_cache.store(
+        key,
+        body,
+        ttl,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified")
+    )
+    return body
+
+def get_json(url, params=None, headers=None, timeout=None, use_cache=True):
+    """
+    Send a GET request over the shared session and decode the JSON response.
+
+    Args:
+        url (str): Request URL
+        params (dict, optional): Query string parameters
+        headers (dict, optional): Request headers
+        timeout (tuple, optional): (connect, read) timeout in seconds
+        use_cache (bool): Whether to read and write the response cache
+
+    Returns:
+        dict: Decoded JSON response
+    """
+    return request_json("GET", url, params=params, headers=headers, timeout=timeout, use_cache=use_cache)
+
+def post_json(url, json_body=None, headers=None, timeout=None, use_cache=True):
+    """
+    Send a POST request with a JSON body over the shared session and decode the JSON response.
+
+    Args:
+        url (str): Request URL
+        json_body (dict, optional): JSON request body
+        headers (dict, optional): Request headers
+        timeout (tuple, optional): (connect, read) timeout in seconds
+        use_cache (bool): Whether to read and write the response cache
+
+    Returns:
+        dict: Decoded JSON response
+    """
+    return request_json("POST", url, json_body=json_body, headers=headers, timeout=timeout, use_cache=use_cache)
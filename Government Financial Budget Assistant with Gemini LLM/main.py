@@ -7,6 +7,15 @@ from dotenv import load_dotenv
 import requests
 import json
 import logging
+import sys
+from pathlib import Path
+
+# Add data_integration directory to path
+current_dir = Path(__file__).resolve().parent
+data_integration_dir = current_dir.parent / "data_integration"
+sys.path.append(str(data_integration_dir))
+
+from serialization import loads, trusted_response
 
 # Load environment variables
 load_dotenv()
@@ -130,8 +139,8 @@ async def fetch_budget_data(parameters: Dict[str, Any]) -> Dict[str, Any]:
             headers={"Content-Type": "application/json"}
         )
         response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        return loads(response.content)
+    except (requests.RequestException, ValueError) as e:
         logger.error(f"Error fetching budget data: {str(e)}")
         # Return mock data for development/testing
         return {
@@ -193,7 +202,11 @@ async def process_query(request: QueryRequest):
         # Generate insights about the budget data using Gemini
         insights = await generate_insights(request.query, parameters, budget_data["data"])
         
-        # Construct the response
+        # Extracted parameters come from the model, so check them before skipping validation
+        if not isinstance(parameters, dict):
+            raise ValueError("Parameter extraction did not return a JSON object")
+        
+        # Construct the response; the data was built by the MCP Server, so skip re-validating it
         response = {
             "query": request.query,
             "query_parameters": parameters,
@@ -201,7 +214,7 @@ async def process_query(request: QueryRequest):
             "insights": insights
         }
         
-        return response
+        return trusted_response(response)
     
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
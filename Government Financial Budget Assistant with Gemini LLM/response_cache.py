@@ -0,0 +1,359 @@
+"""
+Persistent Response Cache for Government Financial Budget Assistant
+
+This module provides a content-addressed on-disk cache for upstream API
+responses. Entries are keyed by a hash of the canonical request (method, URL,
+query parameters and body), carry a per-endpoint TTL, keep the upstream
+ETag/Last-Modified validators for revalidation, and survive process restarts.
+The cache is bounded by total size and entry count; least recently used
+entries are evicted first.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import date, timedelta
+from urllib.parse import urlencode
+from dotenv import load_dotenv
+
+from serialization import dumps, loads
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", os.path.join("cache", "responses"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "20000"))
+
+# Number of stores between scans of the cache directory for eviction
+RESPONSE_CACHE_PRUNE_INTERVAL = int(os.getenv("RESPONSE_CACHE_PRUNE_INTERVAL", "100"))
+
+# TTLs in seconds
+DEFAULT_TTL = int(os.getenv("RESPONSE_CACHE_DEFAULT_TTL", str(60 * 60)))
+CLOSED_YEAR_TTL = int(os.getenv("RESPONSE_CACHE_CLOSED_YEAR_TTL", str(365 * 24 * 60 * 60)))
+DEBT_TO_PENNY_TTL = int(os.getenv("RESPONSE_CACHE_DEBT_TO_PENNY_TTL", str(60 * 60)))
+
+# Days after a fiscal year ends before it is cached as closed; the final MTS is published
+# in mid-October and recent months are restated for a while after that
+CLOSED_YEAR_GRACE_DAYS = int(os.getenv("RESPONSE_CACHE_CLOSED_YEAR_GRACE_DAYS", "90"))
+
+# Matches fiscal year conditions in Fiscal Data filters, e.g. "fiscal_year:in:(2021,2022)"
+_FISCAL_YEAR_FILTER = re.compile(r"fiscal_year:(eq|in|gt|gte|lt|lte):\(?([0-9,]+)\)?")
+_RECORD_DATE_FILTER = re.compile(r"record_date:(lt|lte):(\d{4}-\d{2}-\d{2})")
+
+_prune_lock = threading.Lock()
+# Start at the interval so the first store after startup prunes
+_stores_since_prune = RESPONSE_CACHE_PRUNE_INTERVAL
+
+def current_fiscal_year(today=None):
+    """
+    Get the current federal fiscal year (which starts on October 1).
+
+    Args:
+        today (date, optional): Date to evaluate (defaults to today)
+
+    Returns:
+        int: Current fiscal year
+    """
+    today = today or date.today()
+    return today.year + 1 if today.month >= 10 else today.year
+
+def is_settled_fiscal_year(fiscal_year, today=None):
+    """
+    Check whether a fiscal year has ended and its restatement grace period has passed.
+
+    Args:
+        fiscal_year (int): Fiscal year
+        today (date, optional): Date to evaluate (defaults to today)
+
+    Returns:
+        bool: True once CLOSED_YEAR_GRACE_DAYS have passed since the year ended on September 30
+    """
+    today = today or date.today()
+    return today >= date(int(fiscal_year), 10, 1) + timedelta(days=CLOSED_YEAR_GRACE_DAYS)
+
+def cache_key(method, url, params=None, json_body=None):
+    """
+    Build the content address for a request.
+
+    Args:
+        method (str): HTTP method
+        url (str): Request URL
+        params (dict, optional): Query string parameters
+        json_body (dict, optional): JSON request body
+
+    Returns:
+        str: Hex SHA-256 digest identifying the request
+    """
+    material = "\n".join([
+        method.upper(),
+        url,
+        urlencode(sorted((params or {}).items())),
+        json.dumps(json_body, sort_keys=True, separators=(",", ":")) if json_body is not None else ""
+    ])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def _referenced_fiscal_years(url, params):
+    """
+    Collect the fiscal years a request is restricted to.
+
+    Args:
+        url (str): Request URL
+        params (dict): Query string parameters
+
+    Returns:
+        tuple: (set of fiscal years, whether the request is bounded above)
+    """
+    params = params or {}
+    years = set()
+    bounded = False
+
+    # USASpending style: ?fiscal_year=2023
+    if params.get("fiscal_year"):
+        years.add(int(params["fiscal_year"]))
+        bounded = True
+
+    # Fiscal Data style: filter=fiscal_year:eq:2023,...
+    filter_expr = str(params.get("filter", ""))
+    for operator, values in _FISCAL_YEAR_FILTER.findall(filter_expr):
+        for value in values.split(","):
+            if value:
+                years.add(int(value))
+        if operator in ("eq", "in", "lt", "lte"):
+            bounded = True
+
+    for operator, value in _RECORD_DATE_FILTER.findall(filter_expr):
+        end_date = date.fromisoformat(value)
+        # A record date before October 1 belongs to the fiscal year ending that September
+        years.add(end_date.year + 1 if end_date.month >= 10 else end_date.year)
+        bounded = True
+
+    return years, bounded
+
+def ttl_for(url, params=None, today=None):
+    """
+    Choose the TTL for a request.
+
+    Closed fiscal years never change once their figures are final, so after the
+    restatement grace period they are cached effectively forever; the current
+    fiscal year, recently closed years and the daily debt to the penny dataset
+    expire quickly.
+
+    Args:
+        url (str): Request URL
+        params (dict, optional): Query string parameters
+        today (date, optional): Date to evaluate (defaults to today)
+
+    Returns:
+        int: TTL in seconds
+    """
+    if "debt_to_penny" in url:
+        return DEBT_TO_PENNY_TTL
+
+    years, bounded = _referenced_fiscal_years(url, params)
+    if years and bounded and is_settled_fiscal_year(max(years), today):
+        return CLOSED_YEAR_TTL
+
+    return DEFAULT_TTL
+
+def _entry_path(key):
+    """Get the file path for a cache key, sharded by the first two hex digits."""
+    return os.path.join(RESPONSE_CACHE_DIR, key[:2], f"{key}.json")
+
+def load(key):
+    """
+    Load a cache entry, fresh or expired.
+
+    Args:
+        key (str): Cache key from cache_key()
+
+    Returns:
+        dict: Cache entry, or None if there is none
+    """
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+
+    path = _entry_path(key)
+    try:
+        with open(path, "rb") as f:
+            entry = loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache entry {key}: {str(e)}")
+        return None
+
+    # The modification time records the last use for LRU eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
+
+def is_fresh(entry, now=None):
+    """
+    Check whether a cache entry is still within its TTL.
+
+    Args:
+        entry (dict): Cache entry
+        now (float, optional): Current UNIX time
+
+    Returns:
+        bool: True if the entry has not expired
+    """
+    return entry is not None and entry.get("expires_at", 0) > (now or time.time())
+
+def store(key, body, ttl, etag=None, last_modified=None):
+    """
+    Write a cache entry atomically.
+
+    Args:
+        key (str): Cache key from cache_key()
+        body: Decoded JSON response body
+        ttl (int): TTL in seconds
+        etag (str, optional): Upstream ETag validator
+        last_modified (str, optional): Upstream Last-Modified validator
+
+    Returns:
+        dict: The stored entry
+    """
+    now = time.time()
+    entry = {
+        "stored_at": now,
+        "expires_at": now + ttl,
+        "etag": etag,
+        "last_modified": last_modified,
+        "body": body
+    }
+
+    if not RESPONSE_CACHE_ENABLED:
+        return entry
+
+    path = _entry_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(dumps(entry))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to write cache entry {key}: {str(e)}")
+
+    _maybe_prune()
+    return entry
+
+def prune(max_bytes=None, max_entries=None):
+    """
+    Evict least recently used entries until the cache is within its bounds.
+
+    Args:
+        max_bytes (int, optional): Maximum total size of all entries (defaults to RESPONSE_CACHE_MAX_BYTES)
+        max_entries (int, optional): Maximum number of entries (defaults to RESPONSE_CACHE_MAX_ENTRIES)
+
+    Returns:
+        int: Number of entries removed
+    """
+    max_bytes = RESPONSE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_entries = RESPONSE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    if not os.path.isdir(RESPONSE_CACHE_DIR):
+        return 0
+
+    entries = []
+    total_bytes = 0
+    for root, _, files in os.walk(RESPONSE_CACHE_DIR):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_bytes += stat.st_size
+
+    # Oldest use first
+    entries.sort()
+    removed = 0
+    for _, size, path in entries:
+        if total_bytes <= max_bytes and len(entries) - removed <= max_entries:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total_bytes -= size
+        removed += 1
+
+    if removed:
+        logger.info(f"Evicted {removed} response cache entries")
+    return removed
+
+def _maybe_prune():
+    """Prune the cache every RESPONSE_CACHE_PRUNE_INTERVAL stores, skipping if another thread is pruning."""
+    global _stores_since_prune
+    _stores_since_prune += 1
+    if _stores_since_prune < RESPONSE_CACHE_PRUNE_INTERVAL or not _prune_lock.acquire(blocking=False):
+        return
+    try:
+        _stores_since_prune = 0
+        prune()
+    except OSError as e:
+        logger.warning(f"Failed to prune the response cache: {str(e)}")
+    finally:
+        _prune_lock.release()
+
+def refresh(key, entry, ttl):
+    """
+    Extend an entry's lifetime after the upstream confirmed it is unchanged (HTTP 304).
+
+    Args:
+        key (str): Cache key from cache_key()
+        entry (dict): Existing cache entry
+        ttl (int): TTL in seconds
+
+    Returns:
+        dict: The refreshed entry
+    """
+    return store(key, entry["body"], ttl, entry.get("etag"), entry.get("last_modified"))
+
+def conditional_headers(entry):
+    """
+    Build revalidation headers for an expired entry.
+
+    Args:
+        entry (dict): Cache entry
+
+    Returns:
+        dict: If-None-Match / If-Modified-Since headers (empty if the upstream sent no validators)
+    """
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+def clear():
+    """Remove every entry from the response cache."""
+    if not os.path.isdir(RESPONSE_CACHE_DIR):
+        return
+    for root, _, files in os.walk(RESPONSE_CACHE_DIR):
+        for name in files:
+            if name.endswith(".json"):
+                os.remove(os.path.join(root, name))
@@ -0,0 +1,143 @@
+"""
+Response Formats for Government Financial Budget Assistant
+
+This module converts row-oriented results (lists of dicts) to the alternative
+layouts clients can request: a columnar JSON shape that names each column once,
+and Apache Arrow IPC streams for batch consumers. Arrow support requires the
+optional pyarrow package.
+"""
+
+import json
+import logging
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Supported data layouts
+ROWS = "rows"
+COLUMNAR = "columnar"
+ARROW = "arrow"
+LAYOUTS = (ROWS, COLUMNAR, ARROW)
+
+# Media types used for content negotiation
+JSON_MEDIA_TYPE = "application/json"
+COLUMNAR_MEDIA_TYPE = "application/vnd.budget.columnar+json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+MEDIA_TYPE_LAYOUTS = {
+    COLUMNAR_MEDIA_TYPE: COLUMNAR,
+    ARROW_MEDIA_TYPE: ARROW,
+}
+
+def arrow_available():
+    """Check whether Arrow IPC output is available (pyarrow is installed)."""
+    return pa is not None
+
+def negotiate_layout(accept=None, requested=None):
+    """
+    Choose the response layout from an explicit request or the Accept header.
+
+    Args:
+        accept (str, optional): HTTP Accept header value
+        requested (str, optional): Layout named in the request ("rows", "columnar" or "arrow")
+
+    Returns:
+        str: Chosen layout (defaults to rows)
+
+    Raises:
+        ValueError: If the requested layout is unknown
+    """
+    if requested:
+        requested = requested.lower()
+        if requested not in LAYOUTS:
+            raise ValueError(f"Unsupported format: {requested}")
+        return requested
+
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type in MEDIA_TYPE_LAYOUTS:
+            return MEDIA_TYPE_LAYOUTS[media_type]
+    return ROWS
+
+def to_columnar(rows, columns=None):
+    """
+    Convert rows to the columnar JSON shape.
+
+    Args:
+        rows (list): Row dicts
+        columns (list, optional): Column order (defaults to keys in order of first appearance)
+
+    Returns:
+        dict: {"columns": [...], "values": {column: [value per row]}}; missing values are None
+    """
+    if columns is None:
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+    return {
+        "columns": columns,
+        "values": {column: [row.get(column) for row in rows] for column in columns}
+    }
+
+def frame_to_columnar(df):
+    """
+    Convert a DataFrame to the columnar JSON shape without building row dicts.
+
+    Args:
+        df (pd.DataFrame): Data
+
+    Returns:
+        dict: {"columns": [...], "values": {column: [...]}}; NaN values are None
+    """
+    df = df.astype(object).where(df.notna(), None)
+    columns = [str(column) for column in df.columns]
+    return {
+        "columns": columns,
+        "values": {name: df[column].tolist() for name, column in zip(columns, df.columns)}
+    }
+
+def columnar_to_arrow(columnar, metadata=None):
+    """
+    Encode columnar data as an Apache Arrow IPC stream.
+
+    Args:
+        columnar (dict): Data in the columnar JSON shape
+        metadata (dict, optional): Response metadata, stored as JSON in the schema metadata
+
+    Returns:
+        bytes: Arrow IPC stream
+
+    Raises:
+        RuntimeError: If pyarrow is not installed
+    """
+    if pa is None:
+        raise RuntimeError("Arrow output requires the pyarrow package")
+
+    table = pa.table({column: columnar["values"][column] for column in columnar["columns"]})
+    if metadata:
+        table = table.replace_schema_metadata({"metadata": json.dumps(metadata, default=str)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def to_layout(rows, layout):
+    """
+    Convert rows to a JSON-serializable layout.
+
+    Args:
+        rows (list): Row dicts
+        layout (str): "rows" or "columnar"
+
+    Returns:
+        list or dict: Rows unchanged, or the columnar shape
+    """
+    return to_columnar(rows) if layout == COLUMNAR else rows
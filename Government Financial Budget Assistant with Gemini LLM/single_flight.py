@@ -0,0 +1,141 @@
+"""
+Single-Flight Request Coalescing for Government Financial Budget Assistant
+
+This module deduplicates concurrent identical calls: the first caller for a
+key runs the call, and every caller that arrives while it is in flight waits
+for and shares the same result (or exception). Both threaded and asyncio
+callers are supported.
+
+Shared results are returned as-is to every caller and must be treated as read-only.
+"""
+
+import asyncio
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """An in-flight call shared by every thread waiting on the same key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into a single execution.
+    """
+
+    def __init__(self, name="single-flight"):
+        """
+        Initialize the group.
+
+        Args:
+            name (str): Name used in log messages
+        """
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._async_calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run ``func`` once for all threads concurrently requesting ``key``.
+
+        Args:
+            key: Hashable key identifying the call
+            func (callable): Function to execute
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            The function's return value, shared by every coalesced caller
+
+        Raises:
+            Exception: Whatever the function raised, re-raised in every coalesced caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            if call.waiters:
+                logger.info(f"{self.name}: shared one result with {call.waiters} concurrent caller(s)")
+            call.done.set()
+
+        return call.result
+
+    async def do_async(self, key, coro_func, *args, **kwargs):
+        """
+        Await ``coro_func`` once for all coroutines concurrently requesting ``key``
+        on the same event loop.
+
+        Args:
+            key: Hashable key identifying the call
+            coro_func (callable): Coroutine function to execute
+            *args: Positional arguments for the coroutine function
+            **kwargs: Keyword arguments for the coroutine function
+
+        Returns:
+            The coroutine's result, shared by every coalesced caller
+        """
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+
+        task = self._async_calls.get(loop_key)
+        if task is None:
+            task = loop.create_task(coro_func(*args, **kwargs))
+            self._async_calls[loop_key] = task
+            task.add_done_callback(lambda _: self._async_calls.pop(loop_key, None))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        # Shield so one cancelled waiter does not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def stats(self):
+        """
+        Get coalescing statistics.
+
+        Returns:
+            dict: Number of executions, coalesced calls and calls currently in flight
+        """
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": in_flight + len(self._async_calls)
+        }
@@ -8,6 +8,7 @@ import unittest
 import json
 import os
 import sys
+import pandas as pd
 from unittest.mock import patch, MagicMock
 
 # Add parent directory to path to import modules
@@ -15,13 +16,58 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import data integration modules
 from data_integration.data_manager import BudgetDataManager
+from data_integration import treasury_connector
+from data_integration import usaspending_connector
+from data_integration import treasury_warehouse
+from data_integration.agency_resolver import AgencyResolver, AGENCY_ALIASES
+from data_integration.agency_catalog import AgencyCatalog
+from data_integration.agency_rankings import RankingStore
+from data_integration.fiscal_query import FiscalQuery
+from data_integration import response_formats
+from data_integration import serialization
+from data_integration import response_cache
+from data_integration import http_client
+from data_integration import async_connectors
+from data_integration.result_cache import TTLCache
+from data_integration.single_flight import SingleFlight
+from data_integration.rate_limiter import TokenBucket, RetryBudget, parse_retry_after
+from data_integration.circuit_breaker import CircuitBreaker, CircuitOpenError
 from mcp_server.data_integration import process_query_parameters, get_data_for_query
+from mcp_server import server
 
 class TestDataManager(unittest.TestCase):
     """Test cases for the Budget Data Manager."""
     
     def setUp(self):
         """Set up test fixtures."""
+        import tempfile
+        import requests
+        
+        # Patch the resolver module data_manager actually imports, which may not be data_integration.agency_resolver
+        agency_resolver = sys.modules[sys.modules[BudgetDataManager.__module__].resolve_agency_code.__module__]
+        
+        # Fail the test if anything reaches the network
+        network = patch.object(requests.Session, "request", side_effect=AssertionError("Unexpected network request"))
+        mock_request = network.start()
+        self.addCleanup(network.stop)
+        self.addCleanup(mock_request.assert_not_called)
+        
+        # Resolve agencies against a fixed catalog instead of the live USASpending.gov agency list
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        catalog = AgencyCatalog(
+            os.path.join(temp_dir.name, "agency_catalog.json"),
+            refresh_seconds=0,
+            loader=lambda: [
+                {"code": "097", "name": "Department of Defense", "abbreviation": "DOD"},
+                {"code": "347", "name": "Defense Nuclear Facilities Safety Board", "abbreviation": "DNFSB"}
+            ]
+        )
+        for name, value in [("get_catalog", lambda: catalog), ("_resolver", None), ("_resolver_version", None)]:
+            patcher = patch.object(agency_resolver, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        
         self.data_manager = BudgetDataManager()
     
     def test_process_time_period(self):
@@ -60,6 +106,1006 @@ class TestDataManager(unittest.TestCase):
         # Test no match
         code = self.data_manager._get_agency_code("Nonexistent Agency")
         self.assertIsNone(code)
+    
+    def test_get_budget_data_uses_result_cache(self):
+        """Test that equivalent queries are answered from the result cache."""
+        result = {"data": [{"amount": 1}], "metadata": {"source": "Treasury.gov"}}
+        with patch.object(self.data_manager, "_get_spending_data", return_value=result) as mock_fetch:
+            first = self.data_manager.get_budget_data({"entity": "Department of Defense", "metric": "spending", "time_period": "2023"})
+            first["metadata"]["visualization"] = "bar"
+            second = self.data_manager.get_budget_data({"entity": "department of  defense", "metric": "spending", "time_period": "2023"})
+        
+        self.assertEqual(mock_fetch.call_count, 1)
+        self.assertEqual(second["data"], result["data"])
+        self.assertNotIn("visualization", second["metadata"])
+        self.assertEqual(self.data_manager.result_cache.stats()["hits"], 1)
+    
+    def test_get_budget_data_routes_normalized_metric(self):
+        """Test that differently cased metrics share a cache entry and the same data source."""
+        result = {"data": [{"amount": 1}], "metadata": {"source": "Treasury.gov"}}
+        with patch.object(self.data_manager, "_get_spending_data", return_value=result) as mock_spending, \
+             patch.object(self.data_manager, "_get_budget_allocation_data") as mock_allocation:
+            first = self.data_manager.get_budget_data({"metric": "Spending ", "time_period": "2023"})
+            second = self.data_manager.get_budget_data({"metric": "spending", "time_period": "2023"})
+        
+        mock_spending.assert_called_once()
+        mock_allocation.assert_not_called()
+        self.assertEqual(first["data"], second["data"])
+    
+    def test_get_budget_data_serves_stale_result_on_error(self):
+        """Test that the last good result is served, marked stale, when the upstream fails."""
+        self.data_manager.result_cache.ttl = 0
+        params = {"metric": "receipts", "time_period": "2022"}
+        good = {"data": [{"amount": 1}], "metadata": {"source": "Treasury.gov"}}
+        with patch.object(self.data_manager, "_get_receipts_data", return_value=good):
+            self.data_manager.get_budget_data(params)
+        with patch.object(self.data_manager, "_get_receipts_data", return_value={"error": "Circuit is open"}):
+            result = self.data_manager.get_budget_data(params)
+        
+        self.assertEqual(result["data"], good["data"])
+        self.assertTrue(result["metadata"]["stale"])
+        self.assertEqual(result["metadata"]["stale_reason"], "Circuit is open")
+
+    def test_get_budget_data_does_not_cache_partial_result(self):
+        """Test that a partial result is returned but keeps the last complete result in the cache."""
+        self.data_manager.result_cache.ttl = 0
+        params = {"metric": "budget", "time_period": "2022"}
+        complete = {"data": [{"amount": 1}], "metadata": {"partial": False}}
+        partial = {"data": [], "metadata": {"partial": True}}
+        with patch.object(self.data_manager, "_get_budget_allocation_data", return_value=complete):
+            self.data_manager.get_budget_data(params)
+        with patch.object(self.data_manager, "_get_budget_allocation_data", return_value=partial):
+            result = self.data_manager.get_budget_data(params)
+        with patch.object(self.data_manager, "_get_budget_allocation_data", return_value={"error": "Circuit is open"}):
+            stale = self.data_manager.get_budget_data(params)
+        
+        self.assertEqual(result["data"], [])
+        self.assertEqual(stale["data"], complete["data"])
+        self.assertTrue(stale["metadata"]["stale"])
+
+    @patch('data_integration.data_manager.get_top_agencies_by_budget')
+    @patch('data_integration.data_manager.top_agencies')
+    def test_top_agencies_from_rankings(self, mock_rankings, mock_fan_out):
+        """Test that ranking entries keep the get_top_agencies_by_budget row shape."""
+        mock_rankings.return_value = {
+            "data": [{"agency_code": "097", "agency_name": "Department of Defense", "fiscal_year": "2023", "amount": 5.0}],
+            "metadata": {"fiscal_year": "2023", "metric": "budgetary_resources", "ranked_agencies": 1,
+                         "ranking_built_at": 0, "agencies_failed": [], "partial": False}
+        }
+        
+        result = self.data_manager._get_top_agencies("2023", 10)
+        
+        mock_rankings.assert_called_once_with("2023", 10, build=False, build_in_background=True)
+        mock_fan_out.assert_not_called()
+        self.assertEqual(result["data"], [{"agency_code": "097", "agency_name": "Department of Defense", "fiscal_year": "2023", "budget_amount": 5.0}])
+    
+    @patch('data_integration.data_manager.get_top_agencies_by_budget')
+    @patch('data_integration.data_manager.top_agencies')
+    def test_top_agencies_falls_back_without_ranking(self, mock_rankings, mock_fan_out):
+        """Test that a missing ranking is not built on the request path."""
+        mock_rankings.return_value = {"error": "No budgetary_resources ranking available for FY 2023"}
+        mock_fan_out.return_value = {"data": [], "metadata": {}}
+        
+        result = self.data_manager._get_top_agencies("2023", 5)
+        
+        mock_fan_out.assert_called_once_with("2023", 5)
+        self.assertEqual(result, mock_fan_out.return_value)
+
+class TestTreasuryPagination(unittest.TestCase):
+    """Test cases for Fiscal Data auto-pagination."""
+    
+    def _page(self, number, total_pages, records):
+        """Build a fake Fiscal Data page."""
+        return {
+            "data": records,
+            "meta": {"count": len(records), "total-pages": total_pages},
+            "links": {"next": f"&page[number]={number + 1}" if number < total_pages else None}
+        }
+    
+    def test_iter_fiscal_data_reads_all_pages(self):
+        """Test that every page is fetched and records are yielded in order."""
+        pages = {n: self._page(n, 3, [{"id": n * 10 + i} for i in range(2)]) for n in range(1, 4)}
+        
+        def fake_get_json(endpoint, params=None, headers=None, use_cache=True):
+            return pages[params["page[number]"]]
+        
+        with patch.object(treasury_connector, "get_json", side_effect=fake_get_json):
+            records = list(treasury_connector.iter_fiscal_data("endpoint", {"format": "json"}, prefetch=2))
+        
+        self.assertEqual([r["id"] for r in records], [10, 11, 20, 21, 30, 31])
+    
+    def test_fetch_all_pages_combines_pages(self):
+        """Test that all pages are combined into a single response."""
+        pages = {n: self._page(n, 2, [{"id": n}]) for n in range(1, 3)}
+        
+        def fake_get_json(endpoint, params=None, headers=None, use_cache=True):
+            return pages[params["page[number]"]]
+        
+        with patch.object(treasury_connector, "get_json", side_effect=fake_get_json):
+            result = treasury_connector.fetch_all_pages("endpoint", {"format": "json"})
+        
+        self.assertEqual(len(result["data"]), 2)
+        self.assertEqual(result["meta"]["count"], 2)
+
+    def test_pages_can_bypass_response_cache(self):
+        """Test that use_cache=False reaches every page request (used by warehouse downloads)."""
+        pages = {n: self._page(n, 3, [{"id": n}]) for n in range(1, 4)}
+        
+        def fake_get_json(endpoint, params=None, headers=None, use_cache=True):
+            return pages[params["page[number]"]]
+        
+        with patch.object(treasury_connector, "get_json", side_effect=fake_get_json) as mock_get_json:
+            list(treasury_connector.iter_fiscal_data_pages("endpoint", {"format": "json"}, use_cache=False))
+        
+        self.assertEqual(mock_get_json.call_count, 3)
+        self.assertTrue(all(call.kwargs["use_cache"] is False for call in mock_get_json.call_args_list))
+
+class TestFiscalDataDecoding(unittest.TestCase):
+    """Test cases for typed decoding of Fiscal Data records."""
+    
+    def test_decode_uses_data_types(self):
+        """Test that numeric and date columns are typed and "null" becomes missing."""
+        records = [
+            {"record_date": "2023-01-31", "classification_desc": "Defense", "current_fytd_net_outly_amt": "100.50"},
+            {"record_date": "null", "classification_desc": "Education", "current_fytd_net_outly_amt": "null"}
+        ]
+        data_types = {"record_date": "DATE", "classification_desc": "STRING", "current_fytd_net_outly_amt": "CURRENCY"}
+        
+        df = treasury_connector.decode_fiscal_data(records, data_types)
+        
+        self.assertTrue(pd.api.types.is_float_dtype(df["current_fytd_net_outly_amt"]))
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df["record_date"]))
+        self.assertEqual(df["current_fytd_net_outly_amt"].iloc[0], 100.5)
+        self.assertTrue(pd.isna(df["current_fytd_net_outly_amt"].iloc[1]))
+        self.assertTrue(pd.isna(df["record_date"].iloc[1]))
+    
+    @patch('data_integration.treasury_connector.fetch_all_pages')
+    def test_comparison_sums_amounts_numerically(self, mock_fetch):
+        """Test that the year comparison adds amounts instead of concatenating strings."""
+        mock_fetch.return_value = {
+            "data": [
+                {"fiscal_year": "2022", "classification_desc": "Defense", "current_fytd_net_outly_amt": "10"},
+                {"fiscal_year": "2022", "classification_desc": "Defense", "current_fytd_net_outly_amt": "5"},
+                {"fiscal_year": "2023", "classification_desc": "Defense", "current_fytd_net_outly_amt": "30"}
+            ],
+            "meta": {"dataTypes": {"current_fytd_net_outly_amt": "CURRENCY"}}
+        }
+        
+        result = treasury_connector.get_budget_comparison_by_years("2022", "2023")
+        
+        row = result["data"][0]
+        self.assertEqual(row["current_fytd_net_outly_amt_2022"], 15)
+        self.assertEqual(row["change_2022_to_2023"], 15)
+
+class TestBudgetComparison(unittest.TestCase):
+    """Test cases for the N-year budget comparison engine."""
+    
+    @patch('data_integration.treasury_connector.fetch_all_pages')
+    def test_multi_year_matrix_with_deltas(self, mock_fetch):
+        """Test YoY, absolute and CAGR deltas across several years and agencies."""
+        mock_fetch.return_value = {
+            "data": [
+                {"fiscal_year": "2021", "classification_desc": "Department of Defense", "current_fytd_net_outly_amt": "100"},
+                {"fiscal_year": "2022", "classification_desc": "Department of Defense", "current_fytd_net_outly_amt": "110"},
+                {"fiscal_year": "2023", "classification_desc": "Department of Defense", "current_fytd_net_outly_amt": "121"},
+                {"fiscal_year": "2023", "classification_desc": "Health and Human Services", "current_fytd_net_outly_amt": "50"},
+                {"fiscal_year": "2023", "classification_desc": "Department of Education", "current_fytd_net_outly_amt": "7"}
+            ],
+            "meta": {"dataTypes": {"current_fytd_net_outly_amt": "CURRENCY"}}
+        }
+        
+        result = treasury_connector.get_budget_comparison(["2023", "2021", "2022"], ["Defense", "Health"])
+        rows = {row["classification_desc"]: row for row in result["data"]}
+        
+        self.assertEqual(result["metadata"]["fiscal_years"], ["2021", "2022", "2023"])
+        self.assertEqual(set(rows), {"Department of Defense", "Health and Human Services"})
+        defense = rows["Department of Defense"]
+        self.assertEqual(defense["amounts"], {"2021": 100, "2022": 110, "2023": 121})
+        self.assertEqual(defense["yoy_change"]["2023"], 11)
+        self.assertAlmostEqual(defense["yoy_percent_change"]["2022"], 10.0)
+        self.assertEqual(defense["change"], 21)
+        self.assertAlmostEqual(defense["cagr"], 10.0)
+        self.assertIsNone(rows["Health and Human Services"]["cagr"])
+
+class TestMTSQueries(unittest.TestCase):
+    """Test cases for pushing MTS fields, sort, limit and year filters to the API."""
+
+    @patch('data_integration.treasury_connector.TREASURY_BACKEND', 'api')
+    def test_outlays_push_down_fields_sort_and_limit(self):
+        """Test that fields, sort and limit become query parameters and only needed pages are read."""
+        def fake_get_json(endpoint, params=None, headers=None, use_cache=True):
+            return {"data": [{"n": i} for i in range(params["page[size]"])], "meta": {"total-pages": 40}}
+
+        with patch.object(treasury_connector, "get_json", side_effect=fake_get_json) as mock_get_json:
+            result = treasury_connector.get_federal_budget_outlays(
+                "2023",
+                fields=["classification_desc", "current_fytd_net_outly_amt"],
+                sort="-current_fytd_net_outly_amt",
+                limit=5
+            )
+
+        self.assertEqual(mock_get_json.call_count, 1)
+        endpoint = mock_get_json.call_args.args[0]
+        params = mock_get_json.call_args.kwargs["params"]
+        self.assertTrue(endpoint.endswith("mts_table_9"))
+        self.assertEqual(params["fields"], "classification_desc,current_fytd_net_outly_amt")
+        self.assertEqual(params["sort"], "-current_fytd_net_outly_amt")
+        self.assertEqual(params["filter"], "fiscal_year:eq:2023")
+        self.assertEqual(params["page[size]"], 5)
+        self.assertEqual(len(result["data"]), 5)
+
+    def test_years_request_filters(self):
+        """Test that year sets become eq, gte/lte or in filters and fiscal_year is always selected."""
+        cases = [
+            (["2021"], "fiscal_year:eq:2021"),
+            (["2020", "2021", "2022"], "fiscal_year:gte:2020,fiscal_year:lte:2022"),
+            (["2019", "2022"], "fiscal_year:in:(2019,2022)")
+        ]
+        for years, expected in cases:
+            with self.subTest(years=years):
+                endpoint, params = treasury_connector._mts_years_request(
+                    "mts_table_9", years, fields=["current_fytd_net_outly_amt"], sort="-current_fytd_net_outly_amt"
+                )
+                self.assertTrue(endpoint.endswith("mts_table_9"))
+                self.assertEqual(params["filter"], expected)
+                self.assertEqual(params["fields"], "current_fytd_net_outly_amt,fiscal_year")
+                self.assertEqual(params["sort"], "-current_fytd_net_outly_amt")
+
+class TestAgencyResolver(unittest.TestCase):
+    """Test cases for the indexed agency resolver."""
+    
+    def setUp(self):
+        """Build a resolver from the alias table plus a USASpending-style agency."""
+        agencies = [{"code": code, "name": name, "aliases": aliases} for code, name, aliases in AGENCY_ALIASES]
+        agencies.append({"code": "347", "name": "Defense Nuclear Facilities Safety Board", "abbreviation": "DNFSB"})
+        self.resolver = AgencyResolver(agencies)
+    
+    def test_abbreviations(self):
+        """Test that common abbreviations resolve."""
+        self.assertEqual(self.resolver.resolve("DoD"), "097")
+        self.assertEqual(self.resolver.resolve("HHS"), "075")
+        self.assertEqual(self.resolver.resolve("dnfsb"), "347")
+    
+    def test_partial_and_misspelled_names(self):
+        """Test prefix, token and fuzzy matching."""
+        self.assertEqual(self.resolver.resolve("Defense"), "097")
+        self.assertEqual(self.resolver.resolve("Homeland"), "070")
+        self.assertEqual(self.resolver.resolve("Deparment of Defence"), "097")
+        self.assertEqual(self.resolver.resolve("the department of defense budget"), "097")
+        self.assertIsNone(self.resolver.resolve("Nonexistent Agency"))
+    
+    def test_ranked_candidates(self):
+        """Test that every matching agency is returned, best first."""
+        candidates = self.resolver.candidates("Defense")
+        self.assertEqual([candidate["code"] for candidate in candidates], ["097", "347"])
+
+    def test_shared_resolver_attaches_aliases_to_catalog_codes(self):
+        """Test that built-in aliases resolve to the catalog's codes, not the alias table's."""
+        agency_resolver = sys.modules[AgencyResolver.__module__]
+        catalog = MagicMock(version=1)
+        catalog.get_agencies.return_value = [{"code": "1601", "name": "Department of Labor", "abbreviation": "DOL"}]
+        
+        with patch.object(agency_resolver, "get_catalog", return_value=catalog), \
+             patch.object(agency_resolver, "_resolver", None), \
+             patch.object(agency_resolver, "_resolver_version", None):
+            resolver = agency_resolver.get_resolver()
+        
+        self.assertEqual(resolver.resolve("Labor Department"), "1601")
+        self.assertEqual(list(resolver.names), ["1601"])
+    
+    def test_shared_resolver_uses_alias_codes_without_catalog(self):
+        """Test that the alias table's codes are used while the catalog is empty."""
+        agency_resolver = sys.modules[AgencyResolver.__module__]
+        catalog = MagicMock(version=None)
+        catalog.get_agencies.return_value = []
+        
+        with patch.object(agency_resolver, "get_catalog", return_value=catalog), \
+             patch.object(agency_resolver, "_resolver", None), \
+             patch.object(agency_resolver, "_resolver_version", None):
+            resolver = agency_resolver.get_resolver()
+        
+        self.assertEqual(resolver.resolve("Labor Department"), "016")
+
+class TestAgencyCatalog(unittest.TestCase):
+    """Test cases for the cached agency catalog."""
+    
+    def setUp(self):
+        """Create a temporary catalog file location."""
+        import tempfile
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "agency_catalog.json")
+        self.agencies = [{"code": "097", "name": "Department of Defense", "abbreviation": "DOD"}]
+    
+    def tearDown(self):
+        """Remove the temporary catalog file."""
+        self.temp_dir.cleanup()
+    
+    def test_loads_once_and_persists(self):
+        """Test that the catalog is loaded once and served from memory afterwards."""
+        loader = MagicMock(return_value=self.agencies)
+        catalog = AgencyCatalog(self.path, refresh_seconds=0, loader=loader)
+        
+        self.assertEqual(catalog.get_agencies(), self.agencies)
+        self.assertEqual(catalog.get("097")["abbreviation"], "DOD")
+        catalog.get_agencies()
+        self.assertEqual(loader.call_count, 1)
+        self.assertTrue(os.path.exists(self.path))
+    
+    def test_cold_start_from_disk(self):
+        """Test that a persisted catalog is used without calling the source."""
+        AgencyCatalog(self.path, refresh_seconds=0, loader=lambda: self.agencies).get_agencies()
+        loader = MagicMock(side_effect=RuntimeError("offline"))
+        
+        catalog = AgencyCatalog(self.path, refresh_seconds=0, loader=loader)
+        
+        self.assertEqual(catalog.get_agencies(), self.agencies)
+        loader.assert_not_called()
+    
+    def test_failed_refresh_keeps_cached_list(self):
+        """Test that a failing refresh does not drop the cached agencies."""
+        catalog = AgencyCatalog(self.path, refresh_seconds=0, loader=lambda: self.agencies)
+        catalog.get_agencies()
+        catalog.loader = MagicMock(side_effect=RuntimeError("503 Server Error"))
+        
+        self.assertFalse(catalog.refresh())
+        self.assertEqual(catalog.get_agencies(), self.agencies)
+
+    def test_failed_cold_start_retries_with_backoff(self):
+        """Test that an empty catalog is retried after a short backoff instead of the refresh interval."""
+        loader = MagicMock(side_effect=[RuntimeError("offline"), self.agencies])
+        catalog = AgencyCatalog(self.path, refresh_seconds=0, loader=loader, retry_seconds=60)
+        
+        self.assertEqual(catalog.get_agencies(), [])
+        self.assertEqual(catalog.get_agencies(), [])
+        self.assertEqual(loader.call_count, 1)
+        
+        # Move the failed attempt past the 60 second backoff
+        catalog._attempted_at -= 61
+        self.assertEqual(catalog.get_agencies(), self.agencies)
+        self.assertEqual(loader.call_count, 2)
+
+class TestAgencyRankings(unittest.TestCase):
+    """Test cases for materialized agency rankings."""
+    
+    def setUp(self):
+        """Create a temporary rankings directory and a fake budgetary resources fetcher."""
+        import tempfile
+        self.temp_dir = tempfile.TemporaryDirectory()
+        names = {"001": "Agency A", "002": "Agency B", "003": "Agency C"}
+        resources = {
+            "001": {"agency_data_by_year": [{"fiscal_year": 2022, "agency_budgetary_resources": 10, "agency_total_obligated": 9, "agency_total_outlayed": 1}]},
+            "002": {"agency_data_by_year": [{"fiscal_year": 2022, "agency_budgetary_resources": 30, "agency_total_obligated": 5, "agency_total_outlayed": 2}]},
+            "003": {"agency_data_by_year": [{"fiscal_year": 2022, "agency_budgetary_resources": 20, "agency_total_obligated": 7, "agency_total_outlayed": 3}]}
+        }
+        self.fetcher = MagicMock(return_value=(names, resources, {}))
+    
+    def tearDown(self):
+        """Remove the temporary rankings directory."""
+        self.temp_dir.cleanup()
+    
+    def test_top_n_per_metric(self):
+        """Test that each metric is ranked and sliced to the limit."""
+        store = RankingStore(self.temp_dir.name, fetcher=self.fetcher)
+        
+        budget = store.top_n("2022", limit=2)
+        obligations = store.top_n("2022", limit=2, metric="obligations")
+        
+        self.assertEqual([row["agency_code"] for row in budget["data"]], ["002", "003"])
+        self.assertEqual([row["agency_code"] for row in obligations["data"]], ["001", "003"])
+        self.assertEqual(self.fetcher.call_count, 1)
+    
+    def test_closed_year_rankings_are_persisted(self):
+        """Test that a closed fiscal year is served from disk without refetching."""
+        RankingStore(self.temp_dir.name, fetcher=self.fetcher).top_n("2022")
+        fetcher = MagicMock(side_effect=RuntimeError("offline"))
+        
+        result = RankingStore(self.temp_dir.name, fetcher=fetcher).top_n("2022", limit=1, metric="outlays")
+        
+        self.assertEqual(result["data"][0]["agency_code"], "003")
+        fetcher.assert_not_called()
+
+    def test_ranking_built_before_year_close_is_rebuilt(self):
+        """Test that a ranking built while its year was open is rebuilt and persisted once the year closes."""
+        store = RankingStore(self.temp_dir.name, fetcher=self.fetcher)
+        store.build("2022")
+        # Pretend the ranking was built before FY 2022 ended and never persisted
+        for ranking in store._rankings.values():
+            ranking["built_at"] -= 10 * 365 * 24 * 60 * 60
+        os.remove(os.path.join(self.temp_dir.name, "fy2022.json"))
+        
+        store.get("2022")
+        store._executor.shutdown(wait=True)
+        
+        self.assertEqual(self.fetcher.call_count, 2)
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir.name, "fy2022.json")))
+        self.assertFalse(store._needs_rebuild(store._rankings[("2022", "budgetary_resources")]))
+
+    def test_missing_ranking_is_built_in_background(self):
+        """Test that a lookup without build returns nothing but can start a background build."""
+        store = RankingStore(self.temp_dir.name, fetcher=self.fetcher)
+        
+        self.assertIn("error", store.top_n("2022", build=False))
+        self.fetcher.assert_not_called()
+        self.assertIn("error", store.top_n("2022", build=False, build_in_background=True))
+        store._executor.shutdown(wait=True)
+        
+        self.assertEqual(self.fetcher.call_count, 1)
+        self.assertEqual(store.top_n("2022", limit=1, build=False)["data"][0]["agency_code"], "002")
+    
+    def test_disk_misses_are_remembered(self):
+        """Test that a year with no persisted rankings is not looked up on disk on every miss."""
+        store = RankingStore(self.temp_dir.name, fetcher=self.fetcher)
+        
+        with patch("builtins.open", side_effect=FileNotFoundError) as mock_open:
+            store.top_n("2022", build=False)
+            store.top_n("2022", build=False)
+        
+        self.assertEqual(mock_open.call_count, 1)
+
+class TestFiscalQuery(unittest.TestCase):
+    """Test cases for the Fiscal Data query builder."""
+    
+    def test_filters_are_separate_conditions(self):
+        """Test that each condition becomes its own filter clause."""
+        params = FiscalQuery().eq("fiscal_year", 2023).contains("classification_desc", "Defense").to_params()
+        self.assertEqual(params["filter"], "classification_desc:contains:Defense,fiscal_year:eq:2023")
+    
+    def test_in_filter(self):
+        """Test multi-value filters."""
+        params = FiscalQuery().in_("fiscal_year", [2023, 2021, 2022, 2021]).to_params()
+        self.assertEqual(params["filter"], "fiscal_year:in:(2021,2022,2023)")
+    
+    def test_equal_queries_produce_identical_urls(self):
+        """Test that query strings are canonical regardless of call order."""
+        first = FiscalQuery().gte("record_date", "2020-01-01").lte("record_date", "2020-12-31").fields("b", "a")
+        second = FiscalQuery().fields("a", "b").lte("record_date", "2020-12-31").gte("record_date", "2020-01-01")
+        self.assertEqual(first.url("endpoint"), second.url("endpoint"))
+        self.assertEqual(first, second)
+    
+    def test_unsupported_operator(self):
+        """Test that unknown operators are rejected."""
+        with self.assertRaises(ValueError):
+            FiscalQuery()._add_filter("fiscal_year", "between", "2020")
+    
+    def test_from_params_round_trip(self):
+        """Test that rendered parameters parse back into an equal query."""
+        query = FiscalQuery().in_("fiscal_year", [2022, 2023]).gte("record_date", "2022-01-01").fields("a", "b").sort("-record_date")
+        parsed = FiscalQuery.from_params(query.to_params())
+        self.assertEqual(parsed, query)
+        self.assertIn(("fiscal_year", "in", ["2022", "2023"]), parsed.conditions())
+
+class TestTreasuryWarehouse(unittest.TestCase):
+    """Test cases for answering queries from the local Treasury warehouse."""
+    
+    @patch('data_integration.treasury_warehouse.read_partition')
+    @patch('data_integration.treasury_warehouse.list_partitions')
+    def test_query_prunes_partitions_and_filters(self, mock_list, mock_read):
+        """Test that fiscal_year filters prune partitions and other filters apply to rows."""
+        mock_list.return_value = ["2021", "2022", "2023"]
+        mock_read.side_effect = lambda table, year: pd.DataFrame([
+            {"fiscal_year": year, "classification_desc": "Defense", "current_fytd_net_outly_amt": "10"},
+            {"fiscal_year": year, "classification_desc": "Education", "current_fytd_net_outly_amt": "5"}
+        ])
+        
+        params = FiscalQuery().in_("fiscal_year", [2022, 2023]).eq("classification_desc", "Defense").sort("-fiscal_year").to_params()
+        result = treasury_warehouse.query_params("mts_table_9", params)
+        
+        self.assertEqual(sorted(call.args[1] for call in mock_read.call_args_list), ["2022", "2023"])
+        self.assertEqual([row["fiscal_year"] for row in result["data"]], ["2023", "2022"])
+        self.assertEqual(result["meta"]["backend"], "local")
+    
+    @patch('data_integration.treasury_warehouse.save_manifest')
+    @patch('data_integration.treasury_warehouse.write_partition')
+    @patch('data_integration.treasury_warehouse.read_partition')
+    @patch('data_integration.treasury_warehouse.list_partitions')
+    @patch('data_integration.treasury_warehouse._download')
+    @patch('data_integration.treasury_warehouse.load_manifest')
+    def test_sync_replaces_restated_mts_rows(self, mock_manifest, mock_download, mock_list, mock_read, mock_write, mock_save):
+        """Test that an MTS sync re-downloads the restatement window and replaces those rows."""
+        mock_manifest.return_value = {"high_water_mark": "2023-06-30", "row_count": 3}
+        mock_list.return_value = ["2023"]
+        mock_read.return_value = pd.DataFrame([
+            {"record_date": "2023-01-31", "fiscal_year": "2023", "amount": "1"},
+            {"record_date": "2023-05-31", "fiscal_year": "2023", "amount": "2"},
+            {"record_date": "2023-06-30", "fiscal_year": "2023", "amount": "3"}
+        ])
+        mock_download.return_value = (pd.DataFrame([
+            {"record_date": "2023-05-31", "fiscal_year": "2023", "amount": "20"},
+            {"record_date": "2023-06-30", "fiscal_year": "2023", "amount": "3"},
+            {"record_date": "2023-07-31", "fiscal_year": "2023", "amount": "4"}
+        ]), {"amount": "CURRENCY"})
+        
+        with patch.object(treasury_warehouse, 'TREASURY_RESTATEMENT_MONTHS', 3):
+            manifest = treasury_warehouse.sync_table("mts_table_9")
+        
+        query = mock_download.call_args.args[1]
+        self.assertEqual(query.conditions(), [("record_date", "gt", "2023-03-30")])
+        written = mock_write.call_args.args[2]
+        self.assertEqual(list(written["amount"]), ["1", "20", "3", "4"])
+        self.assertEqual(manifest["high_water_mark"], "2023-07-31")
+        self.assertEqual(manifest["row_count"], 4)
+
+class TestResponseCache(unittest.TestCase):
+    """Test cases for the persistent response cache."""
+    
+    def test_cache_key_ignores_parameter_order(self):
+        """Test that equal requests share a cache key."""
+        first = response_cache.cache_key("GET", "endpoint", {"a": 1, "b": 2})
+        second = response_cache.cache_key("GET", "endpoint", {"b": 2, "a": 1})
+        self.assertEqual(first, second)
+    
+    def test_ttl_for_closed_and_current_years(self):
+        """Test that closed fiscal years are cached far longer than the current one."""
+        current = response_cache.current_fiscal_year()
+        closed_ttl = response_cache.ttl_for("mts_table_9", {"filter": f"fiscal_year:eq:{current - 2}"})
+        current_ttl = response_cache.ttl_for("mts_table_9", {"filter": f"fiscal_year:eq:{current}"})
+        open_ended_ttl = response_cache.ttl_for("mts_table_9", {"filter": f"fiscal_year:gte:{current - 2}"})
+        self.assertEqual(closed_ttl, response_cache.CLOSED_YEAR_TTL)
+        self.assertEqual(current_ttl, response_cache.DEFAULT_TTL)
+        self.assertEqual(open_ended_ttl, response_cache.DEFAULT_TTL)
+        self.assertEqual(response_cache.ttl_for("debt_to_penny", {}), response_cache.DEBT_TO_PENNY_TTL)
+    
+    def test_recently_closed_year_waits_for_grace_period(self):
+        """Test that a fiscal year is not cached as closed until restatements have settled."""
+        from datetime import date
+        
+        params = {"filter": "fiscal_year:eq:2023"}
+        with patch.object(response_cache, "CLOSED_YEAR_GRACE_DAYS", 90):
+            early_october = response_cache.ttl_for("mts_table_9", params, today=date(2023, 10, 15))
+            after_grace = response_cache.ttl_for("mts_table_9", params, today=date(2024, 1, 1))
+        self.assertEqual(early_october, response_cache.DEFAULT_TTL)
+        self.assertEqual(after_grace, response_cache.CLOSED_YEAR_TTL)
+    
+    def test_store_and_load(self):
+        """Test that entries round-trip through disk."""
+        import tempfile
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with patch.object(response_cache, "RESPONSE_CACHE_DIR", cache_dir):
+                key = response_cache.cache_key("GET", "endpoint")
+                response_cache.store(key, {"data": [1]}, ttl=60, etag='"abc"')
+                entry = response_cache.load(key)
+        
+        self.assertEqual(entry["body"], {"data": [1]})
+        self.assertTrue(response_cache.is_fresh(entry))
+        self.assertEqual(response_cache.conditional_headers(entry), {"If-None-Match": '"abc"'})
+
+    def test_prune_evicts_least_recently_used(self):
+        """Test that pruning removes the least recently used entries first."""
+        import tempfile
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with patch.object(response_cache, "RESPONSE_CACHE_DIR", cache_dir):
+                keys = [response_cache.cache_key("GET", f"endpoint/{n}") for n in range(3)]
+                for age, key in zip((300, 200, 100), keys):
+                    response_cache.store(key, {"data": [key]}, ttl=60)
+                    path = response_cache._entry_path(key)
+                    os.utime(path, (os.path.getmtime(path) - age,) * 2)
+                # Reading the oldest entry makes it the most recently used
+                response_cache.load(keys[0])
+                
+                removed = response_cache.prune(max_entries=2)
+                remaining = [key for key in keys if response_cache.load(key) is not None]
+        
+        self.assertEqual(removed, 1)
+        self.assertEqual(remaining, [keys[0], keys[2]])
+
+class TestHTTPClient(unittest.TestCase):
+    """Test cases for the shared HTTP client."""
+    
+    def _response(self, status_code, body=None, headers=None):
+        """Build a fake requests.Response."""
+        response = MagicMock(status_code=status_code, headers=headers or {})
+        response.json.return_value = body
+        return response
+    
+    def test_shared_session_pools_per_upstream(self):
+        """Test that one session is reused with a dedicated, sized pool per upstream host."""
+        with patch.object(http_client, "_session", None), \
+                patch.object(http_client, "HTTP_POOL_CONNECTIONS", 4), \
+                patch.object(http_client, "HTTP_POOL_MAXSIZE", 12):
+            session = http_client.get_session()
+            self.assertIs(http_client.get_session(), session)
+            
+            treasury = session.get_adapter("https://api.fiscaldata.treasury.gov/services/api")
+            usaspending = session.get_adapter("https://api.usaspending.gov/api/v2")
+            http_client.close_session()
+            self.assertIsNone(http_client._session)
+        
+        self.assertIsNot(treasury, usaspending)
+        self.assertEqual(treasury._pool_maxsize, 12)
+        self.assertEqual(usaspending._pool_connections, 4)
+        self.assertEqual(treasury.max_retries.total, 0)
+    
+    def _send(self, responses, max_retries=3, budget=None):
+        """Run _send_with_retries against a fake session, returning (result, session, sleep mock)."""
+        session = MagicMock()
+        session.request.side_effect = responses
+        with patch.object(http_client, "get_session", return_value=session), \
+                patch.object(http_client, "HTTP_MAX_RETRIES", max_retries), \
+                patch.object(http_client, "HTTP_BACKOFF_CAP", 5), \
+                patch.object(http_client, "_retry_budget", budget or RetryBudget(ratio=10, min_retries_per_second=10)), \
+                patch.object(http_client.time, "sleep") as mock_sleep:
+            result = http_client._send_with_retries("GET", "https://api.example.test/records", None, None, {}, None)
+        return result, session, mock_sleep
+    
+    def test_retry_honors_retry_after(self):
+        """Test that a 429 is retried after the upstream's Retry-After delay."""
+        ok = self._response(200, {"data": []})
+        
+        result, session, mock_sleep = self._send([self._response(429, headers={"Retry-After": "2"}), ok])
+        
+        self.assertIs(result, ok)
+        self.assertEqual(session.request.call_count, 2)
+        mock_sleep.assert_called_once_with(2.0)
+    
+    def test_retry_after_is_capped(self):
+        """Test that a long Retry-After is capped at HTTP_BACKOFF_CAP."""
+        result, _, mock_sleep = self._send([self._response(503, headers={"Retry-After": "120"}), self._response(200)])
+        
+        self.assertEqual(result.status_code, 200)
+        mock_sleep.assert_called_once_with(5)
+    
+    def test_exhausted_retries_return_last_response(self):
+        """Test that the last error response is returned once attempts run out."""
+        responses = [self._response(503) for _ in range(3)]
+        
+        result, session, mock_sleep = self._send(responses, max_retries=2)
+        
+        self.assertIs(result, responses[-1])
+        self.assertEqual(session.request.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+    
+    def test_exhausted_retry_budget_stops_retrying(self):
+        """Test that no retry is attempted when the retry budget is spent."""
+        budget = MagicMock()
+        budget.try_spend.return_value = False
+        
+        result, session, mock_sleep = self._send([self._response(429, headers={"Retry-After": "1"})], budget=budget)
+        
+        self.assertEqual(result.status_code, 429)
+        self.assertEqual(session.request.call_count, 1)
+        mock_sleep.assert_not_called()
+    
+    def test_connection_errors_raise_retry_error(self):
+        """Test that repeated connection errors raise RetryError after the last attempt."""
+        import requests
+        
+        errors = [requests.exceptions.ConnectionError("refused") for _ in range(2)]
+        with self.assertRaises(requests.exceptions.RetryError):
+            self._send(errors, max_retries=1)
+    
+    def test_cache_bypass_is_not_coalesced_with_cached_call(self):
+        """Test that a use_cache=False call does not share an in-flight cached call's result."""
+        import threading
+        import time
+        
+        release = threading.Event()
+        calls = []
+        
+        def fake_send(method, url, params, json_body, headers, timeout):
+            calls.append(url)
+            release.wait(2)
+            return self._response(200, {"call": len(calls)})
+        
+        def wait_for_calls(count):
+            deadline = time.monotonic() + 2
+            while len(calls) < count and time.monotonic() < deadline:
+                time.sleep(0.01)
+        
+        url = "https://api.example.test/records"
+        with patch.object(http_client, "_send_with_retries", side_effect=fake_send), \
+                patch.object(http_client.response_cache, "load", return_value=None), \
+                patch.object(http_client.response_cache, "store"):
+            cached = threading.Thread(target=http_client.get_json, args=(url,))
+            cached.start()
+            wait_for_calls(1)
+            bypass = threading.Thread(target=http_client.get_json, args=(url,), kwargs={"use_cache": False})
+            bypass.start()
+            wait_for_calls(2)
+            release.set()
+            cached.join()
+            bypass.join()
+        
+        self.assertEqual(len(calls), 2)
+
+class TestResultCache(unittest.TestCase):
+    """Test cases for the in-memory LRU/TTL result cache."""
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = TTLCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+    
+    def test_ttl_expiry(self):
+        """Test that expired entries are treated as misses."""
+        cache = TTLCache(ttl=0)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["misses"], 1)
+    
+    def test_byte_bound(self):
+        """Test that the total size stays within the byte bound."""
+        cache = TTLCache(max_bytes=20)
+        cache.set("a", "x" * 10)
+        cache.set("b", "y" * 10)
+        self.assertLessEqual(cache.stats()["bytes"], 20)
+        self.assertFalse(cache.set("c", "z" * 50))
+
+class TestSingleFlight(unittest.TestCase):
+    """Test cases for single-flight request coalescing."""
+    
+    def test_concurrent_threads_share_one_call(self):
+        """Test that concurrent callers with the same key trigger one execution."""
+        import threading
+        import time
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        
+        def slow_fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"data": [1]}
+        
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do("key", slow_fetch)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flight.do("key", slow_fetch))) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        while flight.stats()["coalesced"] < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(result is results[0] for result in results))
+    
+    def test_concurrent_coroutines_share_one_call(self):
+        """Test that concurrent awaits with the same key trigger one execution."""
+        import asyncio
+        flight = SingleFlight()
+        calls = []
+        
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 42
+        
+        async def run():
+            return await asyncio.gather(*[flight.do_async("key", fetch) for _ in range(5)])
+        
+        self.assertEqual(asyncio.run(run()), [42] * 5)
+        self.assertEqual(len(calls), 1)
+
+class TestAsyncConnectors(unittest.TestCase):
+    """Test cases for the asyncio connector clients."""
+    
+    def test_connector_runs_on_worker_pool(self):
+        """Test that a connector call runs off the event loop and returns the connector's result."""
+        import asyncio
+        import threading
+        
+        threads = []
+        
+        def fake_debt(start_date, end_date):
+            threads.append(threading.current_thread().name)
+            return {"data": [{"record_date": start_date}]}
+        
+        async def run():
+            return await async_connectors.AsyncTreasuryClient().get_debt_to_penny("2023-01-01", "2023-01-31")
+        
+        with patch.object(async_connectors.treasury_connector, "get_debt_to_penny", autospec=True, side_effect=fake_debt):
+            result = asyncio.run(run())
+        
+        self.assertEqual(result, {"data": [{"record_date": "2023-01-01"}]})
+        self.assertTrue(threads[0].startswith("async-connector"))
+    
+    def test_identical_concurrent_awaits_are_coalesced(self):
+        """Test that concurrent identical awaits share one call and different arguments do not."""
+        import asyncio
+        import time
+        
+        def fake_resources(agency_code, fiscal_year):
+            time.sleep(0.05)
+            return {"agency_code": agency_code}
+        
+        async def run():
+            client = async_connectors.AsyncUSASpendingClient()
+            return await asyncio.gather(
+                client.get_agency_budgetary_resources("097", "2023"),
+                client.get_agency_budgetary_resources("097", "2023"),
+                client.get_agency_budgetary_resources("012", "2023")
+            )
+        
+        with patch.object(async_connectors.usaspending_connector, "get_agency_budgetary_resources", autospec=True, side_effect=fake_resources) as mock_fetch:
+            results = asyncio.run(run())
+        
+        self.assertEqual(mock_fetch.call_count, 2)
+        self.assertEqual([result["agency_code"] for result in results], ["097", "097", "012"])
+
+class TestTopAgenciesByBudget(unittest.TestCase):
+    """Test cases for the concurrent top agencies fan-out."""
+    
+    def test_top_agencies_with_partial_failure(self):
+        """Test that the top agencies are selected and failures are reported."""
+        agencies = [{"code": code, "name": f"Agency {code}"} for code in ["001", "002", "003", "004"]]
+        budgets = {"001": 10, "002": 40, "004": 30}
+        
+        def fake_resources(agency_code, fiscal_year):
+            if agency_code not in budgets:
+                return {"error": "503 Server Error"}
+            return {"total_budgetary_resources": budgets[agency_code]}
+        
+        with patch.object(usaspending_connector, "get_agencies", return_value=agencies), \
+             patch.object(usaspending_connector, "get_agency_budgetary_resources", side_effect=fake_resources):
+            result = usaspending_connector.get_top_agencies_by_budget("2023", limit=2, max_concurrency=2)
+        
+        self.assertEqual([a["agency_code"] for a in result["data"]], ["002", "004"])
+        self.assertTrue(result["metadata"]["partial"])
+        self.assertEqual([f["agency_code"] for f in result["metadata"]["agencies_failed"]], ["003"])
+
+    def test_top_agencies_error_when_every_agency_fails(self):
+        """Test that an error is returned instead of an empty ranking when no agency succeeds."""
+        agencies = [{"code": code, "name": f"Agency {code}"} for code in ["001", "002"]]
+        
+        with patch.object(usaspending_connector, "get_agencies", return_value=agencies), \
+             patch.object(usaspending_connector, "get_agency_budgetary_resources", side_effect=CircuitOpenError("Circuit is open")):
+            result = usaspending_connector.get_top_agencies_by_budget("2023", limit=2, max_concurrency=2)
+        
+        self.assertIn("error", result)
+        self.assertIn("Circuit is open", result["error"])
+
+    def test_slow_call_times_out_without_blocking_others(self):
+        """Test that a call past its timeout is reported as failed while the rest complete."""
+        import threading
+
+        release = threading.Event()
+
+        def slow_call():
+            release.wait(2)
+            return "late"
+
+        def failing_call():
+            raise ValueError("boom")
+
+        calls = {
+            "slow": (slow_call, ()),
+            "fast": (lambda: "ok", ()),
+            "error": (lambda: {"error": "503 Server Error"}, ()),
+            "raises": (failing_call, ()),
+            "queued": (lambda: "also ok", ())
+        }
+        try:
+            results, failures = usaspending_connector._fetch_concurrently(calls, max_concurrency=2, timeout=0.1)
+        finally:
+            release.set()
+
+        self.assertEqual(results, {"fast": "ok", "queued": "also ok"})
+        self.assertEqual(set(failures), {"slow", "error", "raises"})
+        self.assertIn("Timed out after", failures["slow"])
+        self.assertEqual(failures["error"], "503 Server Error")
+        self.assertEqual(failures["raises"], "boom")
+
+    def test_deadline_covers_calls_waiting_for_a_worker(self):
+        """Test that calls still queued behind a busy pool fail at the fan-out deadline."""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        
+        release = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown, wait=False)
+        # Another fan-out holds the only worker
+        executor.submit(release.wait, 2)
+        
+        calls = {n: (lambda: "ok", ()) for n in range(3)}
+        started = time.monotonic()
+        try:
+            results, failures = usaspending_connector._fetch_concurrently(
+                calls, max_concurrency=2, timeout=10, deadline=0.2, executor=executor
+            )
+        finally:
+            release.set()
+        
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(results, {})
+        self.assertEqual(set(failures), {0, 1, 2})
+        self.assertTrue(all("deadline" in error for error in failures.values()))
+    
+    def test_concurrent_fan_outs_share_the_worker_pool(self):
+        """Test that simultaneous fan-outs together stay within the process-wide cap."""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        
+        lock = threading.Lock()
+        in_flight = [0]
+        peak = [0]
+        
+        def slow_call(n):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return n
+        
+        calls = {n: (slow_call, (n,)) for n in range(6)}
+        with patch.object(usaspending_connector, "_fanout_executor", ThreadPoolExecutor(max_workers=2)):
+            threads = [
+                threading.Thread(target=usaspending_connector._fetch_concurrently, args=(calls, 4))
+                for _ in range(3)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual(peak[0], 2)
+
+class TestRateLimiter(unittest.TestCase):
+    """Test cases for client-side rate limiting and retry policy."""
+    
+    def test_token_bucket_burst(self):
+        """Test that the bucket allows a burst up to its capacity."""
+        bucket = TokenBucket(rate=1, capacity=2)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertGreater(bucket.try_acquire(), 0)
+    
+    def test_retry_budget_is_bounded(self):
+        """Test that retries stop once the budget is spent."""
+        budget = RetryBudget(ratio=0.5, min_retries_per_second=0, window=60)
+        for _ in range(4):
+            budget.record_request()
+        allowed = sum(budget.try_spend() for _ in range(10))
+        self.assertEqual(allowed, 2)
+    
+    def test_parse_retry_after(self):
+        """Test Retry-After parsing."""
+        self.assertEqual(parse_retry_after("5"), 5.0)
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for the per-upstream circuit breaker."""
+    
+    def test_opens_on_failure_rate_and_recovers(self):
+        """Test that the breaker opens, rejects calls, and closes after a good probe."""
+        breaker = CircuitBreaker("upstream", failure_rate=0.5, window=4, min_calls=4, open_seconds=0.01)
+        for success in [True, False, False, True]:
+            breaker.before_call()
+            breaker.record(success, 0.1)
+        
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        
+        import time
+        time.sleep(0.02)
+        breaker.before_call()
+        self.assertEqual(breaker.state, "half_open")
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, "closed")
+    
+    def test_opens_on_slow_calls(self):
+        """Test that slow calls count toward opening the breaker."""
+        breaker = CircuitBreaker("upstream", slow_call_rate=0.5, slow_call_seconds=1, window=2, min_calls=2)
+        breaker.record(True, 5)
+        breaker.record(True, 5)
+        self.assertEqual(breaker.state, "open")
 
 class TestDataIntegration(unittest.TestCase):
     """Test cases for the MCP Server data integration module."""
@@ -95,6 +1141,255 @@ class TestDataIntegration(unittest.TestCase):
         processed = process_query_parameters(params)
         self.assertEqual(processed["comparison"], True)
 
+class TestDataStreaming(unittest.TestCase):
+    """Test cases for NDJSON streaming of /api/data responses."""
+    
+    def _collect(self, request, years):
+        """Run the stream and decode its NDJSON lines."""
+        import asyncio
+        
+        async def run():
+            return [json.loads(line) async for line in server.stream_budget_data(request, years, request.limit or 10)]
+        
+        return asyncio.run(run())
+    
+    @patch('mcp_server.server.fetch_usaspending_data')
+    def test_rows_then_metadata_trailer(self, mock_fetch):
+        """Test that each row is its own record and metadata comes last."""
+        async def fake_fetch(entity, year, limit):
+            return [{"department": "Department of Defense", "year": year, "amount": 1, "source": "USASpending.gov"}]
+        mock_fetch.side_effect = fake_fetch
+        
+        records = self._collect(server.DataRequest(time_period="2022-2023", stream=True), ["2022", "2023"])
+        
+        self.assertEqual([record["data"]["year"] for record in records[:-1]], ["2022", "2023"])
+        self.assertEqual(records[-1]["metadata"]["result_count"], 2)
+        self.assertTrue(records[-1]["metadata"]["streamed"])
+    
+    @patch('mcp_server.server.fetch_usaspending_data')
+    def test_failure_is_reported_in_band(self, mock_fetch):
+        """Test that a failure after streaming started ends the stream with an error record."""
+        mock_fetch.side_effect = RuntimeError("upstream down")
+        
+        records = self._collect(server.DataRequest(time_period="2023", stream=True), ["2023"])
+        
+        self.assertIn("upstream down", records[-1]["error"])
+
+class TestConcurrentFetching(unittest.TestCase):
+    """Test cases for the concurrent per-year fetches behind /api/data."""
+    
+    def _collect(self, years):
+        """Run iter_year_rows and collect its (year, rows) pairs."""
+        import asyncio
+        
+        async def run():
+            return [item async for item in server.iter_year_rows(None, years, 10)]
+        
+        return asyncio.run(run())
+    
+    @patch('mcp_server.server.DATA_FETCH_CONCURRENCY', 2)
+    @patch('mcp_server.server.fetch_usaspending_data')
+    def test_years_fetched_concurrently_within_limit(self, mock_fetch):
+        """Test that years overlap up to the concurrency limit and come back in year order."""
+        import asyncio
+        
+        in_flight = []
+        peak = []
+        
+        async def fake_fetch(entity, year, limit):
+            in_flight.append(year)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.05)
+            in_flight.remove(year)
+            return [{"department": "Department of Defense", "year": year, "amount": 1, "source": "USASpending.gov"}]
+        mock_fetch.side_effect = fake_fetch
+        
+        years = ["2019", "2020", "2021", "2022"]
+        results = self._collect(years)
+        
+        self.assertEqual([year for year, _ in results], years)
+        self.assertEqual(max(peak), 2)
+    
+    @patch('mcp_server.server.DATA_FETCH_DEADLINE', 0.05)
+    @patch('mcp_server.server.fetch_usaspending_data')
+    def test_deadline(self, mock_fetch):
+        """Test that fetches still running at the deadline raise a timeout."""
+        import asyncio
+        
+        async def slow_fetch(entity, year, limit):
+            await asyncio.sleep(1)
+            return []
+        mock_fetch.side_effect = slow_fetch
+        
+        with self.assertRaises(asyncio.TimeoutError):
+            self._collect(["2022", "2023"])
+
+class TestDataPagination(unittest.TestCase):
+    """Test cases for cursor pagination of /api/data responses."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        server.result_snapshots.clear()
+        self.http_request = MagicMock()
+        self.http_request.headers = {}
+    
+    def _post(self, request):
+        """Call the endpoint and decode its JSON body."""
+        import asyncio
+        
+        response = asyncio.run(server.get_budget_data(request, self.http_request))
+        return json.loads(response.body)
+    
+    @patch('mcp_server.server.fetch_usaspending_data')
+    def test_pages_come_from_snapshot(self, mock_fetch):
+        """Test that later pages are served from the snapshot without refetching."""
+        async def fake_fetch(entity, year, limit):
+            return [{"department": f"Agency {i}", "year": year, "amount": i, "source": "USASpending.gov"} for i in range(5)]
+        mock_fetch.side_effect = fake_fetch
+        
+        first = self._post(server.DataRequest(time_period="2022-2023", page_size=4))
+        rows = first["data"]
+        cursor = first["metadata"]["pagination"]["next_cursor"]
+        while cursor:
+            page = self._post(server.DataRequest(cursor=cursor))
+            rows.extend(page["data"])
+            cursor = page["metadata"]["pagination"]["next_cursor"]
+        
+        self.assertEqual(mock_fetch.call_count, 2)
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(first["metadata"]["pagination"]["total_count"], 10)
+        self.assertEqual(page["metadata"]["pagination"]["count"], 2)
+    
+    def test_expired_cursor(self):
+        """Test that a cursor whose snapshot has expired is rejected with 410."""
+        from fastapi import HTTPException
+        
+        with self.assertRaises(HTTPException) as context:
+            self._post(server.DataRequest(cursor=server.encode_cursor("expired", 10, 10)))
+        self.assertEqual(context.exception.status_code, 410)
+    
+    def test_cursor_round_trip(self):
+        """Test that cursors decode to what was encoded and reject garbage."""
+        self.assertEqual(server.decode_cursor(server.encode_cursor("abc", 20, 10)), ("abc", 20, 10))
+        with self.assertRaises(ValueError):
+            server.decode_cursor("not-a-cursor")
+    
+    def test_cursor_page_size_is_bounded(self):
+        """Test that a hand-crafted cursor cannot ask for more than MAX_PAGE_SIZE rows."""
+        from fastapi import HTTPException
+        
+        cursor = server.encode_cursor("abc", 0, server.MAX_PAGE_SIZE + 1)
+        with self.assertRaises(HTTPException) as context:
+            self._post(server.DataRequest(cursor=cursor))
+        self.assertEqual(context.exception.status_code, 400)
+
+class TestResponseFormats(unittest.TestCase):
+    """Test cases for the columnar and Arrow response layouts."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.rows = [
+            {"department": "Department of Defense", "year": "2023", "amount": 816700000000},
+            {"department": "Department of Education", "amount": 79800000000.5}
+        ]
+    
+    def test_columnar_shape(self):
+        """Test that columns are listed once and missing values become None."""
+        columnar = response_formats.to_columnar(self.rows)
+        
+        self.assertEqual(columnar["columns"], ["department", "year", "amount"])
+        self.assertEqual(columnar["values"]["year"], ["2023", None])
+        self.assertEqual(columnar["values"]["amount"], [816700000000, 79800000000.5])
+    
+    def test_negotiate_layout(self):
+        """Test that an explicit format wins over the Accept header."""
+        self.assertEqual(response_formats.negotiate_layout("application/json"), "rows")
+        self.assertEqual(
+            response_formats.negotiate_layout("application/vnd.apache.arrow.stream;q=0.9, */*"),
+            "arrow"
+        )
+        self.assertEqual(
+            response_formats.negotiate_layout("application/vnd.apache.arrow.stream", "columnar"),
+            "columnar"
+        )
+        with self.assertRaises(ValueError):
+            response_formats.negotiate_layout(None, "xml")
+    
+    def test_budget_formatter_columnar_from_dataframe(self):
+        """Test that a DataFrame is formatted column by column with NaN as None."""
+        df = pd.DataFrame({"agency": ["A", "B"], "amount": [1.5, float("nan")]})
+        
+        formatted = usaspending_connector.format_budget_data_for_client(df, layout="columnar")
+        
+        self.assertEqual(formatted["data"], {"columns": ["agency", "amount"], "values": {"agency": ["A", "B"], "amount": [1.5, None]}})
+        self.assertEqual(formatted["metadata"]["record_count"], 2)
+    
+    @unittest.skipUnless(response_formats.arrow_available(), "pyarrow is not installed")
+    def test_arrow_round_trip(self):
+        """Test that an Arrow IPC stream carries the rows and the metadata."""
+        import pyarrow as pa
+        
+        payload = response_formats.columnar_to_arrow(response_formats.to_columnar(self.rows), {"result_count": 2})
+        table = pa.ipc.open_stream(payload).read_all()
+        
+        self.assertEqual(table.column("amount").to_pylist(), [816700000000.0, 79800000000.5])
+        self.assertEqual(json.loads(table.schema.metadata[b"metadata"])["result_count"], 2)
+
+class TestSerialization(unittest.TestCase):
+    """Test cases for the JSON serialization helpers."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        import numpy as np
+        from decimal import Decimal
+        
+        self.value = {
+            "record_date": pd.Timestamp("2023-09-30"),
+            "amount": np.int64(816700000000),
+            "ratio": Decimal("1.5"),
+            "department": "Department of Défense"
+        }
+        self.expected = {
+            "record_date": "2023-09-30T00:00:00",
+            "amount": 816700000000,
+            "ratio": 1.5,
+            "department": "Department of Défense"
+        }
+    
+    def test_dumps_round_trip(self):
+        """Test that pandas, numpy and Decimal values are encoded compactly."""
+        encoded = serialization.dumps(self.value)
+        
+        self.assertIsInstance(encoded, bytes)
+        self.assertNotIn(b", ", encoded)
+        self.assertEqual(serialization.loads(encoded), self.expected)
+    
+    def test_json_fallback_matches(self):
+        """Test that the standard library fallback produces the same document."""
+        with patch.object(serialization, "BACKEND", "json"):
+            encoded = serialization.dumps(self.value)
+        
+        self.assertEqual(json.loads(encoded), self.expected)
+    
+    def test_non_finite_floats_are_null_with_both_backends(self):
+        """Test that NaN and infinity become null instead of invalid JSON tokens."""
+        import numpy as np
+        
+        value = {"amount": float("nan"), "values": [float("inf"), np.float64("-inf"), 1.5]}
+        for backend in set([serialization.BACKEND, "json"]):
+            with self.subTest(backend=backend), patch.object(serialization, "BACKEND", backend):
+                encoded = serialization.dumps(value)
+                self.assertNotIn(b"NaN", encoded)
+                self.assertEqual(json.loads(encoded), {"amount": None, "values": [None, None, 1.5]})
+    
+    def test_trusted_response(self):
+        """Test that a trusted response carries the serialized body."""
+        response = serialization.trusted_response({"data": [{"amount": 1}]}, headers={"Vary": "Accept"})
+        
+        self.assertEqual(response.media_type, "application/json")
+        self.assertEqual(response.headers["vary"], "Accept")
+        self.assertEqual(json.loads(response.body), {"data": [{"amount": 1}]})
+
 class TestGeminiAPIClient(unittest.TestCase):
     """Test cases for the Gemini API Client."""
     
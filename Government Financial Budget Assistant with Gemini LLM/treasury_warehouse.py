@@ -0,0 +1,542 @@
+"""
+Local Treasury Data Warehouse for Government Financial Budget Assistant
+
+This module bulk-downloads Treasury.gov Fiscal Data tables (MTS and debt) into
+a local columnar store of Parquet files partitioned by fiscal year, and answers
+Fiscal Data style queries from those files. treasury_connector uses it when
+TREASURY_BACKEND is "local" or "auto".
+
+Layout:
+    <TREASURY_WAREHOUSE_DIR>/<table>/fiscal_year=<YYYY>/part.parquet
+    <TREASURY_WAREHOUSE_DIR>/<table>/_manifest.json
+
+Writing and reading Parquet requires pyarrow. Bootstrap the warehouse with a
+full ingest, then keep it current with a nightly incremental sync:
+    python treasury_warehouse.py ingest
+    python treasury_warehouse.py sync
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import pandas as pd
+from datetime import datetime
+from dotenv import load_dotenv
+
+from fiscal_query import FiscalQuery
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Warehouse configuration
+TREASURY_WAREHOUSE_DIR = os.getenv("TREASURY_WAREHOUSE_DIR", os.path.join("warehouse", "treasury"))
+TREASURY_RESTATEMENT_MONTHS = int(os.getenv("TREASURY_RESTATEMENT_MONTHS", "3"))
+
+# Tables kept in the warehouse and their Fiscal Data endpoint paths
+WAREHOUSE_TABLES = {
+    "mts_table_1": "v1/accounting/mts/mts_table_1",
+    "mts_table_4": "v1/accounting/mts/mts_table_4",
+    "mts_table_5": "v1/accounting/mts/mts_table_5",
+    "mts_table_9": "v1/accounting/mts/mts_table_9",
+    "debt_outstanding": "v2/accounting/od/debt_outstanding",
+    "debt_to_penny": "v2/accounting/od/debt_to_penny",
+}
+
+PARTITION_COLUMN = "fiscal_year"
+MANIFEST_FILE = "_manifest.json"
+
+def table_for_endpoint(endpoint):
+    """
+    Get the warehouse table name for a Fiscal Data endpoint URL.
+
+    Args:
+        endpoint (str): Fiscal Data endpoint URL
+
+    Returns:
+        str: Table name, or None if the table is not kept in the warehouse
+    """
+    table = endpoint.rstrip("/").rsplit("/", 1)[-1]
+    return table if table in WAREHOUSE_TABLES else None
+
+def _table_dir(table):
+    """Get the directory holding a table's partitions."""
+    return os.path.join(TREASURY_WAREHOUSE_DIR, table)
+
+def _partition_path(table, fiscal_year):
+    """Get the Parquet file path for one fiscal year partition."""
+    return os.path.join(_table_dir(table), f"{PARTITION_COLUMN}={fiscal_year}", "part.parquet")
+
+def is_ingested(table):
+    """
+    Check whether a table has been ingested into the warehouse.
+
+    Args:
+        table (str): Table name
+
+    Returns:
+        bool: True if the table has a manifest
+    """
+    return os.path.exists(os.path.join(_table_dir(table), MANIFEST_FILE))
+
+def load_manifest(table):
+    """
+    Load a table's manifest.
+
+    Args:
+        table (str): Table name
+
+    Returns:
+        dict: Manifest (empty if the table has not been ingested)
+    """
+    try:
+        with open(os.path.join(_table_dir(table), MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(table, manifest):
+    """
+    Write a table's manifest atomically.
+
+    Args:
+        table (str): Table name
+        manifest (dict): Manifest contents
+    """
+    os.makedirs(_table_dir(table), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=_table_dir(table), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(_table_dir(table), MANIFEST_FILE))
+
+def partition_years(df):
+    """
+    Derive the fiscal year partition of every row.
+
+    MTS tables carry a fiscal year column; debt tables are partitioned by the
+    federal fiscal year (starting October 1) of their record date.
+
+    Args:
+        df (pd.DataFrame): Table rows
+
+    Returns:
+        pd.Series: Fiscal year (str) per row
+    """
+    for column in ("fiscal_year", "record_fiscal_year"):
+        if column in df.columns:
+            return df[column].astype(str)
+
+    record_dates = pd.to_datetime(df["record_date"])
+    return (record_dates.dt.year + (record_dates.dt.month >= 10).astype(int)).astype(str)
+
+def write_partition(table, fiscal_year, df):
+    """
+    Write one fiscal year partition atomically, replacing any previous version.
+
+    Args:
+        table (str): Table name
+        fiscal_year (str): Fiscal year of the partition
+        df (pd.DataFrame): Rows of the partition
+    """
+    path = _partition_path(table, fiscal_year)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def read_partition(table, fiscal_year):
+    """
+    Read one fiscal year partition.
+
+    Args:
+        table (str): Table name
+        fiscal_year (str): Fiscal year of the partition
+
+    Returns:
+        pd.DataFrame: Partition rows (empty if the partition does not exist)
+    """
+    path = _partition_path(table, fiscal_year)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_parquet(path)
+
+def list_partitions(table):
+    """
+    List the fiscal years stored for a table.
+
+    Args:
+        table (str): Table name
+
+    Returns:
+        list: Fiscal years (str) in ascending order
+    """
+    if not os.path.isdir(_table_dir(table)):
+        return []
+    prefix = f"{PARTITION_COLUMN}="
+    return sorted(
+        name[len(prefix):]
+        for name in os.listdir(_table_dir(table))
+        if name.startswith(prefix) and os.path.exists(os.path.join(_table_dir(table), name, "part.parquet"))
+    )
+
+def _download(table, query):
+    """
+    Download the rows of a table matching a query from the Fiscal Data API.
+
+    Args:
+        table (str): Table name (a key of WAREHOUSE_TABLES)
+        query (FiscalQuery): Filters to apply upstream
+
+    Returns:
+        tuple: (pd.DataFrame of downloaded rows, dict of column types from meta.dataTypes)
+    """
+    # Imported here because treasury_connector reads from the warehouse in local mode
+    from treasury_connector import BASE_URL, iter_fiscal_data_pages
+
+    endpoint = f"{BASE_URL}/{WAREHOUSE_TABLES[table]}"
+    records = []
+    data_types = {}
+    # Bulk pages are stored in the warehouse, so keep them out of the response cache
+    for page in iter_fiscal_data_pages(endpoint, query.to_params(), use_cache=False):
+        data_types = data_types or page.get("meta", {}).get("dataTypes", {})
+        records.extend(page.get("data", []))
+    return pd.DataFrame(records), data_types
+
+def _max_record_date(df):
+    """Get the latest record_date of a frame, or None if it has no rows."""
+    if df.empty or "record_date" not in df.columns:
+        return None
+    return df["record_date"].max()
+
+def ingest_table(table):
+    """
+    Bulk-download a full table from Fiscal Data and store it partitioned by fiscal year.
+
+    Args:
+        table (str): Table name (a key of WAREHOUSE_TABLES)
+
+    Returns:
+        dict: The table's new manifest
+    """
+    logger.info(f"Ingesting {table} into the local warehouse")
+    df, data_types = _download(table, FiscalQuery())
+
+    written = []
+    if not df.empty:
+        years = partition_years(df)
+        for fiscal_year, partition in df.groupby(years, sort=True):
+            write_partition(table, fiscal_year, partition.reset_index(drop=True))
+            written.append(fiscal_year)
+
+    # Remove partitions that no longer exist upstream
+    for fiscal_year in set(list_partitions(table)) - set(written):
+        shutil.rmtree(os.path.dirname(_partition_path(table, fiscal_year)), ignore_errors=True)
+
+    now = datetime.now().isoformat()
+    manifest = {
+        "table": table,
+        "ingested_at": now,
+        "synced_at": now,
+        "row_count": len(df),
+        "partitions": written,
+        "high_water_mark": _max_record_date(df),
+        "data_types": data_types
+    }
+    save_manifest(table, manifest)
+    logger.info(f"Ingested {len(df)} rows of {table} into {len(written)} partitions")
+    return manifest
+
+def sync_start(table, high_water_mark):
+    """
+    Get the record_date after which rows are re-downloaded by an incremental sync.
+
+    Debt tables only ever gain new rows, so the sync resumes right after the
+    high-water mark. MTS tables can restate recent months, so the last
+    TREASURY_RESTATEMENT_MONTHS months before the high-water mark are
+    re-downloaded as well and replace the stored rows.
+
+    Args:
+        table (str): Table name
+        high_water_mark (str): Latest record_date already stored (YYYY-MM-DD)
+
+    Returns:
+        str: Rows with a record_date after this date (YYYY-MM-DD) are re-downloaded
+    """
+    if not table.startswith("mts_") or TREASURY_RESTATEMENT_MONTHS <= 0:
+        return high_water_mark
+    start = pd.Timestamp(high_water_mark) - pd.DateOffset(months=TREASURY_RESTATEMENT_MONTHS)
+    return start.strftime("%Y-%m-%d")
+
+def sync_table(table):
+    """
+    Incrementally bring a table up to date using its record_date high-water mark.
+
+    Only rows newer than sync_start() are downloaded. Every partition those
+    rows can fall into is rewritten atomically with the stored rows after
+    sync_start() replaced by the downloaded ones, and the manifest is updated
+    last, so an interrupted sync is simply repeated by the next run. Tables
+    that have not been ingested yet are fully ingested.
+
+    Args:
+        table (str): Table name (a key of WAREHOUSE_TABLES)
+
+    Returns:
+        dict: The table's updated manifest, with "rows_synced" set to the number of rows downloaded
+    """
+    manifest = load_manifest(table)
+    high_water_mark = manifest.get("high_water_mark")
+    if not high_water_mark:
+        manifest = ingest_table(table)
+        manifest["rows_synced"] = manifest["row_count"]
+        return manifest
+
+    since = sync_start(table, high_water_mark)
+    logger.info(f"Syncing {table} rows with record_date after {since}")
+    new_rows, data_types = _download(table, FiscalQuery().gt("record_date", since))
+
+    # Partitions that hold new rows, plus any stored partition that may hold replaced rows
+    since_date = pd.Timestamp(since)
+    first_year = since_date.year + (1 if since_date.month >= 10 else 0)
+    affected = {year for year in list_partitions(table) if int(year) >= first_year}
+    new_years = partition_years(new_rows) if not new_rows.empty else pd.Series(dtype=str)
+    affected.update(new_years.unique())
+
+    row_delta = 0
+    for fiscal_year in sorted(affected):
+        existing = read_partition(table, fiscal_year)
+        if not existing.empty:
+            kept = existing[existing["record_date"].astype(str) <= since]
+        else:
+            kept = existing
+        added = new_rows[new_years == fiscal_year] if not new_rows.empty else new_rows
+        partition = pd.concat([kept, added], ignore_index=True)
+        if "record_date" in partition.columns:
+            partition = partition.sort_values("record_date", kind="stable").reset_index(drop=True)
+        row_delta += len(partition) - len(existing)
+        if partition.empty:
+            shutil.rmtree(os.path.dirname(_partition_path(table, fiscal_year)), ignore_errors=True)
+        else:
+            write_partition(table, fiscal_year, partition)
+
+    new_mark = _max_record_date(new_rows)
+    manifest.update({
+        "synced_at": datetime.now().isoformat(),
+        "row_count": manifest.get("row_count", 0) + row_delta,
+        "partitions": list_partitions(table),
+        "high_water_mark": max(high_water_mark, new_mark) if new_mark else high_water_mark,
+        "data_types": data_types or manifest.get("data_types", {})
+    })
+    save_manifest(table, manifest)
+    logger.info(f"Synced {len(new_rows)} rows of {table} across {len(affected)} partitions")
+    manifest["rows_synced"] = len(new_rows)
+    return manifest
+
+def ingest_all(tables=None):
+    """
+    Bulk-download every warehouse table, replacing whatever is stored.
+
+    Args:
+        tables (list, optional): Table names to ingest (defaults to all warehouse tables)
+
+    Returns:
+        dict: Mapping of table name to its manifest, or to {"error": ...} if ingest failed
+    """
+    results = {}
+    for table in tables or WAREHOUSE_TABLES:
+        try:
+            results[table] = ingest_table(table)
+        except Exception as e:
+            logger.error(f"Error ingesting {table}: {str(e)}")
+            results[table] = {"error": str(e)}
+    return results
+
+def sync_all(tables=None):
+    """
+    Incrementally sync every warehouse table (the nightly refresh job).
+
+    Args:
+        tables (list, optional): Table names to sync (defaults to all warehouse tables)
+
+    Returns:
+        dict: Mapping of table name to its manifest, or to {"error": ...} if the sync failed
+    """
+    results = {}
+    for table in tables or WAREHOUSE_TABLES:
+        try:
+            results[table] = sync_table(table)
+        except Exception as e:
+            logger.error(f"Error syncing {table}: {str(e)}")
+            results[table] = {"error": str(e)}
+    return results
+
+def _selected_partitions(table, conditions):
+    """
+    Prune partitions using fiscal_year conditions.
+
+    Args:
+        table (str): Table name
+        conditions (list): (field, operator, value) tuples from FiscalQuery.conditions()
+
+    Returns:
+        list: Fiscal years whose partitions may contain matching rows
+    """
+    years = list_partitions(table)
+    for field, operator, value in conditions:
+        if field != PARTITION_COLUMN:
+            continue
+        if operator == "eq":
+            years = [year for year in years if int(year) == int(value)]
+        elif operator == "in":
+            wanted = {int(v) for v in value}
+            years = [year for year in years if int(year) in wanted]
+        elif operator == "gt":
+            years = [year for year in years if int(year) > int(value)]
+        elif operator == "gte":
+            years = [year for year in years if int(year) >= int(value)]
+        elif operator == "lt":
+            years = [year for year in years if int(year) < int(value)]
+        elif operator == "lte":
+            years = [year for year in years if int(year) <= int(value)]
+    return years
+
+def _compare(column, operator, value):
+    """
+    Evaluate one filter condition against a column.
+
+    Numeric columns are compared numerically; everything else (including ISO
+    dates) is compared as strings, matching Fiscal Data semantics.
+
+    Args:
+        column (pd.Series): Column values
+        operator (str): Filter operator
+        value: Filter value (a list for "in")
+
+    Returns:
+        pd.Series: Boolean mask
+    """
+    if operator == "contains":
+        return column.astype(str).str.contains(str(value), case=False, regex=False, na=False)
+
+    values = value if operator == "in" else [value]
+    numeric_column = pd.to_numeric(column, errors="coerce")
+    numeric_values = pd.to_numeric(pd.Series(values), errors="coerce")
+    if numeric_column.notna().any() and numeric_values.notna().all():
+        column, values = numeric_column, list(numeric_values)
+    else:
+        column, values = column.astype(str), [str(v) for v in values]
+
+    if operator == "in":
+        return column.isin(values)
+    target = values[0]
+    if operator == "eq":
+        return column == target
+    if operator == "gt":
+        return column > target
+    if operator == "gte":
+        return column >= target
+    if operator == "lt":
+        return column < target
+    return column <= target
+
+def query_frame(table, query, limit=None):
+    """
+    Answer a Fiscal Data query from the local warehouse.
+
+    Args:
+        table (str): Table name
+        query (FiscalQuery): Filters, fields and sort to apply
+        limit (int, optional): Maximum number of rows
+
+    Returns:
+        pd.DataFrame: Matching rows
+    """
+    conditions = query.conditions()
+    frames = [read_partition(table, year) for year in _selected_partitions(table, conditions)]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=query.get_fields() or None)
+
+    df = pd.concat(frames, ignore_index=True)
+
+    if conditions:
+        mask = pd.Series(True, index=df.index)
+        for field, operator, value in conditions:
+            if field not in df.columns:
+                mask &= False
+                continue
+            mask &= _compare(df[field], operator, value)
+        df = df[mask]
+
+    sort_keys = query.get_sort()
+    if sort_keys:
+        columns = [key.lstrip("-") for key in sort_keys]
+        ascending = [not key.startswith("-") for key in sort_keys]
+        present = [(c, a) for c, a in zip(columns, ascending) if c in df.columns]
+        if present:
+            df = df.sort_values([c for c, _ in present], ascending=[a for _, a in present], kind="stable")
+
+    fields = query.get_fields()
+    if fields:
+        df = df[[field for field in fields if field in df.columns]]
+
+    if limit is not None:
+        df = df.head(limit)
+
+    return df.reset_index(drop=True)
+
+def query_params(table, params, limit=None):
+    """
+    Answer Fiscal Data query parameters from the local warehouse, returning the
+    same response shape as a combined Fiscal Data response.
+
+    Args:
+        table (str): Table name
+        params (dict): Fiscal Data query parameters
+        limit (int, optional): Maximum number of rows
+
+    Returns:
+        dict: Response with "data", "meta" and "links"
+    """
+    df = query_frame(table, FiscalQuery.from_params(params), limit)
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    manifest = load_manifest(table)
+    return {
+        "data": records,
+        "meta": {
+            "count": len(records),
+            "total-count": len(records),
+            "total-pages": 1,
+            "backend": "local",
+            "ingested_at": manifest.get("ingested_at"),
+            "dataTypes": {column: data_type for column, data_type in manifest.get("data_types", {}).items() if column in df.columns}
+        },
+        "links": {}
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Treasury data warehouse")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = subparsers.add_parser("ingest", help="Bulk-download tables into the warehouse")
+    ingest_parser.add_argument("tables", nargs="*", help=f"Tables to ingest (default: all of {', '.join(WAREHOUSE_TABLES)})")
+    sync_parser = subparsers.add_parser("sync", help="Download only rows newer than each table's high-water mark")
+    sync_parser.add_argument("tables", nargs="*", help="Tables to sync (default: all)")
+    args = parser.parse_args()
+
+    unknown = [table for table in args.tables if table not in WAREHOUSE_TABLES]
+    if unknown:
+        parser.error(f"Unknown tables: {', '.join(unknown)}")
+
+    if args.command in ("ingest", "sync"):
+        results = ingest_all(args.tables or None) if args.command == "ingest" else sync_all(args.tables or None)
+        print(json.dumps(results, indent=2))
+        sys.exit(1 if any("error" in result for result in results.values()) else 0)
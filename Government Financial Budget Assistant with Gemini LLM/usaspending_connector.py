@@ -5,13 +5,20 @@ This module provides functions to retrieve budget data from the USASpending.gov
 """
 
 import os
+import time
+import heapq
 import requests
 import json
 import logging
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 from datetime import datetime
 
+from http_client import get_json, post_json
+from agency_catalog import get_agencies
+from response_formats import COLUMNAR, to_columnar, frame_to_columnar
+
 # Load environment variables
 load_dotenv()
 
@@ -33,6 +40,104 @@ HEADERS = {
 if API_KEY:
     HEADERS["X-API-Key"] = API_KEY
 
+# Fan-out configuration for per-agency requests
+USASPENDING_MAX_CONCURRENCY = int(os.getenv("USASPENDING_MAX_CONCURRENCY", "8"))
+USASPENDING_CALL_TIMEOUT = float(os.getenv("USASPENDING_CALL_TIMEOUT", "30"))
+USASPENDING_FANOUT_DEADLINE = float(os.getenv("USASPENDING_FANOUT_DEADLINE", "60"))
+
+# Process-wide worker pool for per-agency fan-out, so concurrent requests share one upstream connection cap
+_fanout_executor = ThreadPoolExecutor(max_workers=USASPENDING_MAX_CONCURRENCY, thread_name_prefix="usaspending-fanout")
+
+def _fetch_concurrently(calls, max_concurrency=None, timeout=None, deadline=None, executor=None):
+    """
+    Run independent connector calls concurrently under a concurrency cap.
+    
+    Calls run on a worker pool shared by the whole process, which bounds the
+    upstream requests in flight across all concurrent fan-outs to
+    USASPENDING_MAX_CONCURRENCY; ``max_concurrency`` further limits how many of
+    this fan-out's calls are queued at once. Each call gets its own timeout,
+    measured from when it starts running, and the whole fan-out gets a deadline
+    that also covers time spent waiting for a free worker. A call that times
+    out, raises, returns an ``{"error": ...}`` dict, or has not finished by the
+    deadline is reported as a failure instead of aborting the others.
+    
+    Args:
+        calls (dict): Mapping of key to (function, args tuple)
+        max_concurrency (int, optional): Maximum calls of this fan-out in flight (defaults to USASPENDING_MAX_CONCURRENCY)
+        timeout (float, optional): Per-call timeout in seconds (defaults to USASPENDING_CALL_TIMEOUT)
+        deadline (float, optional): Seconds the whole fan-out may take (defaults to USASPENDING_FANOUT_DEADLINE)
+        executor (concurrent.futures.Executor, optional): Worker pool to run the calls on
+            (defaults to the shared fan-out pool; background jobs should use their own)
+        
+    Returns:
+        tuple: (dict of key to result for successful calls, dict of key to error message for failed calls)
+    """
+    max_concurrency = max_concurrency or USASPENDING_MAX_CONCURRENCY
+    timeout = timeout or USASPENDING_CALL_TIMEOUT
+    deadline = deadline or USASPENDING_FANOUT_DEADLINE
+    executor = executor or _fanout_executor
+    results = {}
+    failures = {}
+    if not calls:
+        return results, failures
+    
+    deadline_at = time.monotonic() + deadline
+    started_at = {}
+    queued = iter(calls.items())
+    pending = {}
+    
+    def run(key, func, args):
+        started_at[key] = time.monotonic()
+        return func(*args)
+    
+    def submit_next():
+        for key, (func, args) in queued:
+            pending[executor.submit(run, key, func, args)] = key
+            return
+    
+    try:
+        for _ in range(min(max_concurrency, len(calls))):
+            submit_next()
+        while pending:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=min(timeout, 0.5, remaining), return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                try:
+                    result = future.result()
+                    if isinstance(result, dict) and "error" in result:
+                        failures[key] = str(result["error"])
+                    else:
+                        results[key] = result
+                except Exception as e:
+                    failures[key] = str(e)
+                submit_next()
+            
+            # Give up on calls that have been running longer than the per-call timeout
+            now = time.monotonic()
+            for future, key in list(pending.items()):
+                if key in started_at and now - started_at[key] > timeout:
+                    # A running call cannot be interrupted; its HTTP timeout bounds it
+                    future.cancel()
+                    del pending[future]
+                    failures[key] = f"Timed out after {timeout}s"
+                    submit_next()
+        
+        # Past the deadline: abandon calls still queued or running, and never start the rest
+        for key in list(pending.values()) + [key for key, _ in queued]:
+            failures[key] = f"Fan-out deadline of {deadline}s exceeded"
+    finally:
+        # Drop calls still queued in the pool if we stop early
+        for future in pending:
+            future.cancel()
+    
+    for key, error in failures.items():
+        logger.error(f"Concurrent fetch failed for {key}: {error}")
+    
+    return results, failures
+
 def get_agency_budgetary_resources(agency_code, fiscal_year):
     """
     Retrieve budgetary resources and obligations for a specific agency and fiscal year.
@@ -49,9 +154,7 @@ def get_agency_budgetary_resources(agency_code, fiscal_year):
     
     try:
         logger.info(f"Fetching budgetary resources for agency {agency_code} in FY {fiscal_year}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return get_json(endpoint, params=params, headers=HEADERS)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching budgetary resources: {str(e)}")
         return {"error": str(e)}
@@ -72,9 +175,7 @@ def get_agency_obligations_by_award_category(agency_code, fiscal_year):
     
     try:
         logger.info(f"Fetching obligations by award category for agency {agency_code} in FY {fiscal_year}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return get_json(endpoint, params=params, headers=HEADERS)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching obligations by award category: {str(e)}")
         return {"error": str(e)}
@@ -93,9 +194,7 @@ def get_agency_list():
     
     try:
         logger.info("Fetching agency list")
-        response = requests.post(endpoint, json=data, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return post_json(endpoint, json_body=data, headers=HEADERS)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching agency list: {str(e)}")
         return {"error": str(e)}
@@ -116,9 +215,7 @@ def get_federal_accounts_by_agency(agency_code, fiscal_year):
     
     try:
         logger.info(f"Fetching federal accounts for agency {agency_code} in FY {fiscal_year}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return get_json(endpoint, params=params, headers=HEADERS)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching federal accounts: {str(e)}")
         return {"error": str(e)}
@@ -141,28 +238,29 @@ def get_agency_overview(agency_code, fiscal_year=None):
     
     try:
         logger.info(f"Fetching overview for agency {agency_code}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return get_json(endpoint, params=params, headers=HEADERS)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching agency overview: {str(e)}")
         return {"error": str(e)}
 
-def get_budget_data_by_time_period(agency_code=None, start_year=None, end_year=None):
+def get_budget_data_by_time_period(agency_code=None, start_year=None, end_year=None, max_concurrency=None, timeout=None):
     """
     Retrieve budget data for a specific time period, optionally filtered by agency.
     
+    Every (agency, fiscal year) request runs concurrently under a concurrency cap,
+    and the DataFrame is built once from the collected records.
+    
     Args:
         agency_code (str, optional): The agency code to filter by
         start_year (str): The starting fiscal year (e.g., "2020")
         end_year (str): The ending fiscal year (e.g., "2023")
+        max_concurrency (int, optional): Maximum requests in flight
+        timeout (float, optional): Per-request timeout in seconds
         
     Returns:
-        pd.DataFrame: DataFrame containing budget data across the specified time period
+        pd.DataFrame: DataFrame containing budget data across the specified time period.
+            Failed (agency, year) fetches are listed in ``DataFrame.attrs["failures"]``.
     """
-    # Initialize empty DataFrame to store results
-    all_data = pd.DataFrame()
-    
     # If no years specified, use current year
     if not start_year and not end_year:
         current_year = datetime.now().year
@@ -174,122 +272,153 @@ def get_budget_data_by_time_period(agency_code=None, start_year=None, end_year=N
     else:
         fiscal_years = [end_year]
     
-    # If agency code is provided, get data for that agency
+    # Determine which agencies to fetch: the given one, or all major agencies
     if agency_code:
-        for year in fiscal_years:
-            try:
-                # Get budgetary resources
-                budget_data = get_agency_budgetary_resources(agency_code, year)
-                
-                # Convert to DataFrame
-                if "error" not in budget_data:
-                    df = pd.json_normalize(budget_data)
-                    df["fiscal_year"] = year
-                    df["agency_code"] = agency_code
-                    
-                    # Append to main DataFrame
-                    all_data = pd.concat([all_data, df], ignore_index=True)
-            except Exception as e:
-                logger.error(f"Error processing data for agency {agency_code}, year {year}: {str(e)}")
+        agencies = [(agency_code, None)]
     else:
-        # If no agency code provided, get data for all major agencies
-        agencies = get_agency_list()
-        if "error" not in agencies and "results" in agencies:
-            for agency in agencies["results"]:
-                agency_code = agency.get("toptier_agency", {}).get("toptier_code")
-                if agency_code:
-                    for year in fiscal_years:
-                        try:
-                            # Get budgetary resources
-                            budget_data = get_agency_budgetary_resources(agency_code, year)
-                            
-                            # Convert to DataFrame
-                            if "error" not in budget_data:
-                                df = pd.json_normalize(budget_data)
-                                df["fiscal_year"] = year
-                                df["agency_code"] = agency_code
-                                df["agency_name"] = agency.get("toptier_agency", {}).get("name", "")
-                                
-                                # Append to main DataFrame
-                                all_data = pd.concat([all_data, df], ignore_index=True)
-                        except Exception as e:
-                            logger.error(f"Error processing data for agency {agency_code}, year {year}: {str(e)}")
+        agencies = [(agency["code"], agency["name"]) for agency in get_agencies()]
+    
+    agency_names = dict(agencies)
+    calls = {
+        (code, year): (get_agency_budgetary_resources, (code, year))
+        for code, _ in agencies
+        for year in fiscal_years
+    }
+    
+    results, failures = _fetch_concurrently(calls, max_concurrency, timeout)
+    
+    # Collect flat records in agency x year order, then build the DataFrame once
+    records = []
+    for code, year in calls:
+        budget_data = results.get((code, year))
+        if budget_data is None:
+            continue
+        record = {**budget_data, "fiscal_year": year, "agency_code": code}
+        if agency_names[code] is not None:
+            record["agency_name"] = agency_names[code]
+        records.append(record)
+    
+    all_data = pd.json_normalize(records) if records else pd.DataFrame()
+    all_data.attrs["failures"] = [
+        {"agency_code": code, "fiscal_year": year, "error": error}
+        for (code, year), error in sorted(failures.items())
+    ]
     
     return all_data
 
-def get_top_agencies_by_budget(fiscal_year, limit=10):
+def get_top_agencies_by_budget(fiscal_year, limit=10, max_concurrency=None, timeout=None):
     """
     Retrieve the top agencies by budget allocation for a specific fiscal year.
     
+    Per-agency budgetary resources are fetched concurrently; agencies whose fetch
+    fails or times out are listed in the result metadata. If every fetch fails,
+    an error is returned instead of an empty ranking.
+    
     Args:
         fiscal_year (str): The fiscal year (e.g., "2023")
         limit (int): Number of top agencies to return
+        max_concurrency (int, optional): Maximum per-agency requests in flight
+        timeout (float, optional): Per-agency request timeout in seconds
         
     Returns:
-        list: List of dictionaries containing agency data sorted by budget
+        dict: Top agencies sorted by budget under "data", and fetch statistics under "metadata",
+            or {"error": ...} if the agency list or every agency's budget could not be retrieved
     """
-    # Get all agencies
-    agencies = get_agency_list()
+    # Get all agencies from the cached catalog
+    agencies = get_agencies()
     
-    if "error" in agencies or "results" not in agencies:
+    if not agencies:
         return {"error": "Failed to retrieve agency list"}
     
-    # Initialize list to store agency budget data
-    agency_budgets = []
+    # Build one budgetary resources call per agency
+    agency_names = {agency["code"]: agency["name"] for agency in agencies}
+    calls = {
+        agency_code: (get_agency_budgetary_resources, (agency_code, fiscal_year))
+        for agency_code in agency_names
+    }
     
-    # Fetch budget data for each agency
-    for agency in agencies["results"]:
-        agency_code = agency.get("toptier_agency", {}).get("toptier_code")
-        agency_name = agency.get("toptier_agency", {}).get("name", "")
-        
-        if agency_code:
-            try:
-                # Get budgetary resources
-                budget_data = get_agency_budgetary_resources(agency_code, fiscal_year)
-                
-                if "error" not in budget_data:
-                    # Extract budget amount
-                    budget_amount = budget_data.get("total_budgetary_resources", 0)
-                    
-                    # Add to list
-                    agency_budgets.append({
-                        "agency_code": agency_code,
-                        "agency_name": agency_name,
-                        "fiscal_year": fiscal_year,
-                        "budget_amount": budget_amount
-                    })
-            except Exception as e:
-                logger.error(f"Error processing budget data for agency {agency_code}: {str(e)}")
-    
-    # Sort by budget amount (descending) and limit results
-    sorted_agencies = sorted(agency_budgets, key=lambda x: x["budget_amount"], reverse=True)
-    return sorted_agencies[:limit]
+    results, failures = _fetch_concurrently(calls, max_concurrency, timeout)
+    
+    # Nothing to rank, e.g. because the upstream's circuit is open
+    if not results and failures:
+        first_error = failures[min(failures)]
+        return {"error": f"Failed to retrieve budgetary resources for all {len(calls)} agencies: {first_error}"}
+    
+    agency_budgets = [
+        {
+            "agency_code": agency_code,
+            "agency_name": agency_names[agency_code],
+            "fiscal_year": fiscal_year,
+            "budget_amount": budget_data.get("total_budgetary_resources", 0) or 0
+        }
+        for agency_code, budget_data in results.items()
+    ]
+    
+    # Select the top agencies by budget amount without sorting the full list
+    top_agencies = heapq.nlargest(limit, agency_budgets, key=lambda x: x["budget_amount"])
+    
+    return {
+        "data": top_agencies,
+        "metadata": {
+            "fiscal_year": fiscal_year,
+            "agencies_requested": len(calls),
+            "agencies_succeeded": len(results),
+            "agencies_failed": [
+                {"agency_code": agency_code, "agency_name": agency_names[agency_code], "error": error}
+                for agency_code, error in sorted(failures.items())
+            ],
+            "partial": bool(failures)
+        }
+    }
 
-def format_budget_data_for_client(data):
+def format_budget_data_for_client(data, layout="rows"):
     """
     Format budget data for consumption by the MCP Client.
     
     Args:
-        data: Raw budget data (DataFrame or list of dictionaries)
+        data: Raw budget data (DataFrame, list of dictionaries, or a dict with
+            "data" records and optional "metadata")
+        layout (str): "rows" for a list of records, or "columnar" for
+            {"columns": [...], "values": {column: [...]}}
         
     Returns:
         dict: Formatted data ready for the MCP Client
     """
-    if isinstance(data, pd.DataFrame):
+    extra_metadata = {}
+    if isinstance(data, pd.DataFrame) and layout == COLUMNAR:
+        # Read the columns directly instead of building a dict per row
+        return {
+            "data": frame_to_columnar(data),
+            "metadata": {
+                "source": "USASpending.gov",
+                "retrieved_at": datetime.now().isoformat(),
+                "record_count": len(data),
+                "layout": COLUMNAR
+            }
+        }
+    elif isinstance(data, pd.DataFrame):
         # Convert DataFrame to list of dictionaries
         records = data.to_dict(orient="records")
+    elif isinstance(data, dict) and "error" in data:
+        return {"error": data["error"]}
+    elif isinstance(data, dict) and "data" in data:
+        records = data["data"]
+        extra_metadata = data.get("metadata", {})
     else:
         records = data
     
     # Format the data according to the expected structure
     formatted_data = {
-        "data": records,
+        "data": to_columnar(records) if layout == COLUMNAR else records,
         "metadata": {
+            **extra_metadata,
             "source": "USASpending.gov",
             "retrieved_at": datetime.now().isoformat(),
             "record_count": len(records)
         }
     }
+    if layout == COLUMNAR:
+        formatted_data["metadata"]["layout"] = COLUMNAR
     
     return formatted_data
 
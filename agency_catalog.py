@@ -0,0 +1,273 @@
+"""
+Agency Catalog for Government Financial Budget Assistant
+
+This module keeps the list of USASpending.gov toptier agencies (codes, names
+and abbreviations) in memory. The list is loaded once, persisted to disk so a
+cold start does not need the network, and refreshed in the background on a
+schedule, since the catalog only changes a few times a year.
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Catalog configuration
+AGENCY_CATALOG_PATH = os.getenv("AGENCY_CATALOG_PATH", os.path.join("cache", "agency_catalog.json"))
+AGENCY_CATALOG_REFRESH_SECONDS = int(os.getenv("AGENCY_CATALOG_REFRESH_SECONDS", str(24 * 60 * 60)))
+
+# Backoff between attempts while no catalog has been loaded, doubling per failure up to the maximum
+AGENCY_CATALOG_RETRY_SECONDS = float(os.getenv("AGENCY_CATALOG_RETRY_SECONDS", "30"))
+AGENCY_CATALOG_RETRY_MAX_SECONDS = float(os.getenv("AGENCY_CATALOG_RETRY_MAX_SECONDS", "600"))
+
+def load_usaspending_agencies():
+    """
+    Load the toptier agencies from the USASpending.gov agency list.
+
+    Returns:
+        list: Agency dicts with "code", "name" and "abbreviation", sorted by name
+
+    Raises:
+        RuntimeError: If the agency list cannot be retrieved
+    """
+    # Imported here because usaspending_connector reads its agencies from the catalog
+    from usaspending_connector import get_agency_list
+
+    agency_list = get_agency_list()
+    if "error" in agency_list or "results" not in agency_list:
+        raise RuntimeError(f"Failed to retrieve agency list: {agency_list.get('error', 'no results')}")
+
+    agencies = {}
+    for agency in agency_list["results"]:
+        toptier = agency.get("toptier_agency") or {}
+        code = toptier.get("toptier_code")
+        if code and code not in agencies:
+            agencies[code] = {
+                "code": code,
+                "name": toptier.get("name", ""),
+                "abbreviation": toptier.get("abbreviation")
+            }
+    return sorted(agencies.values(), key=lambda agency: agency["name"])
+
+class AgencyCatalog:
+    """
+    In-memory agency catalog with disk persistence and background refresh.
+    """
+
+    def __init__(self, path=None, refresh_seconds=None, loader=None, retry_seconds=None, retry_max_seconds=None):
+        """
+        Initialize an empty catalog; nothing is loaded until first use.
+
+        Args:
+            path (str, optional): JSON file the catalog is persisted to
+            refresh_seconds (int, optional): Interval between background refreshes
+            loader (callable, optional): Function returning the current agency list
+            retry_seconds (float, optional): First backoff after a failed load while the catalog is empty
+            retry_max_seconds (float, optional): Longest backoff while the catalog is empty
+        """
+        self.path = path or AGENCY_CATALOG_PATH
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else AGENCY_CATALOG_REFRESH_SECONDS
+        self.loader = loader or load_usaspending_agencies
+        self.retry_seconds = retry_seconds if retry_seconds is not None else AGENCY_CATALOG_RETRY_SECONDS
+        self.retry_max_seconds = retry_max_seconds if retry_max_seconds is not None else AGENCY_CATALOG_RETRY_MAX_SECONDS
+        self.version = 0
+        self.refreshed_at = None
+        self._attempted_at = None
+        self._failures = 0
+        self._agencies = []
+        self._by_code = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _set(self, agencies, refreshed_at):
+        """Replace the in-memory list; the caller must hold the lock."""
+        self._agencies = list(agencies)
+        self._by_code = {agency["code"]: agency for agency in self._agencies}
+        self.refreshed_at = refreshed_at
+        self.version += 1
+
+    def _load_from_disk(self):
+        """
+        Load the persisted catalog.
+
+        Returns:
+            bool: True if a persisted catalog was loaded
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                persisted = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not persisted.get("agencies"):
+            return False
+        with self._lock:
+            self._set(persisted["agencies"], persisted.get("refreshed_at", 0))
+        logger.info(f"Loaded {len(self._agencies)} agencies from {self.path}")
+        return True
+
+    def _save_to_disk(self, agencies, refreshed_at):
+        """Persist the catalog atomically."""
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"refreshed_at": refreshed_at, "agencies": agencies}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not persist agency catalog to {self.path}: {str(e)}")
+
+    def refresh(self):
+        """
+        Reload the catalog from its source, keeping the current list on failure.
+
+        Returns:
+            bool: True if the catalog was refreshed
+        """
+        with self._refresh_lock:
+            self._attempted_at = time.time()
+            try:
+                agencies = self.loader()
+            except Exception as e:
+                self._failures += 1
+                logger.warning(f"Agency catalog refresh failed, keeping {len(self._agencies)} cached agencies: {str(e)}")
+                return False
+            if not agencies:
+                self._failures += 1
+                logger.warning("Agency catalog refresh returned no agencies, keeping the cached list")
+                return False
+
+            refreshed_at = time.time()
+            with self._lock:
+                self._set(agencies, refreshed_at)
+                self._loaded = True
+            self._failures = 0
+            self._save_to_disk(agencies, refreshed_at)
+            logger.info(f"Refreshed agency catalog with {len(agencies)} agencies")
+            return True
+
+    def _retry_delay(self):
+        """
+        Get the backoff before the next attempt after failed loads.
+
+        Returns:
+            float: Seconds to wait; short while the catalog is empty, a tenth of
+                the refresh interval once a catalog has been loaded
+        """
+        if self._loaded:
+            return self.refresh_seconds / 10
+        if not self._failures:
+            return 0
+        return min(self.retry_seconds * 2 ** (self._failures - 1), self.retry_max_seconds)
+
+    def _ensure_loaded(self):
+        """
+        Load the catalog on first use: from disk if persisted, otherwise from its source.
+
+        An empty catalog counts as not loaded, so while the source is unreachable
+        every call retries once the short backoff has passed.
+        """
+        if self._loaded:
+            return
+        with self._refresh_lock:
+            if self._loaded:
+                return
+            if self._attempted_at is None and self._load_from_disk():
+                with self._lock:
+                    self._loaded = True
+            elif self._attempted_at is None or time.time() - self._attempted_at >= self._retry_delay():
+                self.refresh()
+        self.start()
+
+    def _run(self):
+        """Background loop refreshing the catalog once it is older than the refresh interval."""
+        while not self._stop.is_set():
+            now = time.time()
+            retry_seconds = self._retry_delay()
+            if self._loaded and self.refreshed_at and now - self.refreshed_at < self.refresh_seconds:
+                wait = self.refresh_seconds - (now - self.refreshed_at)
+            elif self._attempted_at and now - self._attempted_at < retry_seconds:
+                wait = retry_seconds - (now - self._attempted_at)
+            else:
+                self.refresh()
+                continue
+            self._stop.wait(max(1.0, wait))
+
+    def start(self):
+        """Start the background refresh thread if it is not already running."""
+        if self.refresh_seconds <= 0:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="agency-catalog-refresh", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the background refresh thread."""
+        self._stop.set()
+
+    def get_agencies(self):
+        """
+        Get every agency in the catalog.
+
+        Returns:
+            list: Agency dicts with "code", "name" and "abbreviation" (treat as read-only)
+        """
+        self._ensure_loaded()
+        return list(self._agencies)
+
+    def get(self, code):
+        """
+        Get one agency by its toptier code.
+
+        Args:
+            code (str): Toptier agency code
+
+        Returns:
+            dict: Agency, or None if the code is not in the catalog
+        """
+        self._ensure_loaded()
+        return self._by_code.get(code)
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    """
+    Get the shared agency catalog.
+
+    Returns:
+        AgencyCatalog: The shared catalog
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = AgencyCatalog()
+    return _catalog
+
+def get_agencies():
+    """
+    Get every agency in the shared catalog.
+
+    Returns:
+        list: Agency dicts with "code", "name" and "abbreviation"
+    """
+    return get_catalog().get_agencies()
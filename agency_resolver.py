@@ -0,0 +1,324 @@
+"""
+Agency Name Resolver for Government Financial Budget Assistant
+
+This module resolves free-text agency names ("Defense", "DoD", "health and
+human services") to toptier agency codes. An index is built once from the
+agency catalog, with a built-in alias table adding common abbreviations and
+short names (and standing in while the catalog is unavailable). It supports
+exact name/alias lookup, prefix lookup through a trie, and token-based fuzzy
+matching through a precomputed inverted index, returning ranked candidates.
+"""
+
+import re
+import logging
+import difflib
+import threading
+
+from agency_catalog import get_catalog
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Built-in agencies with common abbreviations and short names: (code, name, aliases)
+AGENCY_ALIASES = [
+    ("012", "Department of Agriculture", ["USDA", "Agriculture"]),
+    ("013", "Department of Commerce", ["DOC", "Commerce"]),
+    ("097", "Department of Defense", ["DOD", "Pentagon", "Defense Department"]),
+    ("091", "Department of Education", ["ED", "Education Department"]),
+    ("089", "Department of Energy", ["DOE", "Energy Department"]),
+    ("075", "Department of Health and Human Services", ["HHS", "DHHS", "Health Department"]),
+    ("070", "Department of Homeland Security", ["DHS", "Homeland Security"]),
+    ("086", "Department of Housing and Urban Development", ["HUD"]),
+    ("014", "Department of the Interior", ["DOI", "Interior"]),
+    ("015", "Department of Justice", ["DOJ", "Justice Department"]),
+    ("016", "Department of Labor", ["DOL", "Labor Department"]),
+    ("019", "Department of State", ["DOS", "State Department"]),
+    ("069", "Department of Transportation", ["DOT", "Transportation"]),
+    ("020", "Department of the Treasury", ["Treasury", "Treasury Department"]),
+    ("036", "Department of Veterans Affairs", ["VA", "Veterans Affairs"]),
+    ("068", "Environmental Protection Agency", ["EPA"]),
+    ("080", "National Aeronautics and Space Administration", ["NASA"]),
+    ("049", "National Science Foundation", ["NSF"]),
+    ("073", "Small Business Administration", ["SBA"]),
+    ("028", "Social Security Administration", ["SSA"]),
+]
+
+# Words ignored when matching tokens
+STOPWORDS = frozenset(["a", "an", "and", "the", "of", "for", "on", "in", "to", "department", "dept", "us", "u", "s"])
+
+# Minimum difflib similarity for a fuzzy token match
+FUZZY_CUTOFF = 0.8
+
+# Minimum token length for token prefix matches ("def" -> "defense")
+MIN_PREFIX_LENGTH = 3
+
+# Name prefixes matching more agencies than this are too vague to rank as prefix matches
+MAX_PREFIX_MATCHES = 10
+
+def normalize(text):
+    """
+    Normalize an agency name for lookup.
+
+    Args:
+        text (str): Agency name or alias
+
+    Returns:
+        str: Lower-case name with punctuation removed and whitespace collapsed
+    """
+    text = str(text).lower().replace("&", " and ")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+def tokenize(text):
+    """
+    Split an agency name into match tokens, dropping stopwords.
+
+    Args:
+        text (str): Agency name or alias
+
+    Returns:
+        list: Unique tokens in order of appearance
+    """
+    tokens = []
+    for token in normalize(text).split():
+        if token not in STOPWORDS and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+class _Trie:
+    """Prefix tree mapping string prefixes to the set of values stored below them."""
+
+    def __init__(self):
+        self._root = {"values": set(), "children": {}}
+
+    def insert(self, key, value):
+        """Store ``value`` under ``key``, recording it on every prefix node."""
+        node = self._root
+        for char in key:
+            node = node["children"].setdefault(char, {"values": set(), "children": {}})
+            node["values"].add(value)
+
+    def with_prefix(self, prefix):
+        """Get every value stored under a key starting with ``prefix``."""
+        node = self._root
+        for char in prefix:
+            node = node["children"].get(char)
+            if node is None:
+                return set()
+        return node["values"]
+
+class AgencyResolver:
+    """
+    Index of agency names, aliases and tokens resolving free text to agency codes.
+    """
+
+    def __init__(self, agencies):
+        """
+        Build the index.
+
+        Args:
+            agencies (list): Dicts with "code", "name" and optional "abbreviation" and "aliases"
+        """
+        self.names = {}
+        self._exact = {}
+        self._name_trie = _Trie()
+        self._token_trie = _Trie()
+        self._inverted = {}
+        self._agency_tokens = {}
+
+        for agency in agencies:
+            code = agency.get("code")
+            if not code or not agency.get("name"):
+                continue
+            self.names.setdefault(code, agency["name"])
+            keys = [agency["name"], agency.get("abbreviation")] + list(agency.get("aliases") or [])
+            for key in filter(None, keys):
+                normalized = normalize(key)
+                if not normalized:
+                    continue
+                self._exact.setdefault(normalized, code)
+                self._name_trie.insert(normalized, code)
+
+            tokens = self._agency_tokens.setdefault(code, set())
+            tokens.update(tokenize(agency["name"]))
+            for token in tokens:
+                self._inverted.setdefault(token, set()).add(code)
+                self._token_trie.insert(token, token)
+
+        self._vocabulary = sorted(self._inverted)
+
+    def _token_matches(self, token):
+        """
+        Find indexed tokens matching a query token.
+
+        Args:
+            token (str): Query token
+
+        Returns:
+            dict: Indexed token to similarity (1.0 exact, 0.9 prefix, difflib ratio for fuzzy)
+        """
+        if token in self._inverted:
+            return {token: 1.0}
+        matches = {}
+        if len(token) >= MIN_PREFIX_LENGTH:
+            matches = {indexed: 0.9 for indexed in self._token_trie.with_prefix(token)}
+        if not matches:
+            for indexed in difflib.get_close_matches(token, self._vocabulary, n=3, cutoff=FUZZY_CUTOFF):
+                matches[indexed] = difflib.SequenceMatcher(None, token, indexed).ratio()
+        return matches
+
+    def candidates(self, query, limit=5):
+        """
+        Rank agencies matching a query.
+
+        Exact name or alias matches rank first, then names or aliases starting
+        with the query, then token matches. A token match requires every query
+        token to match the agency's name or every name token to appear in the
+        query; it is scored by match similarity and by how much of the agency
+        name the query covers. The token score also breaks ties between prefix
+        matches, so "Defense" prefers the Department of Defense over other
+        agencies with "defense" in their names.
+
+        Args:
+            query (str): Free-text agency name
+            limit (int): Maximum number of candidates
+
+        Returns:
+            list: Dicts with "code", "name", "score" and "match", best first
+        """
+        normalized = normalize(query or "")
+        if not normalized:
+            return []
+
+        scores = {}
+        token_scores = {}
+
+        def consider(code, score, match):
+            if score > scores.get(code, (0, None))[0]:
+                scores[code] = (score, match)
+
+        if normalized in self._exact:
+            consider(self._exact[normalized], 1.0, "exact")
+
+        prefix_codes = self._name_trie.with_prefix(normalized)
+        if len(prefix_codes) <= MAX_PREFIX_MATCHES:
+            for code in prefix_codes:
+                consider(code, 0.9, "prefix")
+
+        query_tokens = tokenize(normalized)
+        if query_tokens:
+            # Best similarity per (agency, query token) via the inverted index
+            similarity = {}
+            for query_token in query_tokens:
+                for indexed, ratio in self._token_matches(query_token).items():
+                    for code in self._inverted[indexed]:
+                        key = (code, query_token)
+                        if ratio > similarity.get(key, (0, None))[0]:
+                            similarity[key] = (ratio, indexed)
+
+            matched = {}
+            for (code, query_token), (ratio, indexed) in similarity.items():
+                entry = matched.setdefault(code, {"ratios": [], "indexed": set()})
+                entry["ratios"].append(ratio)
+                entry["indexed"].add(indexed)
+
+            for code, entry in matched.items():
+                agency_tokens = self._agency_tokens[code]
+                covers_query = len(entry["ratios"]) == len(query_tokens)
+                covers_agency = entry["indexed"] >= agency_tokens
+                if not (covers_query or covers_agency):
+                    continue
+                mean_ratio = sum(entry["ratios"]) / len(entry["ratios"])
+                coverage = len(entry["indexed"] & agency_tokens) / len(agency_tokens)
+                token_scores[code] = round(0.8 * mean_ratio * (0.5 + 0.5 * coverage), 4)
+                consider(code, token_scores[code], "token")
+
+        # Ties between exact or prefix matches are broken by the token score
+        ranked = sorted(scores.items(), key=lambda item: (-item[1][0], -token_scores.get(item[0], 0), self.names[item[0]]))
+        return [
+            {"code": code, "name": self.names[code], "score": score, "match": match}
+            for code, (score, match) in ranked[:limit]
+        ]
+
+    def resolve(self, query):
+        """
+        Resolve a query to the best matching agency code.
+
+        Args:
+            query (str): Free-text agency name
+
+        Returns:
+            str: Agency code if found, None otherwise
+        """
+        candidates = self.candidates(query, limit=1)
+        return candidates[0]["code"] if candidates else None
+
+def _alias_agencies():
+    """Get the built-in alias table as agency dicts."""
+    return [{"code": code, "name": name, "aliases": aliases} for code, name, aliases in AGENCY_ALIASES]
+
+def _with_aliases(agencies):
+    """
+    Attach the built-in aliases to the catalog agencies with the same name.
+
+    The catalog's codes are kept; the alias table's codes may be outdated.
+
+    Args:
+        agencies (list): Agency dicts from the catalog
+
+    Returns:
+        list: Copies of the agencies with any built-in aliases added
+    """
+    aliases_by_name = {normalize(name): aliases for _, name, aliases in AGENCY_ALIASES}
+    return [
+        {**agency, "aliases": list(agency.get("aliases") or []) + aliases_by_name.get(normalize(agency.get("name") or ""), [])}
+        for agency in agencies
+    ]
+
+_resolver = None
+_resolver_version = None
+_resolver_lock = threading.Lock()
+
+def get_resolver():
+    """
+    Get the shared resolver, building its index on first use and rebuilding it
+    whenever the agency catalog has been refreshed.
+
+    Returns:
+        AgencyResolver: The shared resolver
+    """
+    global _resolver, _resolver_version
+    catalog = get_catalog()
+    catalog.get_agencies()
+    if _resolver is None or _resolver_version != catalog.version:
+        with _resolver_lock:
+            if _resolver is None or _resolver_version != catalog.version:
+                # Read the version first so a concurrent refresh triggers another rebuild
+                version = catalog.version
+                agencies = catalog.get_agencies()
+                if agencies:
+                    _resolver = AgencyResolver(_with_aliases(agencies))
+                else:
+                    # Fall back to the alias table's own codes until the catalog loads
+                    logger.warning("Agency catalog is empty, resolving agencies from the built-in alias table only")
+                    _resolver = AgencyResolver(_alias_agencies())
+                _resolver_version = version
+                logger.info(f"Built agency resolver index for {len(_resolver.names)} agencies")
+    return _resolver
+
+def resolve_agency_code(agency_name):
+    """
+    Resolve a free-text agency name to its toptier agency code.
+
+    Args:
+        agency_name (str): Agency name, short name or abbreviation
+
+    Returns:
+        str: Agency code if found, None otherwise
+    """
+    if not agency_name:
+        return None
+    return get_resolver().resolve(agency_name)
@@ -0,0 +1,159 @@
+"""
+Async Connectors for Government Financial Budget Assistant
+
+This module provides asyncio-friendly clients for the Treasury.gov and
+USASpending.gov connectors. Each method mirrors the corresponding connector
+function and returns the same dict shapes, but runs the blocking HTTP call on a
+bounded worker pool so it can be awaited from the FastAPI event loop.
+"""
+
+import os
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+import treasury_connector
+import usaspending_connector
+from single_flight import SingleFlight
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Configuration
+ASYNC_CONNECTOR_WORKERS = int(os.getenv("ASYNC_CONNECTOR_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=ASYNC_CONNECTOR_WORKERS,
+    thread_name_prefix="async-connector"
+)
+
+# Coalesces concurrent identical awaits into one worker-pool call
+_async_flight = SingleFlight("async-connectors")
+
+class _AsyncConnectorClient:
+    """
+    Base class that runs blocking connector functions on the shared worker pool.
+    """
+
+    def __init__(self, executor=None):
+        """
+        Initialize the client.
+
+        Args:
+            executor (concurrent.futures.Executor, optional): Executor to run blocking calls on
+        """
+        self._executor = executor or _executor
+
+    async def _call(self, func, *args, **kwargs):
+        """
+        Run a blocking connector function without blocking the event loop.
+
+        Concurrent awaits of the same function with the same arguments share one
+        call, so the returned value must be treated as read-only.
+
+        Args:
+            func (callable): Connector function to call
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            The connector function's return value
+        """
+        key = repr((func.__module__, func.__name__, args, sorted(kwargs.items())))
+        return await _async_flight.do_async(key, self._run_in_executor, func, *args, **kwargs)
+
+    async def _run_in_executor(self, func, *args, **kwargs):
+        """Run a blocking function on the worker pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+class AsyncTreasuryClient(_AsyncConnectorClient):
+    """
+    Async client mirroring the functions in treasury_connector.
+    """
+
+    async def get_debt_to_penny(self, start_date=None, end_date=None):
+        """Async version of treasury_connector.get_debt_to_penny."""
+        return await self._call(treasury_connector.get_debt_to_penny, start_date, end_date)
+
+    async def get_monthly_treasury_statement(self, fiscal_year=None, fields=None, sort=None, limit=None):
+        """Async version of treasury_connector.get_monthly_treasury_statement."""
+        return await self._call(treasury_connector.get_monthly_treasury_statement, fiscal_year, fields, sort, limit)
+
+    async def get_federal_budget_outlays(self, fiscal_year=None, fields=None, sort=None, limit=None):
+        """Async version of treasury_connector.get_federal_budget_outlays."""
+        return await self._call(treasury_connector.get_federal_budget_outlays, fiscal_year, fields, sort, limit)
+
+    async def get_federal_budget_receipts(self, fiscal_year=None, fields=None, sort=None, limit=None):
+        """Async version of treasury_connector.get_federal_budget_receipts."""
+        return await self._call(treasury_connector.get_federal_budget_receipts, fiscal_year, fields, sort, limit)
+
+    async def get_federal_budget_outlays_by_years(self, start_year, end_year, fields=None, sort=None):
+        """Async version of treasury_connector.get_federal_budget_outlays_by_years."""
+        return await self._call(treasury_connector.get_federal_budget_outlays_by_years, start_year, end_year, fields, sort)
+
+    async def get_federal_budget_receipts_by_years(self, start_year, end_year, fields=None, sort=None):
+        """Async version of treasury_connector.get_federal_budget_receipts_by_years."""
+        return await self._call(treasury_connector.get_federal_budget_receipts_by_years, start_year, end_year, fields, sort)
+
+    async def get_deficit_analysis(self, fiscal_year=None, fields=None, sort=None, limit=None):
+        """Async version of treasury_connector.get_deficit_analysis."""
+        return await self._call(treasury_connector.get_deficit_analysis, fiscal_year, fields, sort, limit)
+
+    async def get_agency_expenditures(self, fiscal_year=None, agency_name=None, fields=None, sort=None, limit=None):
+        """Async version of treasury_connector.get_agency_expenditures."""
+        return await self._call(treasury_connector.get_agency_expenditures, fiscal_year, agency_name, fields, sort, limit)
+
+    async def get_historical_debt(self, start_year=None, end_year=None):
+        """Async version of treasury_connector.get_historical_debt."""
+        return await self._call(treasury_connector.get_historical_debt, start_year, end_year)
+
+    async def get_budget_comparison(self, fiscal_years, agency_names=None):
+        """Async version of treasury_connector.get_budget_comparison."""
+        return await self._call(treasury_connector.get_budget_comparison, fiscal_years, agency_names)
+
+    async def get_budget_comparison_by_years(self, start_year, end_year, agency_name=None):
+        """Async version of treasury_connector.get_budget_comparison_by_years."""
+        return await self._call(treasury_connector.get_budget_comparison_by_years, start_year, end_year, agency_name)
+
+class AsyncUSASpendingClient(_AsyncConnectorClient):
+    """
+    Async client mirroring the functions in usaspending_connector.
+    """
+
+    async def get_agency_budgetary_resources(self, agency_code, fiscal_year):
+        """Async version of usaspending_connector.get_agency_budgetary_resources."""
+        return await self._call(usaspending_connector.get_agency_budgetary_resources, agency_code, fiscal_year)
+
+    async def get_agency_obligations_by_award_category(self, agency_code, fiscal_year):
+        """Async version of usaspending_connector.get_agency_obligations_by_award_category."""
+        return await self._call(usaspending_connector.get_agency_obligations_by_award_category, agency_code, fiscal_year)
+
+    async def get_agency_list(self):
+        """Async version of usaspending_connector.get_agency_list."""
+        return await self._call(usaspending_connector.get_agency_list)
+
+    async def get_federal_accounts_by_agency(self, agency_code, fiscal_year):
+        """Async version of usaspending_connector.get_federal_accounts_by_agency."""
+        return await self._call(usaspending_connector.get_federal_accounts_by_agency, agency_code, fiscal_year)
+
+    async def get_agency_overview(self, agency_code, fiscal_year=None):
+        """Async version of usaspending_connector.get_agency_overview."""
+        return await self._call(usaspending_connector.get_agency_overview, agency_code, fiscal_year)
+
+    async def get_budget_data_by_time_period(self, agency_code=None, start_year=None, end_year=None):
+        """Async version of usaspending_connector.get_budget_data_by_time_period."""
+        return await self._call(usaspending_connector.get_budget_data_by_time_period, agency_code, start_year, end_year)
+
+    async def get_top_agencies_by_budget(self, fiscal_year, limit=10):
+        """Async version of usaspending_connector.get_top_agencies_by_budget."""
+        return await self._call(usaspending_connector.get_top_agencies_by_budget, fiscal_year, limit)
@@ -0,0 +1,174 @@
+"""
+Rate Limiting and Retry Policy for Government Financial Budget Assistant
+
+This module provides the client-side throttling used by the shared HTTP
+transport: a token bucket per upstream host, exponential backoff with full
+jitter that honors Retry-After, and a global retry budget that caps retries
+to a fraction of recent traffic so failures cannot snowball into a retry storm.
+"""
+
+import time
+import random
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: ``rate`` tokens per second, holding at most ``capacity``.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Initialize a full bucket.
+
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum number of tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        """Add tokens accrued since the last update; the caller must hold the lock."""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens if they are available right now.
+
+        Args:
+            tokens (float): Number of tokens to take
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise seconds until they will be available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Block until tokens are available.
+
+        Args:
+            tokens (float): Number of tokens to take
+            timeout (float, optional): Maximum seconds to wait
+
+        Returns:
+            bool: True if the tokens were taken, False if the timeout expired first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait_time = self.try_acquire(tokens)
+            if wait_time == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait_time = min(wait_time, remaining)
+            time.sleep(wait_time)
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of the requests made within a sliding window.
+
+    Retries are allowed while the number of retries in the window stays below
+    ``ratio`` times the number of requests plus a small fixed allowance, so a
+    burst of upstream failures cannot multiply the request rate.
+    """
+
+    def __init__(self, ratio=0.2, min_retries_per_second=1.0, window=10.0):
+        """
+        Initialize the budget.
+
+        Args:
+            ratio (float): Retries allowed per request in the window
+            min_retries_per_second (float): Retries always allowed regardless of traffic
+            window (float): Sliding window length in seconds
+        """
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        """Drop events older than the window; the caller must hold the lock."""
+        cutoff = now - self.window
+        while self._requests and self._requests[0] < cutoff:
+            self._requests.popleft()
+        while self._retries and self._retries[0] < cutoff:
+            self._retries.popleft()
+
+    def record_request(self):
+        """Record a first attempt, which earns retry allowance."""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self):
+        """
+        Take one retry from the budget if any is left.
+
+        Returns:
+            bool: True if the retry is allowed
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            allowance = self.min_retries_per_second * self.window + self.ratio * len(self._requests)
+            if len(self._retries) < allowance:
+                self._retries.append(now)
+                return True
+            return False
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """
+    Compute an exponential backoff delay with full jitter.
+
+    Args:
+        attempt (int): Zero-based retry attempt number
+        base (float): Delay scale in seconds
+        cap (float): Maximum delay in seconds
+
+    Returns:
+        float: Seconds to wait before the retry
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header given in seconds or as an HTTP date.
+
+    Args:
+        value (str): Header value
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,169 @@
+"""
+In-Memory Result Cache for Government Financial Budget Assistant
+
+This module provides a thread-safe LRU cache with TTL expiry, bounded by both
+entry count and approximate byte size, with hit/miss counters. It is used to
+memoize computed query results inside the process.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+from serialization import dumps
+
+def estimate_size(value):
+    """
+    Estimate the memory footprint of a JSON-like value from its serialized length.
+
+    Args:
+        value: Value to measure
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    try:
+        return len(dumps(value))
+    except (TypeError, ValueError):
+        return 0
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry TTL, bounded by entry count and byte size.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, ttl=300):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int): Maximum number of entries
+            max_bytes (int): Maximum total approximate size of all entries in bytes
+            ttl (float): Default time to live in seconds
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Look up a fresh entry and mark it as most recently used.
+
+        Expired entries count as misses but are kept until evicted, so they can
+        still be served through get_stale().
+
+        Args:
+            key: Hashable cache key
+            default: Value returned on a miss
+
+        Returns:
+            The cached value, or ``default`` if missing or expired
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_stale(self, key, default=None):
+        """
+        Look up an entry whether or not it has expired, without touching the counters.
+
+        Args:
+            key: Hashable cache key
+            default: Value returned if there is no entry
+
+        Returns:
+            The cached value, or ``default`` if there is no entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return default if entry is None else entry[0]
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value, evicting least recently used entries to stay within bounds.
+
+        Args:
+            key: Hashable cache key
+            value: Value to store
+            ttl (float, optional): Time to live in seconds (defaults to the cache TTL)
+
+        Returns:
+            bool: False if the value alone exceeds the byte bound and was not stored
+        """
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return False
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+        return True
+
+    def delete(self, key):
+        """
+        Remove an entry if present.
+
+        Args:
+            key: Hashable cache key
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Entry count, byte size, hits, misses, evictions and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def _remove(self, key):
+        """Remove an entry; the caller must hold the lock."""
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,132 @@
+"""
+JSON Serialization for Government Financial Budget Assistant
+
+This module provides the JSON encoder and decoder used for HTTP responses and
+internal payloads. It uses orjson when it is installed and falls back to the
+standard library json module otherwise; JSON_SERIALIZER=json forces the
+fallback. It also provides a "trusted" response path for server-generated data
+that bypasses FastAPI's response_model validation and serialization.
+"""
+
+import os
+import json
+import math
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Serializer backend: "orjson" (default when installed) or "json"
+JSON_SERIALIZER = os.getenv("JSON_SERIALIZER", "orjson").lower()
+
+if JSON_SERIALIZER == "orjson" and orjson is None:
+    logger.info("orjson is not installed, using the standard library json module")
+
+BACKEND = "orjson" if JSON_SERIALIZER == "orjson" and orjson is not None else "json"
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+def _finite(value):
+    """Replace NaN and infinity with None, as orjson does, so both backends emit valid JSON."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+def _default(value):
+    """Encode values neither backend handles natively (pandas, numpy, Decimal, sets)."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return _finite(float(value))
+    if isinstance(value, (set, frozenset)):
+        return _finite(list(value))
+    if hasattr(value, "item") and callable(value.item):
+        # numpy scalars
+        return _finite(value.item())
+    return str(value)
+
+def dumps(value):
+    """
+    Serialize a value to compact JSON.
+
+    NaN and infinity are written as null with either backend.
+
+    Args:
+        value: JSON-like value
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    if BACKEND == "orjson":
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(_finite(value), default=_default, separators=(",", ":"), ensure_ascii=False, allow_nan=False).encode("utf-8")
+
+def dumps_str(value):
+    """
+    Serialize a value to compact JSON text.
+
+    Args:
+        value: JSON-like value
+
+    Returns:
+        str: JSON text
+    """
+    return dumps(value).decode("utf-8")
+
+def loads(data):
+    """
+    Parse JSON.
+
+    Args:
+        data (bytes or str): JSON document
+
+    Returns:
+        Parsed value
+
+    Raises:
+        ValueError: If the document is not valid JSON (json.JSONDecodeError with either backend)
+    """
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+def trusted_response(content, status_code=200, media_type="application/json", headers=None):
+    """
+    Build an HTTP response from server-generated data without re-validating it.
+
+    Returning a Response from a FastAPI endpoint skips its response_model
+    validation and the jsonable_encoder pass, so the content is serialized once.
+    Only use it for data the server built itself.
+
+    Args:
+        content: JSON-like response body
+        status_code (int): HTTP status code
+        media_type (str): Response media type
+        headers (dict, optional): Extra response headers
+
+    Returns:
+        starlette.responses.Response: The response
+    """
+    # Imported here so the data integration modules do not depend on the web framework
+    from starlette.responses import Response
+
+    return Response(dumps(content), status_code=status_code, media_type=media_type, headers=headers)
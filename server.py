@@ -1,13 +1,33 @@
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Any
 import logging
 import os
 import requests
 import json
+import sys
+import uuid
+import base64
+import asyncio
+from pathlib import Path
 from dotenv import load_dotenv
 
+# Add data_integration directory to path
+current_dir = Path(__file__).resolve().parent
+data_integration_dir = current_dir.parent / "data_integration"
+sys.path.append(str(data_integration_dir))
+
+from agency_catalog import get_agencies
+from agency_rankings import get_store, metric_for
+from response_formats import (
+    ARROW, ARROW_MEDIA_TYPE, COLUMNAR, COLUMNAR_MEDIA_TYPE,
+    arrow_available, columnar_to_arrow, negotiate_layout, to_columnar
+)
+from serialization import dumps_str, trusted_response
+from result_cache import TTLCache
+
 # Load environment variables
 load_dotenv()
 
@@ -19,6 +39,31 @@ logger = logging.getLogger(__name__)
 USASPENDING_API_URL = "https://api.usaspending.gov"
 TREASURY_API_URL = "https://api.fiscaldata.treasury.gov/services/api/fiscal_service"
 
+# Media type of streamed /api/data responses
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Answer all-agency top-N requests from the materialized agency rankings
+AGENCY_RANKINGS_ENABLED = os.getenv("AGENCY_RANKINGS_ENABLED", "false").lower() == "true"
+
+# Include Treasury.gov rows in /api/data responses
+TREASURY_DATA_ENABLED = os.getenv("TREASURY_DATA_ENABLED", "false").lower() == "true"
+
+# Per-request limits on the concurrent per-year, per-source fetches of /api/data
+DATA_FETCH_CONCURRENCY = int(os.getenv("DATA_FETCH_CONCURRENCY", "8"))
+DATA_FETCH_DEADLINE = float(os.getenv("DATA_FETCH_DEADLINE", "30"))
+
+# Result snapshots backing cursor pagination of /api/data
+RESULT_SNAPSHOT_TTL = int(os.getenv("RESULT_SNAPSHOT_TTL", "600"))
+RESULT_SNAPSHOT_MAX_ENTRIES = int(os.getenv("RESULT_SNAPSHOT_MAX_ENTRIES", "128"))
+RESULT_SNAPSHOT_MAX_BYTES = int(os.getenv("RESULT_SNAPSHOT_MAX_BYTES", str(256 * 1024 * 1024)))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+result_snapshots = TTLCache(
+    max_entries=RESULT_SNAPSHOT_MAX_ENTRIES,
+    max_bytes=RESULT_SNAPSHOT_MAX_BYTES,
+    ttl=RESULT_SNAPSHOT_TTL
+)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Government Financial Budget Assistant - MCP Server",
@@ -44,6 +89,10 @@ class DataRequest(BaseModel):
     aggregation: Optional[str] = None
     limit: Optional[int] = None
     visualization: Optional[str] = None
+    stream: Optional[bool] = None
+    format: Optional[str] = None
+    page_size: Optional[int] = None
+    cursor: Optional[str] = None
 
 class DataResponse(BaseModel):
     data: List[Dict[str, Any]]
@@ -137,7 +186,6 @@ async def fetch_usaspending_data(entity=None, fiscal_year=None, limit=10):
         logger.info(f"Fetching USASpending data for entity={entity}, fiscal_year={fiscal_year}")
         
         # Simulate API call delay
-        import asyncio
         await asyncio.sleep(0.5)
         
         # Return mock data based on parameters
@@ -185,6 +233,39 @@ async def fetch_usaspending_data(entity=None, fiscal_year=None, limit=10):
         logger.error(f"Error fetching USASpending data: {str(e)}")
         return []
 
+async def fetch_ranked_agencies(fiscal_year, limit=10, metric=None):
+    """
+    Get the top agencies for a fiscal year from the materialized agency rankings.
+    
+    Args:
+        fiscal_year (str): Fiscal year
+        limit (int): Number of agencies
+        metric (str, optional): Requested metric (e.g., "budget", "spending")
+        
+    Returns:
+        list: Top agencies in the /api/data row format, or None if no ranking is materialized yet
+    """
+    if not AGENCY_RANKINGS_ENABLED:
+        return None
+    
+    # Never build on the request path; the background job materializes the rankings.
+    # A miss may read the disk, so keep the lookup off the event loop.
+    ranking = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: get_store().top_n(fiscal_year, limit, metric_for(metric), build=False)
+    )
+    if "error" in ranking:
+        return None
+    
+    return [
+        {
+            "department": entry["agency_name"],
+            "year": entry["fiscal_year"],
+            "amount": entry["amount"],
+            "source": "USASpending.gov"
+        }
+        for entry in ranking["data"]
+    ]
+
 async def fetch_treasury_data(entity=None, fiscal_year=None, limit=10):
     """
     Fetch budget data from Treasury.gov API
@@ -196,7 +277,6 @@ async def fetch_treasury_data(entity=None, fiscal_year=None, limit=10):
         logger.info(f"Fetching Treasury data for entity={entity}, fiscal_year={fiscal_year}")
         
         # Simulate API call delay
-        import asyncio
         await asyncio.sleep(0.5)
         
         # Return mock data with slight variations from USASpending
@@ -352,68 +432,332 @@ def apply_aggregation(data, aggregation_type):
     
     return result or data
 
+def finalize_rows(data, request: DataRequest):
+    """
+    Apply the requested aggregation and overall limit to the collected rows.
+    
+    Args:
+        data (list): Rows from every year and source
+        request (DataRequest): The data request
+        
+    Returns:
+        list: Final rows
+    """
+    # Apply aggregation if specified
+    if request.aggregation:
+        data = apply_aggregation(data, request.aggregation)
+    
+    # Apply limit if specified and not already applied in data source connectors
+    if request.limit and len(data) > request.limit:
+        # Sort by amount (descending) before applying limit
+        data.sort(key=lambda x: x["amount"], reverse=True)
+        data = data[:request.limit]
+    
+    return data
+
+def build_metadata(request: DataRequest, years, result_count):
+    """
+    Build the metadata block of a data response.
+    """
+    return {
+        "query_parameters": request.dict(),
+        "result_count": result_count,
+        "sources": ["USASpending.gov", "Treasury.gov"] if TREASURY_DATA_ENABLED else ["USASpending.gov"],
+        "years": years
+    }
+
+async def fetch_usaspending_year(entity, fiscal_year, limit, metric=None):
+    """
+    Fetch one year of USASpending rows, using the materialized rankings for all-agency top-N requests.
+    """
+    ranked_data = await fetch_ranked_agencies(fiscal_year, limit, metric) if not entity else None
+    return ranked_data if ranked_data is not None else await fetch_usaspending_data(entity, fiscal_year, limit)
+
+async def iter_year_rows(entity, years, limit, metric=None):
+    """
+    Fetch the rows for each requested year, yielding them in year order as each year completes.
+    
+    Every year and source is fetched concurrently, at most DATA_FETCH_CONCURRENCY
+    at a time, so the request takes about as long as its slowest fetch. Fetches
+    still running after DATA_FETCH_DEADLINE seconds are cancelled.
+    
+    Args:
+        entity (str): Agency or department name
+        years (list): Fiscal years
+        limit (int): Per-source row limit
+        metric (str, optional): Requested metric
+        
+    Yields:
+        tuple: (year, list of rows)
+        
+    Raises:
+        asyncio.TimeoutError: If the fetches do not finish before the deadline
+    """
+    semaphore = asyncio.Semaphore(DATA_FETCH_CONCURRENCY)
+    
+    async def bounded(fetch, *args):
+        async with semaphore:
+            return await fetch(*args)
+    
+    # Schedule every fetch up front; results are still collected year by year
+    tasks = {}
+    for year in years:
+        tasks[year] = [asyncio.ensure_future(bounded(fetch_usaspending_year, entity, year, limit, metric))]
+        if TREASURY_DATA_ENABLED:
+            tasks[year].append(asyncio.ensure_future(bounded(fetch_treasury_data, entity, year, limit)))
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + DATA_FETCH_DEADLINE
+    try:
+        for year in years:
+            try:
+                results = await asyncio.wait_for(asyncio.gather(*tasks[year]), max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                raise asyncio.TimeoutError(f"Data retrieval exceeded the {DATA_FETCH_DEADLINE:g}s deadline")
+            yield year, [row for rows in results for row in rows]
+    finally:
+        # Stop outstanding fetches after a failure, the deadline, or an abandoned stream
+        for year_tasks in tasks.values():
+            for task in year_tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark failures of years that were never awaited as retrieved
+                    task.exception()
+
+def encode_cursor(snapshot_id, offset, page_size):
+    """
+    Encode an opaque pagination cursor.
+    """
+    token = f"{snapshot_id}:{offset}:{page_size}".encode("utf-8")
+    return base64.urlsafe_b64encode(token).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    """
+    Decode a pagination cursor.
+    
+    Args:
+        cursor (str): Cursor from a previous response
+        
+    Returns:
+        tuple: (snapshot_id, offset, page_size)
+        
+    Raises:
+        ValueError: If the cursor is malformed or asks for more than MAX_PAGE_SIZE rows per page
+    """
+    try:
+        token = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        snapshot_id, offset, page_size = token.split(":")
+        offset, page_size = int(offset), int(page_size)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Malformed cursor")
+    if offset < 0 or page_size < 1:
+        raise ValueError("Malformed cursor")
+    if page_size > MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    return snapshot_id, offset, page_size
+
+def snapshot_result(data, metadata):
+    """
+    Store a computed result so later pages are served from it.
+    
+    Args:
+        data (list): Final rows (must not be modified afterwards)
+        metadata (dict): Response metadata
+        
+    Returns:
+        str: Snapshot id, or None if the result is too large to keep
+    """
+    snapshot_id = uuid.uuid4().hex
+    if not result_snapshots.set(snapshot_id, {"data": data, "metadata": metadata}):
+        logger.warning(f"Result of {len(data)} rows is too large to snapshot, returning it unpaginated")
+        return None
+    return snapshot_id
+
+def result_page(snapshot_id, snapshot, offset, page_size):
+    """
+    Slice one page out of a result snapshot.
+    
+    Args:
+        snapshot_id (str): Snapshot id
+        snapshot (dict): Snapshot with "data" and "metadata"
+        offset (int): Index of the first row of the page
+        page_size (int): Maximum rows per page
+        
+    Returns:
+        tuple: (rows, metadata) where metadata has a "pagination" block
+    """
+    rows = snapshot["data"][offset:offset + page_size]
+    next_offset = offset + len(rows)
+    total_count = len(snapshot["data"])
+    metadata = dict(snapshot["metadata"])
+    metadata["pagination"] = {
+        "offset": offset,
+        "page_size": page_size,
+        "count": len(rows),
+        "total_count": total_count,
+        "next_cursor": encode_cursor(snapshot_id, next_offset, page_size) if next_offset < total_count else None
+    }
+    return rows, metadata
+
+def wants_stream(request: DataRequest, http_request: Request):
+    """
+    Check whether the client opted in to an NDJSON streaming response.
+    """
+    return bool(request.stream) or NDJSON_MEDIA_TYPE in http_request.headers.get("accept", "")
+
+async def stream_budget_data(request: DataRequest, years, limit):
+    """
+    Stream a data response as NDJSON: one {"data": row} record per line, sent as
+    each year is fetched, followed by a {"metadata": ...} trailer record.
+    
+    An aggregation, or an overall limit across several years, needs every row
+    first; those rows are collected and then streamed.
+    
+    Yields:
+        str: NDJSON lines
+    """
+    buffered = bool(request.aggregation) or (bool(request.limit) and len(years) > 1)
+    pending = []
+    count = 0
+    
+    try:
+        async for _, rows in iter_year_rows(request.entity, years, limit, request.metric):
+            if buffered:
+                pending.extend(rows)
+                continue
+            for row in rows:
+                count += 1
+                yield dumps_str({"data": row}) + "\n"
+        
+        if buffered:
+            for row in finalize_rows(pending, request):
+                count += 1
+                yield dumps_str({"data": row}) + "\n"
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band and end the stream
+        logger.error(f"Error streaming budget data: {str(e)}")
+        yield dumps_str({"error": f"Data retrieval failed: {str(e)}"}) + "\n"
+        return
+    
+    metadata = build_metadata(request, years, count)
+    metadata["streamed"] = True
+    yield dumps_str({"metadata": metadata}) + "\n"
+
+def data_response(data, metadata, layout):
+    """
+    Build a /api/data response in the negotiated layout.
+    """
+    # The rows are built here, so skip re-validating them against DataResponse
+    if layout == COLUMNAR:
+        return trusted_response(
+            {"data": to_columnar(data), "metadata": metadata},
+            media_type=COLUMNAR_MEDIA_TYPE,
+            headers={"Vary": "Accept"}
+        )
+    if layout == ARROW:
+        # Metadata travels in the Arrow schema metadata under the "metadata" key
+        return Response(
+            columnar_to_arrow(to_columnar(data), metadata),
+            media_type=ARROW_MEDIA_TYPE,
+            headers={"Vary": "Accept"}
+        )
+    
+    return trusted_response({
+        "data": data,
+        "metadata": metadata
+    })
+
 @app.post("/api/data", response_model=DataResponse)
-async def get_budget_data(request: DataRequest):
+async def get_budget_data(request: DataRequest, http_request: Request):
     """
     Retrieve budget data based on the parameters extracted from the natural language query.
+    
+    Set "stream": true in the body, or send "Accept: application/x-ndjson", to
+    receive the rows as an NDJSON stream instead of a single JSON document.
+    Set "format" to "columnar" or "arrow", or send the matching Accept media
+    type, to receive the data column by column as JSON or as an Apache Arrow
+    IPC stream.
+    
+    Set "page_size" to receive the result one page at a time. The result is
+    computed once and kept for RESULT_SNAPSHOT_TTL seconds; send the returned
+    "next_cursor" as "cursor" to get the following page from that snapshot.
     """
+    try:
+        layout = negotiate_layout(http_request.headers.get("accept"), request.format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if layout == ARROW and not arrow_available():
+        raise HTTPException(status_code=406, detail="Arrow responses are not available on this server (pyarrow is not installed)")
+    if request.page_size is not None and not 1 <= request.page_size <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    
+    if request.cursor:
+        # Later pages come from the stored snapshot, never from the upstream sources
+        try:
+            snapshot_id, offset, page_size = decode_cursor(request.cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        snapshot = result_snapshots.get(snapshot_id)
+        if snapshot is None:
+            raise HTTPException(status_code=410, detail="Cursor has expired; repeat the original request")
+        data, metadata = result_page(snapshot_id, snapshot, offset, page_size)
+        return data_response(data, metadata, layout)
+    
     try:
         logger.info(f"Received data request: {request}")
         
         # Process the request parameters
-        entity = request.entity
         years = process_time_period(request.time_period)
         limit = request.limit or 10
         
+        if wants_stream(request, http_request):
+            return StreamingResponse(stream_budget_data(request, years, limit), media_type=NDJSON_MEDIA_TYPE)
+        
         # Fetch data from multiple sources
         data = []
+        async for _, rows in iter_year_rows(request.entity, years, limit, request.metric):
+            data.extend(rows)
         
-        # In a real implementation, we would fetch from actual APIs
-        # For now, we'll use our mock data connectors
-        for year in years:
-            # Fetch from USASpending
-            usaspending_data = await fetch_usaspending_data(entity, year, limit)
-            data.extend(usaspending_data)
-            
-            # Fetch from Treasury
-            # Uncomment to include Treasury data
-            # treasury_data = await fetch_treasury_data(entity, year, limit)
-            # data.extend(treasury_data)
-        
-        # Apply aggregation if specified
-        if request.aggregation:
-            data = apply_aggregation(data, request.aggregation)
-        
-        # Apply limit if specified and not already applied in data source connectors
-        if request.limit and len(data) > request.limit:
-            # Sort by amount (descending) before applying limit
-            data.sort(key=lambda x: x["amount"], reverse=True)
-            data = data[:request.limit]
+        data = finalize_rows(data, request)
+        metadata = build_metadata(request, years, len(data))
         
-        # Add metadata
-        metadata = {
-            "query_parameters": request.dict(),
-            "result_count": len(data),
-            "sources": ["USASpending.gov"],  # Add Treasury.gov if used
-            "years": years
-        }
+        if request.page_size:
+            snapshot_id = snapshot_result(data, metadata)
+            if snapshot_id:
+                data, metadata = result_page(snapshot_id, {"data": data, "metadata": metadata}, 0, request.page_size)
         
-        return {
-            "data": data,
-            "metadata": metadata
-        }
+        return data_response(data, metadata, layout)
     
+    except asyncio.TimeoutError as e:
+        logger.error(f"Error retrieving budget data: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving budget data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Data retrieval failed: {str(e)}")
 
+@app.on_event("startup")
+async def start_background_jobs():
+    """
+    Start materializing agency rankings in the background.
+    """
+    if AGENCY_RANKINGS_ENABLED:
+        get_store().start()
+
 @app.get("/api/departments")
 async def get_departments():
     """
-    Get list of available government departments
+    Get list of available government departments from the cached agency catalog
     """
-    departments = list(MOCK_BUDGET_DATA["departments"].keys())
-    return {"departments": departments}
+    # The first call may load the catalog from disk or the network, so keep it off the event loop
+    agencies = await asyncio.get_running_loop().run_in_executor(None, get_agencies)
+    if not agencies:
+        # Catalog unavailable (no persisted copy and upstream unreachable)
+        return {"departments": list(MOCK_BUDGET_DATA["departments"].keys()), "agencies": []}
+    return {
+        "departments": [agency["name"] for agency in agencies],
+        "agencies": agencies
+    }
 
 @app.get("/api/years")
 async def get_fiscal_years():
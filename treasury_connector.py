@@ -5,13 +5,21 @@ This module provides functions to retrieve budget data from the Treasury.gov Fis
 """
 
 import os
+import re
 import requests
 import json
 import logging
 import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime
 
+from http_client import get_json
+from fiscal_query import FiscalQuery
+import treasury_warehouse
+from response_formats import COLUMNAR, to_columnar
+
 # Load environment variables
 load_dotenv()
 
@@ -33,6 +41,205 @@ HEADERS = {
 if API_KEY:
     HEADERS["X-API-Key"] = API_KEY
 
+# Pagination configuration
+TREASURY_PAGE_SIZE = int(os.getenv("TREASURY_PAGE_SIZE", "5000"))
+TREASURY_PREFETCH_PAGES = int(os.getenv("TREASURY_PREFETCH_PAGES", "4"))
+
+# Where queries are answered: "api" (Fiscal Data), "local" (the treasury_warehouse
+# Parquet store) or "auto" (local for tables that have been ingested, api otherwise)
+TREASURY_BACKEND = os.getenv("TREASURY_BACKEND", "api").lower()
+
+# Columns needed to compare outlays between fiscal years
+COMPARISON_FIELDS = ["classification_desc", "current_fytd_net_outly_amt"]
+
+# Types assumed for the comparison columns when a response carries no meta.dataTypes
+COMPARISON_DATA_TYPES = {"classification_desc": "STRING", "current_fytd_net_outly_amt": "CURRENCY"}
+
+# Fiscal Data meta.dataTypes decoded to numbers (prefix match, e.g. "CURRENCY0") and dates;
+# every other type (STRING, YEAR, MONTH, ...) is kept as a string
+NUMERIC_DATA_TYPES = ("NUMBER", "CURRENCY", "PERCENTAGE", "INTEGER")
+DATE_DATA_TYPES = ("DATE",)
+
+# Worker pool used to prefetch upcoming pages while the current one is consumed
+_prefetch_executor = ThreadPoolExecutor(
+    max_workers=TREASURY_PREFETCH_PAGES,
+    thread_name_prefix="treasury-prefetch"
+)
+
+def _fetch_page(endpoint, params, page_number, use_cache=True):
+    """
+    Fetch a single page of a Fiscal Data endpoint.
+
+    Args:
+        endpoint (str): Fiscal Data endpoint URL
+        params (dict): Query parameters (without page number)
+        page_number (int): 1-based page number
+        use_cache (bool): Whether to read and write the response cache
+
+    Returns:
+        dict: JSON response for the requested page
+    """
+    page_params = dict(params)
+    page_params["page[number]"] = page_number
+    return get_json(endpoint, params=page_params, headers=HEADERS, use_cache=use_cache)
+
+def iter_fiscal_data_pages(endpoint, params, page_size=None, prefetch=None, limit=None, use_cache=True):
+    """
+    Lazily iterate over every page of a Fiscal Data endpoint.
+
+    The first page is fetched synchronously to learn ``meta.total-pages``; the
+    following pages are prefetched concurrently, keeping at most ``prefetch``
+    requests in flight ahead of the consumer. If the response does not report a
+    page count, ``links.next`` is followed one page at a time instead.
+
+    Args:
+        endpoint (str): Fiscal Data endpoint URL
+        params (dict): Query parameters (filter, sort, fields, ...)
+        page_size (int, optional): Records per page (defaults to TREASURY_PAGE_SIZE)
+        prefetch (int, optional): Maximum pages fetched ahead (defaults to TREASURY_PREFETCH_PAGES)
+        limit (int, optional): Maximum number of records needed; no pages beyond it are requested
+        use_cache (bool): Whether to read and write the response cache (bulk downloads should not)
+
+    Yields:
+        dict: JSON response for each page, in page order
+
+    Raises:
+        requests.exceptions.RequestException: If any page cannot be retrieved
+    """
+    params = dict(params)
+    page_size = page_size or params.get("page[size]") or TREASURY_PAGE_SIZE
+    max_pages = None
+    if limit:
+        # Push the limit down as the page size and never read past it
+        page_size = min(page_size, limit)
+        max_pages = -(-limit // page_size)
+    params["page[size]"] = page_size
+    prefetch = max(1, prefetch or TREASURY_PREFETCH_PAGES)
+
+    first_page = _fetch_page(endpoint, params, 1, use_cache)
+    yield first_page
+
+    total_pages = first_page.get("meta", {}).get("total-pages")
+    if total_pages is None:
+        # No page count reported, follow links.next sequentially
+        page_number = 1
+        page = first_page
+        while page.get("links", {}).get("next") and (max_pages is None or page_number < max_pages):
+            page_number += 1
+            page = _fetch_page(endpoint, params, page_number, use_cache)
+            yield page
+        return
+
+    if max_pages is not None:
+        total_pages = min(total_pages, max_pages)
+
+    pending = deque()
+    next_page = 2
+    try:
+        while next_page <= total_pages or pending:
+            # Keep the prefetch window full
+            while next_page <= total_pages and len(pending) < prefetch:
+                pending.append(_prefetch_executor.submit(_fetch_page, endpoint, params, next_page, use_cache))
+                next_page += 1
+            yield pending.popleft().result()
+    finally:
+        # Consumer stopped early or a page failed; drop outstanding prefetches
+        for future in pending:
+            future.cancel()
+
+def _local_table(endpoint):
+    """
+    Decide whether a query should be answered from the local warehouse.
+
+    Args:
+        endpoint (str): Fiscal Data endpoint URL
+
+    Returns:
+        str: Warehouse table name, or None to query the Fiscal Data API
+    """
+    if TREASURY_BACKEND not in ("local", "auto"):
+        return None
+    table = treasury_warehouse.table_for_endpoint(endpoint)
+    if table is None:
+        return None
+    if TREASURY_BACKEND == "auto" and not treasury_warehouse.is_ingested(table):
+        return None
+    return table
+
+def iter_fiscal_data(endpoint, params, page_size=None, prefetch=None, limit=None):
+    """
+    Lazily iterate over every record of a Fiscal Data endpoint across all pages.
+
+    Args:
+        endpoint (str): Fiscal Data endpoint URL
+        params (dict): Query parameters (filter, sort, fields, ...)
+        page_size (int, optional): Records per page
+        prefetch (int, optional): Maximum pages fetched ahead
+        limit (int, optional): Maximum number of records to yield
+
+    Yields:
+        dict: One data record at a time
+    """
+    table = _local_table(endpoint)
+    if table:
+        yield from treasury_warehouse.query_params(table, params, limit)["data"]
+        return
+
+    remaining = limit
+    for page in iter_fiscal_data_pages(endpoint, params, page_size, prefetch, limit):
+        records = page.get("data", [])
+        if remaining is not None:
+            records = records[:remaining]
+            remaining -= len(records)
+        yield from records
+        if remaining is not None and remaining <= 0:
+            return
+
+def fetch_all_pages(endpoint, params, page_size=None, prefetch=None, limit=None):
+    """
+    Retrieve every page of a Fiscal Data endpoint and combine them into one response.
+
+    Args:
+        endpoint (str): Fiscal Data endpoint URL
+        params (dict): Query parameters (filter, sort, fields, ...)
+        page_size (int, optional): Records per page
+        prefetch (int, optional): Maximum pages fetched ahead
+        limit (int, optional): Maximum number of records to retrieve
+
+    Returns:
+        dict: Response with the same shape as a single Fiscal Data page, holding all records
+    """
+    table = _local_table(endpoint)
+    if table:
+        return treasury_warehouse.query_params(table, params, limit)
+
+    records = []
+    meta = {}
+    links = {}
+    for page in iter_fiscal_data_pages(endpoint, params, page_size, prefetch, limit):
+        if not meta:
+            meta = dict(page.get("meta", {}))
+            links = page.get("links", {})
+        records.extend(page.get("data", []))
+
+    if limit is not None:
+        records = records[:limit]
+
+    meta["count"] = len(records)
+    return {"data": records, "meta": meta, "links": links}
+
+def _debt_to_penny_request(start_date=None, end_date=None):
+    """Build the endpoint and query parameters for the debt to the penny dataset."""
+    endpoint = f"{BASE_URL}/v2/accounting/od/debt_to_penny"
+    query = FiscalQuery()
+    
+    if start_date:
+        query.gte("record_date", start_date)
+    if end_date:
+        query.lte("record_date", end_date)
+    
+    return endpoint, query.to_params()
+
 def get_debt_to_penny(start_date=None, end_date=None):
     """
     Retrieve the daily U.S. national debt data.
@@ -44,220 +251,405 @@ def get_debt_to_penny(start_date=None, end_date=None):
     Returns:
         dict: JSON response containing debt data
     """
-    endpoint = f"{BASE_URL}/v2/accounting/od/debt_to_penny"
-    params = {
-        "format": "json",
-        "page[size]": 10000
-    }
-    
-    if start_date:
-        params["filter"] = f"record_date:gte:{start_date}"
-        if end_date:
-            params["filter"] += f",record_date:lte:{end_date}"
-    elif end_date:
-        params["filter"] = f"record_date:lte:{end_date}"
-    
     try:
         logger.info(f"Fetching debt to penny data from {start_date} to {end_date}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return fetch_all_pages(*_debt_to_penny_request(start_date, end_date))
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching debt to penny data: {str(e)}")
         return {"error": str(e)}
 
-def get_monthly_treasury_statement(fiscal_year=None):
+def iter_debt_to_penny(start_date=None, end_date=None):
+    """
+    Stream the daily U.S. national debt records page by page.
+    
+    Args:
+        start_date (str, optional): Start date in YYYY-MM-DD format
+        end_date (str, optional): End date in YYYY-MM-DD format
+        
+    Yields:
+        dict: One debt record at a time
+    """
+    logger.info(f"Streaming debt to penny data from {start_date} to {end_date}")
+    return iter_fiscal_data(*_debt_to_penny_request(start_date, end_date))
+
+def _mts_request(table, fiscal_year=None, fields=None, sort=None):
+    """Build the endpoint and query parameters for a Monthly Treasury Statement table."""
+    endpoint = f"{BASE_URL}/v1/accounting/mts/{table}"
+    query = FiscalQuery()
+    
+    if fiscal_year:
+        query.eq("fiscal_year", fiscal_year)
+    if fields:
+        query.fields(fields)
+    if sort:
+        query.sort(sort)
+    
+    return endpoint, query.to_params()
+
+def get_monthly_treasury_statement(fiscal_year=None, fields=None, sort=None, limit=None):
     """
     Retrieve Monthly Treasury Statement (MTS) data for federal budget receipts and outlays.
     
     Args:
         fiscal_year (str, optional): The fiscal year (e.g., "2023")
+        fields (list, optional): Columns to return (defaults to all columns)
+        sort (str or list, optional): Server-side sort, e.g. "-current_fytd_net_outly_amt"
+        limit (int, optional): Maximum number of records to return
         
     Returns:
         dict: JSON response containing MTS data
     """
-    endpoint = f"{BASE_URL}/v1/accounting/mts/mts_table_5"
-    params = {
-        "format": "json",
-        "page[size]": 10000
-    }
-    
-    if fiscal_year:
-        params["filter"] = f"fiscal_year:eq:{fiscal_year}"
-    
     try:
         logger.info(f"Fetching Monthly Treasury Statement data for FY {fiscal_year}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return fetch_all_pages(*_mts_request("mts_table_5", fiscal_year, fields, sort), limit=limit)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching Monthly Treasury Statement data: {str(e)}")
         return {"error": str(e)}
 
-def get_federal_budget_outlays(fiscal_year=None):
+def iter_monthly_treasury_statement(fiscal_year=None, fields=None, sort=None, limit=None):
+    """
+    Stream Monthly Treasury Statement (MTS) records page by page.
+    
+    Args:
+        fiscal_year (str, optional): The fiscal year (e.g., "2023")
+        fields (list, optional): Columns to return (defaults to all columns)
+        sort (str or list, optional): Server-side sort, e.g. "-current_fytd_net_outly_amt"
+        limit (int, optional): Maximum number of records to yield
+        
+    Yields:
+        dict: One MTS record at a time
+    """
+    logger.info(f"Streaming Monthly Treasury Statement data for FY {fiscal_year}")
+    return iter_fiscal_data(*_mts_request("mts_table_5", fiscal_year, fields, sort), limit=limit)
+
+def get_federal_budget_outlays(fiscal_year=None, fields=None, sort=None, limit=None):
     """
     Retrieve federal budget outlays by agency and account.
     
     Args:
         fiscal_year (str, optional): The fiscal year (e.g., "2023")
+        fields (list, optional): Columns to return (defaults to all columns)
+        sort (str or list, optional): Server-side sort, e.g. "-current_fytd_net_outly_amt"
+        limit (int, optional): Maximum number of records to return
         
     Returns:
         dict: JSON response containing federal budget outlays data
     """
-    endpoint = f"{BASE_URL}/v1/accounting/mts/mts_table_9"
-    params = {
-        "format": "json",
-        "page[size]": 10000
-    }
-    
-    if fiscal_year:
-        params["filter"] = f"fiscal_year:eq:{fiscal_year}"
-    
     try:
         logger.info(f"Fetching federal budget outlays data for FY {fiscal_year}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return fetch_all_pages(*_mts_request("mts_table_9", fiscal_year, fields, sort), limit=limit)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching federal budget outlays data: {str(e)}")
         return {"error": str(e)}
 
-def get_federal_budget_receipts(fiscal_year=None):
+def iter_federal_budget_outlays(fiscal_year=None, fields=None, sort=None, limit=None):
+    """
+    Stream federal budget outlay records page by page.
+    
+    Args:
+        fiscal_year (str, optional): The fiscal year (e.g., "2023")
+        fields (list, optional): Columns to return (defaults to all columns)
+        sort (str or list, optional): Server-side sort, e.g. "-current_fytd_net_outly_amt"
+        limit (int, optional): Maximum number of records to yield
+        
+    Yields:
+        dict: One outlay record at a time
+    """
+    logger.info(f"Streaming federal budget outlays data for FY {fiscal_year}")
+    return iter_fiscal_data(*_mts_request("mts_table_9", fiscal_year, fields, sort), limit=limit)
+
+def get_federal_budget_receipts(fiscal_year=None, fields=None, sort=None, limit=None):
     """
     Retrieve federal budget receipts by source.
     
     Args:
         fiscal_year (str, optional): The fiscal year (e.g., "2023")
+        fields (list, optional): Columns to return (defaults to all columns)
+        sort (str or list, optional): Server-side sort, e.g. "-current_fytd_net_outly_amt"
+        limit (int, optional): Maximum number of records to return
         
     Returns:
         dict: JSON response containing federal budget receipts data
     """
-    endpoint = f"{BASE_URL}/v1/accounting/mts/mts_table_4"
-    params = {
-        "format": "json",
-        "page[size]": 10000
-    }
-    
-    if fiscal_year:
-        params["filter"] = f"fiscal_year:eq:{fiscal_year}"
-    
     try:
         logger.info(f"Fetching federal budget receipts data for FY {fiscal_year}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return fetch_all_pages(*_mts_request("mts_table_4", fiscal_year, fields, sort), limit=limit)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching federal budget receipts data: {str(e)}")
         return {"error": str(e)}
 
-def get_deficit_analysis(fiscal_year=None):
+def iter_federal_budget_receipts(fiscal_year=None, fields=None, sort=None, limit=None):
+    """
+    Stream federal budget receipt records page by page.
+    
+    Args:
+        fiscal_year (str, optional): The fiscal year (e.g., "2023")
+        fields (list, optional): Columns to return (defaults to all columns)
+        sort (str or list, optional): Server-side sort, e.g. "-current_fytd_net_outly_amt"
+        limit (int, optional): Maximum number of records to yield
+        
+    Yields:
+        dict: One receipt record at a time
+    """
+    logger.info(f"Streaming federal budget receipts data for FY {fiscal_year}")
+    return iter_fiscal_data(*_mts_request("mts_table_4", fiscal_year, fields, sort), limit=limit)
+
+def get_deficit_analysis(fiscal_year=None, fields=None, sort=None, limit=None):
     """
     Retrieve deficit analysis data.
     
     Args:
         fiscal_year (str, optional): The fiscal year (e.g., "2023")
+        fields (list, optional): Columns to return (defaults to all columns)
+        sort (str or list, optional): Server-side sort, e.g. "-current_fytd_net_outly_amt"
+        limit (int, optional): Maximum number of records to return
         
     Returns:
         dict: JSON response containing deficit analysis data
     """
-    endpoint = f"{BASE_URL}/v1/accounting/mts/mts_table_1"
-    params = {
-        "format": "json",
-        "page[size]": 10000
-    }
-    
-    if fiscal_year:
-        params["filter"] = f"fiscal_year:eq:{fiscal_year}"
-    
     try:
         logger.info(f"Fetching deficit analysis data for FY {fiscal_year}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return fetch_all_pages(*_mts_request("mts_table_1", fiscal_year, fields, sort), limit=limit)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching deficit analysis data: {str(e)}")
         return {"error": str(e)}
 
-def get_agency_expenditures(fiscal_year=None, agency_name=None):
+def iter_deficit_analysis(fiscal_year=None, fields=None, sort=None, limit=None):
     """
-    Retrieve agency expenditures data.
+    Stream deficit analysis records page by page.
     
     Args:
         fiscal_year (str, optional): The fiscal year (e.g., "2023")
-        agency_name (str, optional): The name of the agency to filter by
+        fields (list, optional): Columns to return (defaults to all columns)
+        sort (str or list, optional): Server-side sort, e.g. "-current_fytd_net_outly_amt"
+        limit (int, optional): Maximum number of records to yield
+        
+    Yields:
+        dict: One deficit record at a time
+    """
+    logger.info(f"Streaming deficit analysis data for FY {fiscal_year}")
+    return iter_fiscal_data(*_mts_request("mts_table_1", fiscal_year, fields, sort), limit=limit)
+
+def _mts_years_request(table, fiscal_years, fields=None, sort=None):
+    """
+    Build the endpoint and query parameters for an MTS table across several fiscal years.
+
+    A contiguous span of years is expressed as a gte/lte range, any other set as
+    a single ``fiscal_year:in:(...)`` filter, so the whole span is one paginated stream.
+    """
+    endpoint = f"{BASE_URL}/v1/accounting/mts/{table}"
+    years = sorted({int(year) for year in fiscal_years})
+    query = FiscalQuery()
+    
+    if len(years) == 1:
+        query.eq("fiscal_year", years[0])
+    elif years == list(range(years[0], years[-1] + 1)):
+        query.gte("fiscal_year", years[0]).lte("fiscal_year", years[-1])
+    else:
+        query.in_("fiscal_year", years)
+    if fields:
+        # The fiscal year is needed to split the combined result by year
+        query.fields(list(fields) + ["fiscal_year"])
+    if sort:
+        query.sort(sort)
+    
+    return endpoint, query.to_params()
+
+def _fiscal_year_span(start_year, end_year):
+    """List every fiscal year from start_year to end_year inclusive."""
+    return [str(year) for year in range(int(start_year), int(end_year) + 1)]
+
+def split_by_fiscal_year(records, fiscal_years=None):
+    """
+    Group records by their ``fiscal_year`` column.
+    
+    Args:
+        records (list): Fiscal Data records
+        fiscal_years (list, optional): Years to include as keys even if they have no records
         
     Returns:
-        dict: JSON response containing agency expenditures data
+        dict: Mapping of fiscal year (str) to its list of records, in ascending year order
     """
+    by_year = {str(year): [] for year in fiscal_years or []}
+    for record in records:
+        by_year.setdefault(str(record.get("fiscal_year")), []).append(record)
+    return dict(sorted(by_year.items()))
+
+def get_federal_budget_outlays_by_years(start_year, end_year, fields=None, sort=None):
+    """
+    Retrieve federal budget outlays for a span of fiscal years in one paginated request sequence.
+    
+    Args:
+        start_year (str): Starting fiscal year (e.g., "2014")
+        end_year (str): Ending fiscal year (e.g., "2023")
+        fields (list, optional): Columns to return (fiscal_year is always included)
+        sort (str or list, optional): Server-side sort
+        
+    Returns:
+        dict: JSON response containing outlays for every year in the span
+    """
+    try:
+        logger.info(f"Fetching federal budget outlays data for FY {start_year}-{end_year}")
+        return fetch_all_pages(*_mts_years_request("mts_table_9", _fiscal_year_span(start_year, end_year), fields, sort))
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error fetching federal budget outlays data: {str(e)}")
+        return {"error": str(e)}
+
+def get_federal_budget_receipts_by_years(start_year, end_year, fields=None, sort=None):
+    """
+    Retrieve federal budget receipts for a span of fiscal years in one paginated request sequence.
+    
+    Args:
+        start_year (str): Starting fiscal year (e.g., "2014")
+        end_year (str): Ending fiscal year (e.g., "2023")
+        fields (list, optional): Columns to return (fiscal_year is always included)
+        sort (str or list, optional): Server-side sort
+        
+    Returns:
+        dict: JSON response containing receipts for every year in the span
+    """
+    try:
+        logger.info(f"Fetching federal budget receipts data for FY {start_year}-{end_year}")
+        return fetch_all_pages(*_mts_years_request("mts_table_4", _fiscal_year_span(start_year, end_year), fields, sort))
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error fetching federal budget receipts data: {str(e)}")
+        return {"error": str(e)}
+
+def _agency_expenditures_request(fiscal_year=None, agency_name=None, fields=None, sort=None):
+    """Build the endpoint and query parameters for agency expenditures."""
     endpoint = f"{BASE_URL}/v1/accounting/mts/mts_table_5"
-    params = {
-        "format": "json",
-        "page[size]": 10000
-    }
+    query = FiscalQuery()
     
-    filter_params = []
     if fiscal_year:
-        filter_params.append(f"fiscal_year:eq:{fiscal_year}")
+        query.eq("fiscal_year", fiscal_year)
     if agency_name:
-        filter_params.append(f"current_fytd_net_outly_amt:gt:0,classification_desc:contains:{agency_name}")
+        query.gt("current_fytd_net_outly_amt", 0).contains("classification_desc", agency_name)
+    if fields:
+        query.fields(fields)
+    if sort:
+        query.sort(sort)
     
-    if filter_params:
-        params["filter"] = ",".join(filter_params)
+    return endpoint, query.to_params()
+
+def get_agency_expenditures(fiscal_year=None, agency_name=None, fields=None, sort=None, limit=None):
+    """
+    Retrieve agency expenditures data.
     
+    Args:
+        fiscal_year (str, optional): The fiscal year (e.g., "2023")
+        agency_name (str, optional): The name of the agency to filter by
+        fields (list, optional): Columns to return (defaults to all columns)
+        sort (str or list, optional): Server-side sort, e.g. "-current_fytd_net_outly_amt"
+        limit (int, optional): Maximum number of records to return
+        
+    Returns:
+        dict: JSON response containing agency expenditures data
+    """
     try:
         logger.info(f"Fetching agency expenditures data for FY {fiscal_year}, agency {agency_name}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return fetch_all_pages(*_agency_expenditures_request(fiscal_year, agency_name, fields, sort), limit=limit)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching agency expenditures data: {str(e)}")
         return {"error": str(e)}
 
-def get_historical_debt(start_year=None, end_year=None):
+def iter_agency_expenditures(fiscal_year=None, agency_name=None, fields=None, sort=None, limit=None):
     """
-    Retrieve historical debt data.
+    Stream agency expenditure records page by page.
     
     Args:
-        start_year (str, optional): Start year (e.g., "2010")
-        end_year (str, optional): End year (e.g., "2023")
+        fiscal_year (str, optional): The fiscal year (e.g., "2023")
+        agency_name (str, optional): The name of the agency to filter by
+        fields (list, optional): Columns to return (defaults to all columns)
+        sort (str or list, optional): Server-side sort, e.g. "-current_fytd_net_outly_amt"
+        limit (int, optional): Maximum number of records to yield
         
-    Returns:
-        dict: JSON response containing historical debt data
+    Yields:
+        dict: One expenditure record at a time
     """
+    logger.info(f"Streaming agency expenditures data for FY {fiscal_year}, agency {agency_name}")
+    return iter_fiscal_data(*_agency_expenditures_request(fiscal_year, agency_name, fields, sort), limit=limit)
+
+def _historical_debt_request(start_year=None, end_year=None):
+    """Build the endpoint and query parameters for historical debt outstanding."""
     endpoint = f"{BASE_URL}/v2/accounting/od/debt_outstanding"
-    params = {
-        "format": "json",
-        "page[size]": 10000,
-        "sort": "-record_date"
-    }
+    query = FiscalQuery().sort("-record_date")
     
-    filter_params = []
     if start_year:
-        start_date = f"{start_year}-01-01"
-        filter_params.append(f"record_date:gte:{start_date}")
+        query.gte("record_date", f"{start_year}-01-01")
     if end_year:
-        end_date = f"{end_year}-12-31"
-        filter_params.append(f"record_date:lte:{end_date}")
+        query.lte("record_date", f"{end_year}-12-31")
     
-    if filter_params:
-        params["filter"] = ",".join(filter_params)
+    return endpoint, query.to_params()
+
+def get_historical_debt(start_year=None, end_year=None):
+    """
+    Retrieve historical debt data.
     
+    Args:
+        start_year (str, optional): Start year (e.g., "2010")
+        end_year (str, optional): End year (e.g., "2023")
+        
+    Returns:
+        dict: JSON response containing historical debt data
+    """
     try:
         logger.info(f"Fetching historical debt data from {start_year} to {end_year}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
-        response.raise_for_status()
-        return response.json()
+        return fetch_all_pages(*_historical_debt_request(start_year, end_year))
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching historical debt data: {str(e)}")
         return {"error": str(e)}
 
-def format_treasury_data_for_client(data, data_type):
+def iter_historical_debt(start_year=None, end_year=None):
+    """
+    Stream historical debt records page by page, most recent first.
+    
+    Args:
+        start_year (str, optional): Start year (e.g., "2010")
+        end_year (str, optional): End year (e.g., "2023")
+        
+    Yields:
+        dict: One debt record at a time
+    """
+    logger.info(f"Streaming historical debt data from {start_year} to {end_year}")
+    return iter_fiscal_data(*_historical_debt_request(start_year, end_year))
+
+def decode_fiscal_data(records, data_types, columns=None):
+    """
+    Build a DataFrame from Fiscal Data records with typed columns.
+
+    Fiscal Data returns every value as a string, with missing values as "null".
+    Numeric, currency and percentage columns are converted to numbers and date
+    columns to datetimes, one vectorized conversion per column; "null" and other
+    unparseable values become NaN/NaT.
+
+    Args:
+        records (list): Fiscal Data records
+        data_types (dict): Column name to Fiscal Data type, as found in meta.dataTypes
+        columns (list, optional): Columns of the DataFrame (defaults to the record keys)
+
+    Returns:
+        pd.DataFrame: Records with typed columns
+    """
+    df = pd.DataFrame(records, columns=columns)
+    for column, data_type in (data_types or {}).items():
+        if column not in df.columns:
+            continue
+        data_type = str(data_type).upper()
+        if data_type.startswith(NUMERIC_DATA_TYPES):
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+        elif data_type in DATE_DATA_TYPES:
+            df[column] = pd.to_datetime(df[column], format="%Y-%m-%d", errors="coerce")
+    return df
+
+def format_treasury_data_for_client(data, data_type, layout="rows"):
     """
     Format Treasury.gov data for consumption by the MCP Client.
     
     Args:
         data: Raw Treasury.gov data
         data_type (str): Type of data (e.g., "debt", "outlays", "receipts")
+        layout (str): "rows" for a list of records, or "columnar" for
+            {"columns": [...], "values": {column: [...]}}
         
     Returns:
         dict: Formatted data ready for the MCP Client
@@ -279,9 +671,134 @@ def format_treasury_data_for_client(data, data_type):
             "api_info": data.get("meta", {})
         }
     }
+    if layout == COLUMNAR:
+        formatted_data["data"] = to_columnar(data["data"])
+        formatted_data["metadata"]["layout"] = COLUMNAR
     
     return formatted_data
 
+def _json_records(df):
+    """Convert DataFrame rows to a dict keyed by index, with NaN replaced by None."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient="index")
+
+def build_comparison_matrix(df, fiscal_years, value_column="current_fytd_net_outly_amt", group_column="classification_desc"):
+    """
+    Pivot typed records into a group x fiscal year matrix and compute deltas.
+
+    Every delta is computed for all groups at once on the pivoted matrix:
+    year-over-year change and percent change for each year, and the absolute
+    change, percent change and compound annual growth rate (CAGR, in percent)
+    between the first and last year. Percentages are NaN where the base amount
+    is zero, and CAGR is NaN unless both endpoint amounts are positive.
+
+    Args:
+        df (pd.DataFrame): Decoded records with group, fiscal_year and value columns
+        fiscal_years (list): Fiscal years (str) to compare, in ascending order
+        value_column (str): Numeric column to aggregate
+        group_column (str): Column identifying the compared entities
+
+    Returns:
+        tuple: (matrix, summary) DataFrames indexed by group. ``matrix`` has column
+            blocks "amount", "yoy_change" and "yoy_percent_change", each with one
+            column per fiscal year; ``summary`` has "change", "percent_change" and "cagr".
+    """
+    matrix = df.pivot_table(
+        index=group_column,
+        columns="fiscal_year",
+        values=value_column,
+        aggfunc="sum",
+        fill_value=0
+    ).reindex(columns=fiscal_years, fill_value=0)
+    matrix.columns.name = None
+
+    previous = matrix.shift(1, axis=1)
+    yoy_change = matrix - previous
+    yoy_percent_change = yoy_change / previous.where(previous != 0) * 100
+
+    first = matrix.iloc[:, 0]
+    last = matrix.iloc[:, -1]
+    change = last - first
+    percent_change = change / first.where(first != 0) * 100
+    periods = int(fiscal_years[-1]) - int(fiscal_years[0])
+    if periods > 0:
+        ratio = last / first.where(first > 0)
+        cagr = (ratio.where(ratio > 0) ** (1 / periods) - 1) * 100
+    else:
+        cagr = pd.Series(float("nan"), index=matrix.index)
+
+    blocks = pd.concat(
+        {"amount": matrix, "yoy_change": yoy_change, "yoy_percent_change": yoy_percent_change},
+        axis=1
+    )
+    summary = pd.DataFrame({"change": change, "percent_change": percent_change, "cagr": cagr})
+    return blocks, summary
+
+def get_budget_comparison(fiscal_years, agency_names=None):
+    """
+    Compare outlays across any set of fiscal years, optionally for selected agencies.
+
+    All years are retrieved in one paginated request sequence and compared in a
+    single pivoted agency x year matrix (see build_comparison_matrix).
+
+    Args:
+        fiscal_years (list): Fiscal years to compare (e.g., ["2015", "2019", "2023"])
+        agency_names (str or list, optional): Agency name(s) to filter by (substring match)
+
+    Returns:
+        dict: One record per agency with per-year "amounts", "yoy_change" and
+            "yoy_percent_change", plus "change", "percent_change" and "cagr"
+            between the first and last year
+    """
+    years = [str(year) for year in sorted({int(year) for year in fiscal_years})]
+    if not years:
+        return {"error": "No fiscal years to compare"}
+    if isinstance(agency_names, str):
+        agency_names = [agency_names]
+    
+    try:
+        logger.info(f"Fetching federal budget outlays data for FY {', '.join(years)}")
+        outlays = fetch_all_pages(*_mts_years_request("mts_table_9", years, COMPARISON_FIELDS))
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error fetching federal budget outlays data: {str(e)}")
+        return {"error": "Failed to retrieve data for comparison"}
+    
+    data_types = outlays.get("meta", {}).get("dataTypes") or COMPARISON_DATA_TYPES
+    df = decode_fiscal_data(outlays["data"], data_types, COMPARISON_FIELDS + ["fiscal_year"])
+    df["fiscal_year"] = df["fiscal_year"].astype(str)
+    
+    # Filter by agency if specified
+    if agency_names:
+        pattern = "|".join(re.escape(name) for name in agency_names)
+        df = df[df["classification_desc"].str.contains(pattern, case=False, na=False)]
+    
+    blocks, summary = build_comparison_matrix(df, years)
+    amounts = _json_records(blocks["amount"])
+    yoy_change = _json_records(blocks["yoy_change"])
+    yoy_percent_change = _json_records(blocks["yoy_percent_change"])
+    
+    comparison_data = [
+        {
+            "classification_desc": agency,
+            "amounts": amounts[agency],
+            "yoy_change": yoy_change[agency],
+            "yoy_percent_change": yoy_percent_change[agency],
+            **totals
+        }
+        for agency, totals in _json_records(summary).items()
+    ]
+    
+    return {
+        "data": comparison_data,
+        "metadata": {
+            "source": "Treasury.gov",
+            "data_type": "budget_comparison",
+            "fiscal_years": years,
+            "agency_filter": agency_names,
+            "retrieved_at": datetime.now().isoformat(),
+            "record_count": len(comparison_data)
+        }
+    }
+
 def get_budget_comparison_by_years(start_year, end_year, agency_name=None):
     """
     Compare budget data between two fiscal years, optionally filtered by agency.
@@ -294,50 +811,21 @@ def get_budget_comparison_by_years(start_year, end_year, agency_name=None):
     Returns:
         dict: Comparison data between the two fiscal years
     """
-    # Get data for both years
-    start_year_data = get_federal_budget_outlays(start_year)
-    end_year_data = get_federal_budget_outlays(end_year)
-    
-    if "error" in start_year_data or "error" in end_year_data:
-        return {"error": "Failed to retrieve data for comparison"}
-    
-    # Convert to DataFrames
-    start_df = pd.DataFrame(start_year_data["data"])
-    end_df = pd.DataFrame(end_year_data["data"])
-    
-    # Filter by agency if specified
-    if agency_name:
-        start_df = start_df[start_df["classification_desc"].str.contains(agency_name, case=False, na=False)]
-        end_df = end_df[end_df["classification_desc"].str.contains(agency_name, case=False, na=False)]
-    
-    # Prepare comparison data
-    comparison_data = []
-    
-    # Group by agency/department
-    start_grouped = start_df.groupby("classification_desc").sum().reset_index()
-    end_grouped = end_df.groupby("classification_desc").sum().reset_index()
-    
-    # Merge the data
-    merged_df = pd.merge(
-        start_grouped[["classification_desc", "current_fytd_net_outly_amt"]], 
-        end_grouped[["classification_desc", "current_fytd_net_outly_amt"]], 
-        on="classification_desc", 
-        how="outer",
-        suffixes=(f"_{start_year}", f"_{end_year}")
-    )
-    
-    # Fill NaN values with 0
-    merged_df = merged_df.fillna(0)
-    
-    # Calculate change and percentage change
-    merged_df[f"change_{start_year}_to_{end_year}"] = merged_df[f"current_fytd_net_outly_amt_{end_year}"] - merged_df[f"current_fytd_net_outly_amt_{start_year}"]
-    merged_df[f"percent_change_{start_year}_to_{end_year}"] = (
-        (merged_df[f"current_fytd_net_outly_amt_{end_year}"] - merged_df[f"current_fytd_net_outly_amt_{start_year}"]) / 
-        merged_df[f"current_fytd_net_outly_amt_{start_year}"] * 100
-    ).replace([float('inf'), -float('inf')], 0)
-    
-    # Convert to list of dictionaries
-    comparison_data = merged_df.to_dict(orient="records")
+    comparison = get_budget_comparison([start_year, end_year], agency_name)
+    if "error" in comparison:
+        return comparison
+    
+    # Flatten to the year-suffixed columns of the two-year comparison
+    comparison_data = [
+        {
+            "classification_desc": row["classification_desc"],
+            f"current_fytd_net_outly_amt_{start_year}": row["amounts"][str(int(start_year))],
+            f"current_fytd_net_outly_amt_{end_year}": row["amounts"][str(int(end_year))],
+            f"change_{start_year}_to_{end_year}": row["change"],
+            f"percent_change_{start_year}_to_{end_year}": row["percent_change"]
+        }
+        for row in comparison["data"]
+    ]
     
     return {
         "data": comparison_data,
@@ -347,7 +835,7 @@ def get_budget_comparison_by_years(start_year, end_year, agency_name=None):
             "start_year": start_year,
             "end_year": end_year,
             "agency_filter": agency_name,
-            "retrieved_at": datetime.now().isoformat(),
+            "retrieved_at": comparison["metadata"]["retrieved_at"],
             "record_count": len(comparison_data)
         }
     }